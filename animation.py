@@ -0,0 +1,160 @@
+import time
+import logging
+
+from tracing import tracer
+
+logger = logging.getLogger("AICoderUltimate")
+
+FRAME_INTERVAL_MS = 16
+MAX_FRAME_INTERVAL_MS = 100
+MAX_SKIPPED_FRAMES = 3
+
+
+class _Animation:
+    __slots__ = ("on_frame", "on_done", "duration", "period", "started")
+
+    def __init__(self, on_frame, on_done, duration, period, started):
+        self.on_frame = on_frame
+        self.on_done = on_done
+        self.duration = duration
+        self.period = period
+        self.started = started
+
+
+class FrameClock:
+    """
+    Один таймер Tk на все анимации окна. Анимации задаются временем, а не числом
+    кадров: если цикл Tk занят (стрим токенов, ввод), кадры пропускаются, интервал
+    тика увеличивается, а анимация просто продолжается с нужной фазы. Пока активных
+    анимаций нет, таймер не взводится.
+
+    animate(key, on_frame, duration) вызывает on_frame(progress) с progress от 0 до 1;
+    для повторяющихся анимаций (period) progress идет по кругу до cancel(key).
+    Повторный animate() с тем же ключом заменяет предыдущую анимацию.
+    """
+
+    def __init__(self, root, interval_ms=FRAME_INTERVAL_MS, speed=1.0, enabled=True, busy=None):
+        self.root = root
+        self.base_interval = interval_ms
+        self.interval = interval_ms
+        self.speed = speed
+        self.enabled = enabled
+        self.busy = busy
+        self.dropped_frames = 0
+        self._skipped = 0
+        self._animations = {}
+        self._after_id = None
+        self._last_tick = None
+
+    def configure(self, speed=None, enabled=None, busy=None):
+        if speed is not None:
+            self.speed = max(0.05, float(speed))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+            if not self.enabled:
+                self.finish_all()
+        if busy is not None:
+            self.busy = busy
+
+    def animate(self, key, on_frame, duration=0.25, on_done=None, period=None):
+        if not self.enabled and period is None:
+            self._run_frame(key, on_frame, 1.0)
+            if on_done:
+                on_done()
+            return key
+        if not self.enabled:
+            return key
+        self._animations[key] = _Animation(on_frame, on_done, duration, period, time.perf_counter())
+        self._schedule()
+        return key
+
+    def cancel(self, key):
+        self._animations.pop(key, None)
+        if not self._animations:
+            self._stop()
+
+    def is_active(self, key):
+        return key in self._animations
+
+    def finish_all(self):
+        animations, self._animations = self._animations, {}
+        self._stop()
+        for key, animation in animations.items():
+            if animation.period is None:
+                self._run_frame(key, animation.on_frame, 1.0)
+                if animation.on_done:
+                    animation.on_done()
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._last_tick = time.perf_counter()
+            self._after_id = self.root.after(self.interval, self._tick)
+
+    def _stop(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        self.interval = self.base_interval
+
+    def _run_frame(self, key, on_frame, progress):
+        try:
+            on_frame(progress)
+            return True
+        except Exception as e:
+            logger.debug(f"Animation {key!r} stopped: {e}")
+            return False
+
+    def _tick(self):
+        self._after_id = None
+        now = time.perf_counter()
+        lateness_ms = (now - self._last_tick) * 1000 - self.interval
+        self._last_tick = now
+        overloaded = lateness_ms > self.interval or (self.busy and self.busy())
+        if overloaded and self._skipped < MAX_SKIPPED_FRAMES:
+            # Цикл Tk перегружен: пропускаем кадр и реже тикаем, чтобы не отнимать время у токенов и ввода
+            self.dropped_frames += 1
+            self._skipped += 1
+            self.interval = min(self.interval * 2, MAX_FRAME_INTERVAL_MS)
+            if self._animations:
+                self._after_id = self.root.after(self.interval, self._tick)
+            return
+        self._skipped = 0
+        if not overloaded:
+            self.interval = max(self.base_interval, self.interval // 2)
+
+        with tracer.span("tk.animations", "ui", count=len(self._animations)):
+            for key, animation in list(self._animations.items()):
+                if self._animations.get(key) is not animation:
+                    continue
+                elapsed = (now - animation.started) * self.speed
+                if animation.period is not None:
+                    progress = (elapsed % animation.period) / animation.period
+                    finished = False
+                else:
+                    progress = min(1.0, elapsed / animation.duration) if animation.duration > 0 else 1.0
+                    finished = progress >= 1.0
+                alive = self._run_frame(key, animation.on_frame, progress)
+                if (finished or not alive) and self._animations.get(key) is animation:
+                    del self._animations[key]
+                    if finished and animation.on_done:
+                        animation.on_done()
+
+        if self._animations:
+            self._after_id = self.root.after(self.interval, self._tick)
+        else:
+            self.interval = self.base_interval
+
+
+_clocks = {}
+
+
+def get_frame_clock(widget):
+    """Общий FrameClock для корневого окна виджета."""
+    root = widget._root()
+    clock = _clocks.get(root)
+    if clock is None:
+        clock = _clocks[root] = FrameClock(root)
+    return clock
@@ -0,0 +1,294 @@
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ollama_client import (DEFAULT_CONFIG_FILE, DEFAULT_HOST, GenerationCancelled,
+                           get_model_config, model_options, build_messages, client_from_config)
+from response_cache import ResponseCache, cache_key
+from scheduler import INTERACTIVE, PRIORITY_NAMES, QueueFull, get_host_scheduler
+from log_setup import setup_logging, new_request_id, request_context
+from config_service import ConfigService
+from prompt_compress import PromptCompressor
+
+logger = logging.getLogger("AICoderUltimate")
+
+DEFAULT_PORT = 8765
+KEEPALIVE_INTERVAL = 15
+
+
+class AssistantService:
+    """Общие для всех клиентов: конфигурация, один клиент Ollama, кэш ответов и планировщик хоста."""
+
+    def __init__(self, config, client=None, cache=None, scheduler=None, max_concurrent=1, config_service=None):
+        self.config = config
+        self.config_service = config_service
+        self.client = client or client_from_config(config, pool_size=max_concurrent + 1)
+        self.cache = cache if cache is not None else ResponseCache()
+        self.scheduler = scheduler or get_host_scheduler(self.client.host, max_concurrent)
+        self.compressor = PromptCompressor()
+
+    def apply_config(self):
+        """
+        Применяет перезагруженный конфиг: при смене ollama_host создает новый клиент и берет
+        планировщик нового хоста, при смене max_concurrent_requests меняет число слотов.
+        Возвращает True, если сменился хост.
+        """
+        host = self.config.get("ollama_host", DEFAULT_HOST).rstrip("/")
+        max_concurrent = self.config.get("max_concurrent_requests", self.scheduler.max_concurrent)
+        if host == self.client.host:
+            if max_concurrent != self.scheduler.max_concurrent:
+                self.scheduler.resize(max_concurrent)
+            return False
+        logger.info(f"Ollama host changed to {host}, reconnecting")
+        old_client = self.client
+        self.client = client_from_config(self.config, pool_size=max_concurrent + 1)
+        self.scheduler = get_host_scheduler(self.client.host, max_concurrent)
+        old_client.close()
+        return True
+
+    def prepare(self, prompt, model=None, context=()):
+        model = model or self.config.get("current_model")
+        if self.config_service:
+            settings = self.config_service.model_settings(model)
+            model_config, options = settings["config"], settings["options"]
+        else:
+            model_config = get_model_config(self.config, model)
+            options = model_options(model_config)
+        messages = build_messages(model_config, list(context), prompt)
+        compression = None
+        if self.config.get("prompt_compression", True):
+            messages, compression = self.compressor.compress_messages(messages)
+            if compression["tokens_saved"] > 0:
+                logger.info(f"Prompt compression saved ~{compression['tokens_saved']} of "
+                            f"{compression['tokens_before']} tokens ({compression['blocks_cleaned']} blocks cleaned, "
+                            f"{compression['blocks_deduped']} deduplicated)")
+        return model, messages, options, compression
+
+    def stream(self, client_id, prompt, model=None, context=(), use_cache=True, priority=INTERACTIVE, requeue=True):
+        """
+        Ставит генерацию в очередь и возвращает (events, job). events получает кортежи
+        ("start"|"token"|"restart"|"done"|"error", data) из рабочего потока; job равен None,
+        если ответ взят из кэша.
+        """
+        model, messages, options, compression = self.prepare(prompt, model, context)
+        tokens_saved = compression["tokens_saved"] if compression else 0
+        key = cache_key(model, messages, options)
+        events = queue.Queue()
+        cached = self.cache.get(key) if use_cache else None
+        if cached:
+            response, stats = cached
+            events.put(("token", response))
+            events.put(("done", dict(stats, cached=True)))
+            return events, None
+
+        submitted_at = time.perf_counter()
+        request_id = new_request_id()
+
+        def _job(job):
+            with request_context(request_id):
+                if job.attempts > 1:
+                    events.put(("restart", {"attempt": job.attempts}))
+                events.put(("start", {"queue_wait": round(time.perf_counter() - submitted_at, 3),
+                                      "request_id": request_id, "prompt_tokens_saved": tokens_saved}))
+                logger.info(f"Generation started: model={model} client={client_id} attempt={job.attempts}")
+                stats = {}
+                parts = []
+                try:
+                    for token in self.client.chat_stream(model, messages, options, job.cancel_event, stats):
+                        parts.append(token)
+                        events.put(("token", token))
+                except GenerationCancelled:
+                    # Итоговое ("done", cancelled) отправит планировщик через on_cancel,
+                    # если задание не будет перезапущено
+                    logger.info("Generation cancelled" + (" (preempted)" if job.preempted else ""))
+                    raise
+                except Exception as e:
+                    logger.error(f"Generation failed: {e}")
+                    events.put(("error", {"error": str(e)}))
+                    return
+                logger.info(f"Generation finished: {stats.get('eval_count')} tokens in {stats.get('elapsed', 0):.2f} s")
+                self.cache.put(key, "".join(parts), stats)
+                events.put(("done", dict(stats, prompt_tokens_saved=tokens_saved)))
+
+        job = self.scheduler.submit(_job, priority, client_id, requeue=requeue,
+                                    on_cancel=lambda: events.put(("done", {"cancelled": True})))
+        return events, job
+
+
+CONTEXT_ROLES = ("system", "user", "assistant")
+
+
+def parse_chat_request(body):
+    """
+    Проверяет тело POST /v1/chat до постановки в очередь. Возвращает словарь с полями
+    prompt, model, context, cache, priority, client_id или бросает ValueError с описанием.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("expected a JSON object")
+    prompt = body.get("prompt")
+    if not isinstance(prompt, str):
+        raise ValueError("'prompt' must be a string")
+    model = body.get("model")
+    if model is not None and not isinstance(model, str):
+        raise ValueError("'model' must be a string")
+    context = body.get("context", [])
+    if not isinstance(context, list):
+        raise ValueError("'context' must be a list of messages")
+    for index, message in enumerate(context):
+        if (not isinstance(message, dict) or message.get("role") not in CONTEXT_ROLES
+                or not isinstance(message.get("content"), str)):
+            raise ValueError(f"context[{index}] must be {{\"role\": one of {', '.join(CONTEXT_ROLES)}, "
+                             f"\"content\": string}}")
+    priority = body.get("priority", "interactive")
+    if priority not in PRIORITY_NAMES:
+        raise ValueError(f"'priority' must be one of {', '.join(PRIORITY_NAMES)}")
+    cache = body.get("cache", True)
+    if not isinstance(cache, bool):
+        raise ValueError("'cache' must be a boolean")
+    client_id = body.get("client_id")
+    if client_id is not None and not isinstance(client_id, str):
+        raise ValueError("'client_id' must be a string")
+    return {"prompt": prompt, "model": model, "cache": cache, "client_id": client_id,
+            "context": [{"role": m["role"], "content": m["content"]} for m in context],
+            "priority": PRIORITY_NAMES[priority]}
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    server_version = "AICoderUltimate/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug("API %s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_event(self, event, data):
+        payload = json.dumps(data, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/v1/health":
+            self._send_json(200, {"status": "ok", "queued": self.service.scheduler.queued,
+                                  "cache_hits": self.service.cache.hits, "cache_misses": self.service.cache.misses})
+        elif self.path == "/v1/models":
+            self._send_json(200, {"current_model": self.service.config.get("current_model"),
+                                  "models": list(self.service.config.get("models", {}))})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/v1/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = parse_chat_request(json.loads(self.rfile.read(length) or b"{}"))
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+
+        client_id = request["client_id"] or self.headers.get("X-Client-Id") or self.client_address[0]
+        try:
+            events, job = self.service.stream(client_id, request["prompt"], request["model"], request["context"],
+                                              request["cache"], request["priority"])
+        except QueueFull as e:
+            self._send_json(429, {"error": str(e)}, {"Retry-After": "2"})
+            return
+        except Exception as e:
+            logger.error(f"Failed to schedule request from {client_id}: {e!r}")
+            self._send_json(500, {"error": "internal error"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            while True:
+                try:
+                    event, data = events.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                self._write_event(event, data)
+                if event in ("done", "error"):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            if job:
+                job.cancel()
+            logger.info(f"API client {client_id} disconnected, generation cancelled")
+
+
+class AssistantApiServer:
+    """Локальный HTTP/SSE сервер: POST /v1/chat, GET /v1/models, GET /v1/health."""
+
+    def __init__(self, service, host="127.0.0.1", port=DEFAULT_PORT):
+        self.service = service
+        self.httpd = ThreadingHTTPServer((host, port), _ApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = service
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="api-server")
+        self._thread.start()
+        logger.info(f"API server listening on http://{self.httpd.server_address[0]}:{self.port}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный API-сервер AI Coder Ultimate для редакторов")
+    parser.add_argument("-c", "--config", default=DEFAULT_CONFIG_FILE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--concurrency", type=int,
+                        help="одновременных генераций в Ollama (по умолчанию max_concurrent_requests из конфига)")
+    args = parser.parse_args(argv)
+
+    setup_logging(log_file=None)
+    config_service = ConfigService(args.config)
+    if args.concurrency:
+        config_service.set_override("max_concurrent_requests", args.concurrency)
+    service = AssistantService(config_service.config, config_service=config_service,
+                               max_concurrent=config_service.config.get("max_concurrent_requests", 1))
+    config_service.add_listener(lambda config: service.apply_config())
+    config_service.start_watching()
+    server = AssistantApiServer(service, args.host, args.port)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
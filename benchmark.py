@@ -0,0 +1,386 @@
+import os
+import io
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import tempfile
+import platform
+import argparse
+import statistics
+import subprocess
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import remover_comments
+from remover_comments import _clean_python_code, _clean_html_js_css_code, process_file
+import python_transform
+from python_transform import COMPACT_TRANSFORMS, TransformError, transform_source
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_DIR = os.path.join(SCRIPT_DIR, "bench_results")
+
+
+# --- Измерения ---
+
+def measure(func, repeat=5, number=1):
+    """Запускает func number раз в каждом из repeat замеров. Возвращает статистику в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) * 1000 / number)
+    return {
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.mean(timings), 4),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+# --- Синтетические корпуса ---
+
+def synthetic_python(functions=200, seed=1):
+    rng = random.Random(seed)
+    parts = ['"""Module docstring."""', "import os", ""]
+    for i in range(functions):
+        parts.append(f"# comment before function {i}")
+        parts.append(f"def function_{i}(a, b={rng.randint(0, 9)}):")
+        parts.append(f'    """Docstring of function {i}."""')
+        parts.append(f"    value = a * b + {rng.randint(0, 999)}  # inline comment")
+        parts.append(f"    text = 'string with # hash {i}'")
+        parts.append("    if value > 10:")
+        parts.append("        return value, text")
+        parts.append("    return None")
+        parts.append("")
+    return "\n".join(parts)
+
+
+def synthetic_web(blocks=200, seed=1):
+    rng = random.Random(seed)
+    parts = ["<html><head><style>/* css comment */ body { margin: 0; } </style></head><body>"]
+    for i in range(blocks):
+        parts.append(f"<!-- html comment {i} -->")
+        parts.append(f'<div class="block-{i}" data-id="{rng.randint(0, 999)}">Block {i}</div>')
+        parts.append("<script>")
+        parts.append(f"// js comment {i}")
+        parts.append(f"var url_{i} = 'http://example.com/{i}'; /* block */ console.log(url_{i});")
+        parts.append("</script>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def real_corpus(directory, extensions):
+    contents = []
+    for filepath in remover_comments.iter_source_files(directory, remover_comments.IGNORED_DIRS + [".git"]):
+        if os.path.splitext(filepath)[1].lower() in extensions:
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    contents.append(f.read())
+            except (OSError, UnicodeDecodeError):
+                pass
+    return "\n".join(contents)
+
+
+# --- Бенчмарки ---
+
+def bench_cleaning(results, repeat, corpus_dir):
+    corpora = {
+        "synthetic_py": (".py", synthetic_python()),
+        "synthetic_web": (".html", synthetic_web()),
+        "real_py": (".py", real_corpus(corpus_dir, [".py"])),
+        "real_web": (".html", real_corpus(corpus_dir, [".html", ".js", ".css"])),
+    }
+    sink = io.StringIO()
+    for name, (extension, content) in corpora.items():
+        if not content:
+            continue
+        cleaner = _clean_python_code if extension == ".py" else _clean_html_js_css_code
+        for compact_mode in (False, True):
+            mode = "compact" if compact_mode else "readable"
+            with redirect_stdout(sink):
+                stats = measure(lambda: cleaner(content, compact_mode), repeat)
+            stats["input_bytes"] = len(content.encode("utf-8"))
+            stats["mb_per_s"] = round(stats["input_bytes"] / 1e6 / (stats["median_ms"] / 1000), 3)
+            results[f"clean.{name}.{mode}"] = stats
+        if extension == ".py":
+            def _ast_compact():
+                python_transform._tree_cache.clear()
+                return transform_source(content, COMPACT_TRANSFORMS)
+            try:
+                stats = measure(_ast_compact, repeat)
+            except (SyntaxError, TransformError):
+                continue
+            stats["input_bytes"] = len(content.encode("utf-8"))
+            stats["output_bytes"] = len(_ast_compact().encode("utf-8"))
+            stats["mb_per_s"] = round(stats["input_bytes"] / 1e6 / (stats["median_ms"] / 1000), 3)
+            results[f"clean.{name}.ast_compact"] = stats
+
+
+def generate_tree(root, files=100, seed=1):
+    rng = random.Random(seed)
+    for i in range(files):
+        subdir = os.path.join(root, f"pkg_{i % 10}")
+        os.makedirs(subdir, exist_ok=True)
+        if i % 3:
+            with open(os.path.join(subdir, f"module_{i}.py"), "w", encoding="utf-8") as f:
+                f.write(synthetic_python(functions=rng.randint(10, 40), seed=i))
+        else:
+            with open(os.path.join(subdir, f"page_{i}.html"), "w", encoding="utf-8") as f:
+                f.write(synthetic_web(blocks=rng.randint(10, 40), seed=i))
+
+
+def bench_process_file(results, repeat, files=100):
+    """process_file целиком (чтение, очистка, бэкап, запись) на сгенерированном дереве."""
+    for compact_mode in (False, True):
+        timings = []
+        for _ in range(repeat):
+            # Дерево создается рядом со скриптом: process_file считает пути бэкапов от каталога sys.argv[0]
+            work_dir = tempfile.mkdtemp(prefix=".bench_tree_", dir=SCRIPT_DIR)
+            try:
+                tree = os.path.join(work_dir, "tree")
+                backup_dir = os.path.join(work_dir, "backup")
+                generate_tree(tree, files)
+                paths = list(remover_comments.iter_source_files(tree))
+                with redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    for filepath in paths:
+                        process_file(filepath, backup_dir, compact_mode)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        mode = "compact" if compact_mode else "readable"
+        results[f"process_file.tree_{files}.{mode}"] = {
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "files": files,
+            "files_per_s": round(files / (statistics.median(timings) / 1000), 1),
+        }
+
+
+class _StreamFeed:
+    """Минимальная замена ModelComparison для CompareWindow: одна панель, токены из очереди."""
+
+    def __init__(self, model):
+        self.models = [model]
+        self.events = {model: queue.Queue()}
+        self.results = {model: {"model": model, "status": "running"}}
+
+    def cancel(self):
+        pass
+
+
+def bench_rendering(results, repeat, messages=200, tokens=2000, batch=20):
+    """
+    Скорость отрисовки в скрытом окне Tk теми же функциями, что и в приложении:
+    целые сообщения через chat_render.render_message (окно чата) и поток токенов
+    через CompareWindow._poll (пакетная дорисовка по таймеру).
+    """
+    try:
+        import tkinter as tk
+        from tkinter import scrolledtext
+        from chat_render import render_message
+        from compare import CompareWindow
+        root = tk.Tk()
+    except Exception as e:
+        results["render"] = {"skipped": f"Tk unavailable: {e}"}
+        return
+    root.withdraw()
+    try:
+        chat_display = scrolledtext.ScrolledText(root, wrap=tk.WORD, state="disabled")
+        for tag in ("user", "assistant", "system"):
+            chat_display.tag_config(tag)
+        chat_display.tag_config("code", font=("Consolas", 10), lmargin1=20, lmargin2=20)
+        message = "Вот пример кода:\n```python\n" + synthetic_python(functions=3) + "\n```\nГотово."
+
+        def render_messages():
+            chat_display.config(state="normal")
+            chat_display.delete("1.0", tk.END)
+            for _ in range(messages):
+                render_message(chat_display, "assistant", message)
+            root.update_idletasks()
+
+        feed = _StreamFeed("bench")
+        window = CompareWindow(root, feed)
+        window.window.withdraw()
+        pane = window.panes["bench"][0]
+
+        def poll():
+            # Вызываем _poll напрямую, без mainloop: отменяем таймер, который он ставит себе сам
+            window._poll()
+            if window._poll_id:
+                window.window.after_cancel(window._poll_id)
+                window._poll_id = None
+
+        def render_tokens():
+            pane.config(state="normal")
+            pane.delete("1.0", tk.END)
+            pane.config(state="disabled")
+            events = feed.events["bench"]
+            for i in range(tokens):
+                events.put(("token", f"tok{i} "))
+                if i % batch == batch - 1:
+                    poll()
+                    root.update_idletasks()
+            poll()
+            root.update_idletasks()
+
+        stats = measure(render_messages, repeat)
+        stats["messages_per_s"] = round(messages / (stats["median_ms"] / 1000), 1)
+        results[f"render.messages_{messages}"] = stats
+        stats = measure(render_tokens, repeat)
+        stats["tokens_per_s"] = round(tokens / (stats["median_ms"] / 1000), 1)
+        results[f"render.tokens_{tokens}"] = stats
+        window.close()
+    finally:
+        root.destroy()
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Заглушка /api/chat: отдает token_count токенов со скоростью tokens_per_second."""
+
+    protocol_version = "HTTP/1.1"
+    token_count = 200
+    tokens_per_second = 500.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+        started = time.perf_counter()
+        for i in range(self.token_count):
+            if delay:
+                time.sleep(max(0.0, started + (i + 1) * delay - time.perf_counter()))
+            self._write_chunk({"message": {"role": "assistant", "content": f"tok{i} "}, "done": False})
+        self._write_chunk({"done": True, "eval_count": self.token_count,
+                           "eval_duration": int((time.perf_counter() - started) * 1e9)})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_stub_ollama(token_count=200, tokens_per_second=500.0):
+    handler = type("ConfiguredStubOllamaHandler", (StubOllamaHandler,),
+                   {"token_count": token_count, "tokens_per_second": tokens_per_second})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_streaming(results, repeat, token_count=200, tokens_per_second=500.0):
+    """Накладные расходы клиента на поток токенов от заглушки Ollama с заданной скоростью."""
+    try:
+        from ollama_client import OllamaClient
+        client_host = start_stub_ollama(token_count, tokens_per_second)
+        client = OllamaClient(f"http://127.0.0.1:{client_host.server_address[1]}")
+    except Exception as e:
+        results["stream"] = {"skipped": str(e)}
+        return
+    try:
+        runs = []
+        for _ in range(repeat):
+            stats = {}
+            received = sum(1 for _ in client.chat_stream("stub", [{"role": "user", "content": "hi"}], stats=stats))
+            runs.append((stats["elapsed"], stats["first_token"], received))
+        ideal = token_count / tokens_per_second if tokens_per_second else 0
+        elapsed = statistics.median(r[0] for r in runs)
+        results[f"stream.{token_count}_tokens_at_{tokens_per_second:g}_tps"] = {
+            "median_ms": round(elapsed * 1000, 3),
+            "first_token_ms": round(statistics.median(r[1] for r in runs) * 1000, 3),
+            "received_tokens_per_s": round(token_count / elapsed, 1),
+            "overhead_ms": round((elapsed - ideal) * 1000, 3),
+            "repeat": repeat,
+        }
+    finally:
+        client.close()
+        client_host.shutdown()
+
+
+# --- Запуск и сравнение ---
+
+def environment_info():
+    info = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+    try:
+        info["git_rev"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                                         capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return info
+
+
+def compare_results(current, previous):
+    """Печатает изменение медианного времени относительно прошлого запуска."""
+    for name, stats in current["results"].items():
+        old = previous.get("results", {}).get(name)
+        if not old or "median_ms" not in stats or "median_ms" not in old:
+            continue
+        change = (stats["median_ms"] - old["median_ms"]) / old["median_ms"] * 100 if old["median_ms"] else 0
+        marker = "  <-- регрессия" if change > 10 else ""
+        print(f"{name:55} {old['median_ms']:10.3f} -> {stats['median_ms']:10.3f} ms ({change:+.1f}%){marker}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки очистки, отрисовки и потоковой генерации")
+    parser.add_argument("--only", nargs="*", choices=["clean", "process", "render", "stream"],
+                        help="запустить только выбранные группы")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--corpus", default=SCRIPT_DIR, help="каталог с реальным кодом для очистки")
+    parser.add_argument("--files", type=int, default=100, help="размер сгенерированного дерева для process_file")
+    parser.add_argument("--tokens", type=int, default=200, help="токенов в ответе заглушки Ollama")
+    parser.add_argument("--tps", type=float, default=500.0, help="скорость заглушки Ollama, токенов/с (0 - без задержек)")
+    parser.add_argument("-o", "--output", help="файл результатов (по умолчанию bench_results/<время>.json)")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["clean", "process", "render", "stream"]
+    results = {}
+    if "clean" in groups:
+        bench_cleaning(results, args.repeat, args.corpus)
+    if "process" in groups:
+        bench_process_file(results, args.repeat, args.files)
+    if "render" in groups:
+        bench_rendering(results, args.repeat)
+    if "stream" in groups:
+        bench_streaming(results, args.repeat, args.tokens, args.tps)
+
+    report = {"environment": environment_info(), "results": results}
+    output = args.output
+    if not output:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, stats in results.items():
+        print(f"{name:55} {json.dumps(stats, ensure_ascii=False)}")
+    print(f"\nРезультаты сохранены: {output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_results(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
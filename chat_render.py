@@ -0,0 +1,33 @@
+import tkinter as tk
+
+from tracing import tracer
+
+SENDER_PREFIXES = {
+    "user": ("Вы: ", "user"),
+    "assistant": ("AI: ", "assistant"),
+}
+SYSTEM_PREFIX = ("Система: ", "system")
+
+
+def render_message(chat_display, sender, message):
+    """
+    Выводит сообщение в окно чата: префикс отправителя, текст и блоки ``` с тегом "code".
+    Используется окном приложения и бенчмарком отрисовки.
+    """
+    render_span = tracer.begin("tk.render", "ui", sender=sender, length=len(message))
+    chat_display.config(state='normal')
+    prefix, tag = SENDER_PREFIXES.get(sender, SYSTEM_PREFIX)
+    chat_display.insert(tk.END, prefix, tag)
+    if "```" in message:
+        parts = message.split("```")
+        for i, part in enumerate(parts):
+            if i % 2 == 1:
+                chat_display.insert(tk.END, part + "\n", "code")
+            else:
+                chat_display.insert(tk.END, part)
+    else:
+        chat_display.insert(tk.END, message)
+    chat_display.insert(tk.END, "\n\n")
+    chat_display.config(state='disabled')
+    chat_display.see(tk.END)
+    tracer.end(render_span)
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_watchdog_available = False
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    _watchdog_available = True
+except ImportError:
+    FileSystemEventHandler = object
+
+from remover_comments import SUPPORTED_EXTENSIONS, IGNORED_DIRS, clean_code, python_transforms
+from log_setup import setup_logging
+
+logger = logging.getLogger("AICoderUltimate")
+
+MANIFEST_FILE = ".clean_manifest.json"
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 1.0
+MIRROR_IGNORED_DIRS = IGNORED_DIRS + [".git", "__pycache__", "node_modules"]
+
+
+def _clean_job(source_path, compact_mode, transforms, copy_only):
+    """Выполняется в пуле процессов: читает исходный файл и возвращает очищенный текст (или байты для копии)."""
+    if copy_only:
+        with open(source_path, "rb") as f:
+            return f.read()
+    with open(source_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    extension = os.path.splitext(source_path)[1]
+    return clean_code(content, extension, compact_mode, transforms).encode("utf-8")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CleanMirror:
+    """
+    Поддерживает копию дерева исходников без комментариев (output_dir) в актуальном
+    состоянии. Для каждого файла в манифесте хранится (mtime, size) исходника, поэтому
+    повторная синхронизация обрабатывает только изменившиеся файлы; очистка идет в
+    пуле процессов, а удаленные исходники удаляются и из копии.
+    """
+
+    def __init__(self, source_dir, output_dir, compact_mode=True, strip_debug=False,
+                 copy_other=False, workers=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.compact_mode = compact_mode
+        self.transforms = python_transforms(compact_mode, strip_debug)
+        self.copy_other = copy_other
+        self.workers = workers
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+        self._pool = None
+
+    # --- Манифест ---
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("options") != self._options():
+            return {}
+        return {path: tuple(state) for path, state in data.get("files", {}).items()}
+
+    def _options(self):
+        return {"compact": self.compact_mode, "transforms": sorted(self.transforms or ()), "copy_other": self.copy_other}
+
+    def _save_manifest(self):
+        data = {"options": self._options(), "files": self.manifest}
+        _write_atomic(self.manifest_path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    # --- Отбор файлов ---
+
+    def _inside_output(self, path):
+        return os.path.commonpath([self.output_dir, path]) == self.output_dir
+
+    def wanted(self, relpath):
+        parts = relpath.replace("\\", "/").split("/")
+        if any(part in MIRROR_IGNORED_DIRS for part in parts[:-1]):
+            return False
+        if parts[-1].endswith(".tmp"):
+            return False
+        return self.copy_other or os.path.splitext(relpath)[1].lower() in SUPPORTED_EXTENSIONS
+
+    def scan(self):
+        """Текущее состояние исходного дерева: {относительный путь: (mtime_ns, size)}."""
+        state = {}
+        stack = [self.source_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in MIRROR_IGNORED_DIRS and not self._inside_output(entry.path):
+                        stack.append(entry.path)
+                    continue
+                relpath = os.path.relpath(entry.path, self.source_dir)
+                if not self.wanted(relpath):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                state[relpath] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    # --- Синхронизация ---
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def sync(self, relpaths=None):
+        """
+        Синхронизирует копию. relpaths - пути, о которых сообщил наблюдатель; None - полный обход.
+        Возвращает (обновлено, удалено).
+        """
+        if relpaths is None:
+            current = self.scan()
+            candidates = set(current) | set(self.manifest)
+        else:
+            current = {}
+            candidates = set()
+            for relpath in relpaths:
+                if not self.wanted(relpath):
+                    continue
+                candidates.add(relpath)
+                try:
+                    stat = os.stat(os.path.join(self.source_dir, relpath))
+                    current[relpath] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    pass
+
+        changed = [p for p in candidates if p in current and self.manifest.get(p) != current[p]]
+        removed = [p for p in candidates if p not in current and p in self.manifest]
+
+        futures = {}
+        if len(changed) > 1:
+            pool = self._get_pool()
+            for relpath in changed:
+                futures[relpath] = pool.submit(_clean_job, os.path.join(self.source_dir, relpath),
+                                               self.compact_mode, self.transforms, self._copy_only(relpath))
+        updated = 0
+        for relpath in changed:
+            try:
+                if relpath in futures:
+                    data = futures[relpath].result()
+                else:
+                    data = _clean_job(os.path.join(self.source_dir, relpath), self.compact_mode,
+                                      self.transforms, self._copy_only(relpath))
+                _write_atomic(os.path.join(self.output_dir, relpath), data)
+            except Exception as e:
+                # Файл в процессе правки может не разбираться: прежняя копия остается, запись
+                # в манифесте не обновляется, и файл будет обработан снова при следующем изменении
+                logger.error(f"Failed to clean '{relpath}', keeping previous copy: {e!r}")
+                if isinstance(e, BrokenProcessPool):
+                    self._pool = None
+                continue
+            self.manifest[relpath] = current[relpath]
+            updated += 1
+
+        for relpath in removed:
+            target = os.path.join(self.output_dir, relpath)
+            try:
+                os.remove(target)
+                self._prune_empty_dirs(os.path.dirname(target))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Failed to remove '{target}': {e}")
+                continue
+            del self.manifest[relpath]
+
+        if updated or removed:
+            self._save_manifest()
+        return updated, len(removed)
+
+    def _copy_only(self, relpath):
+        return os.path.splitext(relpath)[1].lower() not in SUPPORTED_EXTENSIONS
+
+    def _prune_empty_dirs(self, directory):
+        while directory != self.output_dir and directory.startswith(self.output_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+# --- Наблюдение за изменениями ---
+
+class _ChangeCollector(FileSystemEventHandler):
+    """Собирает пути из событий watchdog; сами файлы обрабатываются после паузы в событиях."""
+
+    def __init__(self, mirror, pending):
+        self.mirror = mirror
+        self.pending = pending
+
+    def _add(self, path):
+        path = os.path.abspath(path)
+        if path.startswith(self.mirror.source_dir + os.sep) and not self.mirror._inside_output(path):
+            self.pending.add(os.path.relpath(path, self.mirror.source_dir))
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            # Переименование или удаление каталога: проще пересканировать дерево целиком
+            if event.event_type in ("created", "moved", "deleted"):
+                self.pending.add_full_scan()
+            return
+        self._add(event.src_path)
+        if getattr(event, "dest_path", None):
+            self._add(event.dest_path)
+
+
+class _PendingChanges:
+    def __init__(self):
+        self._paths = set()
+        self._full_scan = False
+        self._last_event = None
+        self._first_event = None
+        self._lock = threading.Lock()
+
+    def add(self, relpath):
+        with self._lock:
+            self._paths.add(relpath)
+            self._touch()
+
+    def add_full_scan(self):
+        with self._lock:
+            self._full_scan = True
+            self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        self._last_event = now
+        if self._first_event is None:
+            self._first_event = now
+
+    def take_if_quiet(self, debounce, max_delay):
+        """
+        Забирает накопленные изменения, если событий не было debounce секунд (но не дольше max_delay).
+        Возвращает (готово, пути); пути равны None, если нужен полный обход.
+        """
+        with self._lock:
+            if self._last_event is None:
+                return False, None
+            now = time.monotonic()
+            if now - self._last_event < debounce and now - self._first_event < max_delay:
+                return False, None
+            paths = None if self._full_scan else self._paths
+            self._paths = set()
+            self._full_scan = False
+            self._last_event = self._first_event = None
+            return True, paths
+
+
+def watch(mirror, debounce=DEFAULT_DEBOUNCE, poll_interval=DEFAULT_POLL_INTERVAL, stop_event=None, use_watchdog=True):
+    """
+    Первичная синхронизация, затем обработка изменений до stop_event (или Ctrl+C).
+    С watchdog (inotify/ReadDirectoryChangesW/FSEvents) в покое ничего не сканируется;
+    без него раз в poll_interval сравниваются mtime и размеры файлов.
+    """
+    stop_event = stop_event or threading.Event()
+    updated, removed = mirror.sync()
+    logger.info(f"Mirror synchronized: {updated} updated, {removed} removed")
+
+    pending = _PendingChanges()
+    observer = None
+    if use_watchdog and _watchdog_available:
+        observer = Observer()
+        observer.schedule(_ChangeCollector(mirror, pending), mirror.source_dir, recursive=True)
+        observer.start()
+        logger.info(f"Watching {mirror.source_dir} (watchdog)")
+    else:
+        logger.info(f"Watching {mirror.source_dir} (polling every {poll_interval} s)")
+    snapshot = None if observer else mirror.scan()
+    last_poll = time.monotonic()
+    tick = min(debounce, poll_interval) / 2 or 0.1
+    try:
+        while not stop_event.wait(tick):
+            if observer is None and time.monotonic() - last_poll >= poll_interval:
+                last_poll = time.monotonic()
+                current = mirror.scan()
+                changed = (set(current) ^ set(snapshot)) | {p for p in current if snapshot.get(p) != current[p]}
+                for relpath in changed:
+                    pending.add(relpath)
+                snapshot = current
+            ready, paths = pending.take_if_quiet(debounce, debounce * 10)
+            if not ready:
+                continue
+            try:
+                updated, removed = mirror.sync(paths)
+            except Exception as e:
+                # Наблюдение не должно останавливаться из-за сбоя одной синхронизации
+                logger.error(f"Mirror sync failed: {e!r}")
+                continue
+            if updated or removed:
+                logger.info(f"Mirror updated: {updated} updated, {removed} removed")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()
+        mirror.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Поддерживает очищенную от комментариев копию дерева исходников (например, для передачи в LLM)")
+    parser.add_argument("source", help="исходный каталог")
+    parser.add_argument("output", help="каталог очищенной копии")
+    parser.add_argument("--readable", action="store_true", help="читаемый режим вместо плотного")
+    parser.add_argument("--strip-debug", action="store_true", help="удалять assert и блоки if __debug__ в Python")
+    parser.add_argument("--copy-other", action="store_true", help="копировать и неподдерживаемые файлы без изменений")
+    parser.add_argument("--once", action="store_true", help="синхронизировать один раз и выйти")
+    parser.add_argument("--poll", action="store_true", help="опрашивать файлы даже при наличии watchdog")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="интервал опроса, с")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="пауза после последнего изменения, с")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="число процессов очистки")
+    args = parser.parse_args(argv)
+
+    setup_logging(log_file=None)
+    source, output = os.path.abspath(args.source), os.path.abspath(args.output)
+    if source == output or os.path.commonpath([output, source]) == output:
+        parser.error("каталог копии не может совпадать с исходным или содержать его")
+    mirror = CleanMirror(source, output, compact_mode=not args.readable, strip_debug=args.strip_debug,
+                         copy_other=args.copy_other, workers=args.workers)
+    if args.once:
+        try:
+            updated, removed = mirror.sync()
+        finally:
+            mirror.close()
+        logger.info(f"Mirror synchronized: {updated} updated, {removed} removed")
+        return 0
+    watch(mirror, args.debounce, args.interval, use_watchdog=not args.poll)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ollama_client import (DEFAULT_CONFIG_FILE, load_config, get_model_config, model_options,
+                           build_messages, client_from_config)
+from session_journal import SessionJournal
+from log_setup import setup_logging
+
+logger = logging.getLogger("AICoderUltimate")
+
+
+def read_files_into_prompt(prompt, files):
+    """Добавляет содержимое файлов к запросу блоками кода."""
+    parts = [prompt] if prompt else []
+    for filepath in files:
+        with open(filepath, "r", encoding="utf-8") as f:
+            parts.append(f"Файл `{filepath}`:\n```\n{f.read()}\n```")
+    return "\n\n".join(parts)
+
+
+def run_prompt(client, config, prompt, model=None, context=(), out=None):
+    """Выполняет один запрос, печатая токены по мере поступления. Возвращает (ответ, статистика)."""
+    model = model or config.get("current_model")
+    model_config = get_model_config(config, model)
+    messages = build_messages(model_config, list(context), prompt)
+    stats = {}
+    response = []
+    for token in client.chat_stream(model, messages, model_options(model_config), stats=stats):
+        response.append(token)
+        if out:
+            out.write(token)
+            out.flush()
+    if out:
+        out.write("\n")
+    return "".join(response), stats
+
+
+def load_batch(path):
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from None
+            if not isinstance(job, dict):
+                raise ValueError(f"{path}:{line_number}: expected a JSON object")
+            job.setdefault("id", str(line_number))
+            jobs.append(job)
+    return jobs
+
+
+def run_batch(client, config, jobs, concurrency=2, out=None, default_model=None):
+    """
+    Выполняет задания JSONL параллельно (не больше concurrency запросов к Ollama одновременно).
+    Каждый результат записывается в out отдельной JSON-строкой сразу по готовности.
+    """
+    write_lock = threading.Lock()
+    failures = 0
+
+    def _run(job):
+        started = time.perf_counter()
+        model = job.get("model") or default_model
+        try:
+            prompt = read_files_into_prompt(job.get("prompt", ""), job.get("files", []))
+            response, stats = run_prompt(client, config, prompt, model, job.get("context", ()))
+            return {"id": job["id"], "model": stats.get("model", model), "response": response,
+                    "elapsed": round(time.perf_counter() - started, 3),
+                    "eval_count": stats.get("eval_count"), "tokens_per_second": stats.get("tokens_per_second")}
+        except Exception as e:
+            return {"id": job["id"], "model": model, "error": str(e),
+                    "elapsed": round(time.perf_counter() - started, 3)}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(_run, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            if "error" in result:
+                failures += 1
+                logger.error(f"Batch job {result['id']} failed: {result['error']}")
+            with write_lock:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Coder Ultimate без графического интерфейса")
+    parser.add_argument("prompt", nargs="?", help="запрос (по умолчанию читается из stdin)")
+    parser.add_argument("-f", "--file", action="append", default=[], help="приложить файл к запросу")
+    parser.add_argument("-m", "--model", help="модель из ai_coder_config.json")
+    parser.add_argument("-c", "--config", default=DEFAULT_CONFIG_FILE, help="путь к файлу конфигурации")
+    parser.add_argument("--batch", help="JSONL-файл с заданиями {id, prompt, model, files}")
+    parser.add_argument("-o", "--output", help="файл результатов (по умолчанию stdout)")
+    parser.add_argument("-j", "--concurrency", type=int, default=2, help="число одновременных запросов")
+    parser.add_argument("--session", help="продолжить сохраненную сессию (журнал в каталоге sessions)")
+    parser.add_argument("--sessions-dir", default="sessions")
+    args = parser.parse_args(argv)
+
+    setup_logging(log_file=None, level=logging.WARNING)
+    try:
+        return _run(args, parser)
+    except (OSError, RuntimeError, ValueError) as e:
+        # Ошибки подключения requests - подклассы OSError; без requests client_from_config бросает RuntimeError
+        message = " ".join(str(e).split()) or type(e).__name__
+        logger.error(message)
+        return 1
+
+
+def _run(args, parser):
+    config = load_config(args.config)
+    jobs = load_batch(args.batch) if args.batch else None
+    client = client_from_config(config, pool_size=max(1, args.concurrency))
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if jobs is not None:
+            failures = run_batch(client, config, jobs, args.concurrency, out, args.model)
+            return 1 if failures else 0
+
+        prompt = args.prompt if args.prompt is not None else sys.stdin.read()
+        prompt = read_files_into_prompt(prompt.strip(), args.file)
+        if not prompt:
+            parser.error("пустой запрос")
+
+        journal = SessionJournal(args.sessions_dir, args.session) if args.session else None
+        try:
+            context = journal.tail(50) if journal else []
+            response, stats = run_prompt(client, config, prompt, args.model, context, out)
+            if journal:
+                journal.append("user", prompt, model=stats.get("model"))
+                journal.append("assistant", response, model=stats.get("model"))
+        finally:
+            if journal:
+                journal.close()
+        if stats.get("tokens_per_second"):
+            print(f"[{stats['model']}: {stats['eval_count']} tokens, {stats['tokens_per_second']:.1f} tok/s]",
+                  file=sys.stderr)
+        return 0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,533 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import tkinter as tk
+from bisect import bisect_left
+from collections import Counter
+from tkinter import scrolledtext, ttk
+from concurrent.futures import ThreadPoolExecutor
+
+from remover_comments import backup_file, create_backup_dir
+from tracing import tracer
+
+logger = logging.getLogger("AICoderUltimate")
+
+MAX_EDIT_DISTANCE = 1000
+CONTEXT_LINES = 3
+RENDER_INTERVAL_MS = 100
+
+_FENCE_RE = re.compile(r"^\s*```\s*([\w+#.-]*)(?:[:\s]\s*(\S+))?\s*$")
+_TARGET_LINE_RE = re.compile(r"(?:file|path|файл|путь)\s*[:\-]?\s*\**`?([\w./\\-]+\.\w+)`?\**\s*:?\s*$", re.IGNORECASE)
+_BARE_PATH_RE = re.compile(r"^\s*(?:#+\s*)?\**`?([\w./\\-]+\.\w+)`?\**\s*:?\s*$")
+
+
+class ApplyError(Exception):
+    pass
+
+
+# --- Diff по хэшам строк ---
+
+def intern_lines(lines, table):
+    """Заменяет строки целыми идентификаторами: сравнение строк сводится к сравнению int."""
+    return [table.setdefault(line, len(table)) for line in lines]
+
+
+def _myers(a, b, a0, a1, b0, b1, max_d):
+    """
+    Кратчайший сценарий правок (Myers, O((N+M)D)) для a[a0:a1] и b[b0:b1].
+    Возвращает список шагов ("equal"|"delete"|"insert", i, j) или None, если D > max_d.
+    """
+    n, m = a1 - a0, b1 - b0
+    limit = min(n + m, max_d)
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+    for d in range(limit + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, a0, b0)
+    return None
+
+
+def _backtrack(trace, x, y, a0, b0):
+    steps = []
+    for d in range(len(trace) - 1, -1, -1):
+        snapshot = trace[d]
+        k = x - y
+        if k == -d or (k != d and snapshot[k - 1 + d + 1] < snapshot[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = snapshot[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            steps.append(("equal", a0 + x, b0 + y))
+        if d > 0:
+            if x == prev_x:
+                steps.append(("insert", a0 + x, b0 + prev_y))
+            else:
+                steps.append(("delete", a0 + prev_x, b0 + y))
+        x, y = prev_x, prev_y
+    steps.reverse()
+    return steps
+
+
+def _emit(out, tag, i1, i2, j1, j2):
+    if i1 == i2 and j1 == j2:
+        return
+    if out:
+        last_tag, li1, li2, lj1, lj2 = out[-1]
+        if last_tag == tag and li2 == i1 and lj2 == j1:
+            out[-1] = (tag, li1, i2, lj1, j2)
+            return
+        if {last_tag, tag} <= {"delete", "insert", "replace"} and li2 == i1 and lj2 == j1 and tag != "equal":
+            out[-1] = ("replace", li1, i2, lj1, j2)
+            return
+    out.append((tag, i1, i2, j1, j2))
+
+
+def _steps_to_opcodes(steps, out):
+    for tag, i, j in steps:
+        if tag == "equal":
+            _emit(out, "equal", i, i + 1, j, j + 1)
+        elif tag == "delete":
+            _emit(out, "delete", i, i + 1, j, j)
+        else:
+            _emit(out, "insert", i, i, j, j + 1)
+
+
+def _unique_anchors(a, b, a0, a1, b0, b1):
+    """Строки, встречающиеся ровно один раз в обеих частях и идущие в одном порядке (patience diff)."""
+    a_counts = Counter(a[a0:a1])
+    b_counts = Counter(b[b0:b1])
+    a_positions = {line: i for i, line in enumerate(a[a0:a1], a0) if a_counts[line] == 1}
+    pairs = [(a_positions[line], j) for j, line in enumerate(b[b0:b1], b0)
+             if b_counts[line] == 1 and line in a_positions]
+    # Наибольшая возрастающая подпоследовательность по позициям в a (пары уже упорядочены по b)
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for index, (i, _) in enumerate(pairs):
+        position = bisect_left(tails, i)
+        if position == len(tails):
+            tails.append(i)
+            tail_index.append(index)
+        else:
+            tails[position] = i
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else None
+    anchors = []
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _diff_range(a, b, a0, a1, b0, b1, out, max_d):
+    prefix = 0
+    while a0 + prefix < a1 and b0 + prefix < b1 and a[a0 + prefix] == b[b0 + prefix]:
+        prefix += 1
+    if prefix:
+        _emit(out, "equal", a0, a0 + prefix, b0, b0 + prefix)
+        a0 += prefix
+        b0 += prefix
+    suffix = 0
+    while a1 - suffix > a0 and b1 - suffix > b0 and a[a1 - suffix - 1] == b[b1 - suffix - 1]:
+        suffix += 1
+    a1 -= suffix
+    b1 -= suffix
+    if a0 < a1 and b0 < b1:
+        anchors = _unique_anchors(a, b, a0, a1, b0, b1)
+        if anchors:
+            for i, j in anchors:
+                if a0 < i or b0 < j:
+                    _diff_range(a, b, a0, i, b0, j, out, max_d)
+                _emit(out, "equal", i, i + 1, j, j + 1)
+                a0, b0 = i + 1, j + 1
+            _diff_range(a, b, a0, a1, b0, b1, out, max_d)
+        elif set(a[a0:a1]).isdisjoint(b[b0:b1]):
+            _emit(out, "replace", a0, a1, b0, b1)
+        else:
+            steps = _myers(a, b, a0, a1, b0, b1, max_d)
+            if steps is None:
+                _emit(out, "replace", a0, a1, b0, b1)
+            else:
+                _steps_to_opcodes(steps, out)
+    elif a0 < a1:
+        _emit(out, "delete", a0, a1, b0, b0)
+    elif b0 < b1:
+        _emit(out, "insert", a0, a0, b0, b1)
+    if suffix:
+        _emit(out, "equal", a1, a1 + suffix, b1, b1 + suffix)
+
+
+def diff_lines(a, b, max_d=MAX_EDIT_DISTANCE):
+    """
+    Diff двух последовательностей идентификаторов строк: общие начало и конец отсекаются,
+    уникальные строки служат якорями (patience), промежутки сравниваются алгоритмом Myers.
+    Возвращает opcodes в формате difflib.SequenceMatcher.get_opcodes().
+    """
+    out = []
+    _diff_range(a, b, 0, len(a), 0, len(b), out, max_d)
+    return out
+
+
+def group_opcodes(opcodes, context=CONTEXT_LINES):
+    """Разбивает opcodes на ханки с context строками вокруг изменений (как difflib)."""
+    if not opcodes:
+        return []
+    opcodes = list(opcodes)
+    if opcodes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if opcodes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    groups, group = [], []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return [g for g in groups if any(op[0] != "equal" for op in g)]
+
+
+def format_unified(old_lines, new_lines, opcodes, path, context=CONTEXT_LINES):
+    lines = [f"--- a/{path}", f"+++ b/{path}"]
+    for group in group_opcodes(opcodes, context):
+        i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+        lines.append(f"@@ -{i1 + 1 if i2 > i1 else i1},{i2 - i1} +{j1 + 1 if j2 > j1 else j1},{j2 - j1} @@")
+        for tag, a1, a2, b1, b2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in old_lines[a1:a2])
+                continue
+            lines.extend("-" + line for line in old_lines[a1:a2])
+            lines.extend("+" + line for line in new_lines[b1:b2])
+    return "\n".join(lines) if len(lines) > 2 else ""
+
+
+# --- Поиск блоков кода с целевым файлом в потоке ответа ---
+
+class CodeBlock:
+    __slots__ = ("path", "language", "lines")
+
+    def __init__(self, path, language):
+        self.path = path
+        self.language = language
+        self.lines = []
+
+
+def _looks_like_path(value):
+    return bool(value) and "." in value.strip("./\\") and not value.startswith("http")
+
+
+class CodeBlockStream:
+    """
+    Разбирает ответ модели по мере поступления токенов. feed() возвращает события
+    ("start", block), ("line", block, line) и ("end", block) для блоков кода, у которых
+    указан целевой файл: в строке-заголовке (```python app/main.py) или строкой перед
+    блоком ("Файл `app/main.py`:", "**app/main.py**").
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._block = None
+        self._in_other_block = False
+        self._last_text_line = ""
+
+    def feed(self, text):
+        self._buffer += text
+        events = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._process_line(line.rstrip("\r"), events)
+        return events
+
+    def close(self):
+        events = []
+        if self._buffer:
+            self._process_line(self._buffer, events)
+            self._buffer = ""
+        if self._block is not None:
+            events.append(("end", self._block))
+            self._block = None
+        return events
+
+    def _process_line(self, line, events):
+        if self._block is not None:
+            if line.strip() == "```":
+                events.append(("end", self._block))
+                self._block = None
+            else:
+                self._block.lines.append(line)
+                events.append(("line", self._block, line))
+            return
+        if self._in_other_block:
+            if line.strip() == "```":
+                self._in_other_block = False
+            return
+        fence = _FENCE_RE.match(line)
+        if fence:
+            language, path = fence.group(1), fence.group(2)
+            if not _looks_like_path(path):
+                path = self._target_from_text(self._last_text_line)
+            if _looks_like_path(language) and not path:
+                language, path = "", language
+            if path:
+                self._block = CodeBlock(path, language)
+                events.append(("start", self._block))
+            else:
+                self._in_other_block = True
+            self._last_text_line = ""
+            return
+        if line.strip():
+            self._last_text_line = line
+
+    @staticmethod
+    def _target_from_text(line):
+        match = _TARGET_LINE_RE.search(line) or _BARE_PATH_RE.match(line)
+        return match.group(1) if match else None
+
+
+# --- Инкрементальный diff и применение ---
+
+def resolve_target(path, base_dir):
+    """Абсолютный путь внутри base_dir; пути, выходящие за пределы проекта, отклоняются."""
+    base_dir = os.path.realpath(base_dir)
+    target = os.path.realpath(os.path.join(base_dir, path.replace("\\", "/").lstrip("/")))
+    if os.path.commonpath([base_dir, target]) != base_dir:
+        raise ApplyError(f"Path is outside the project: {path}")
+    return target
+
+
+def _read_text(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw.decode("utf-8"), hashlib.sha256(raw).hexdigest(), "\r\n" if b"\r\n" in raw else "\n"
+
+
+class StreamingDiff:
+    """
+    Diff предлагаемого содержимого файла с файлом на диске, который растет по строкам.
+    Совпадающее начало учитывается сразу при добавлении строк, а полный diff
+    (compute) считается только для оставшейся части. Пока блок не закончен,
+    удаления в конце файла не показываются: эти строки могут еще прийти.
+    """
+
+    def __init__(self, path, base_dir):
+        self.path = path
+        self.base_dir = base_dir
+        self.target = resolve_target(path, base_dir)
+        self.exists = os.path.isfile(self.target)
+        if self.exists:
+            text, self.digest, self.newline = _read_text(self.target)
+            self.old_lines = text.splitlines()
+        else:
+            self.digest, self.newline, self.old_lines = None, "\n", []
+        self._table = {}
+        self.old_ids = intern_lines(self.old_lines, self._table)
+        self.new_lines = []
+        self.new_ids = []
+        self.prefix = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_line(self, line):
+        with self._lock:
+            line_id = self._table.setdefault(line, len(self._table))
+            if self.prefix == len(self.new_ids) and self.prefix < len(self.old_ids) \
+                    and self.old_ids[self.prefix] == line_id:
+                self.prefix += 1
+            self.new_lines.append(line)
+            self.new_ids.append(line_id)
+
+    def finish(self):
+        self.finished = True
+
+    def compute(self):
+        """Возвращает (opcodes, unified diff). Безопасно вызывать из рабочего потока."""
+        with self._lock:
+            new_ids = list(self.new_ids)
+            new_lines = list(self.new_lines)
+            prefix = self.prefix
+            finished = self.finished
+        with tracer.span("diff.compute", "diff", path=self.path, old=len(self.old_ids), new=len(new_ids)):
+            out = [("equal", 0, prefix, 0, prefix)] if prefix else []
+            _diff_range(self.old_ids, new_ids, prefix, len(self.old_ids), prefix, len(new_ids), out,
+                        MAX_EDIT_DISTANCE)
+            if not finished and out and out[-1][0] == "delete":
+                out.pop()
+            unified = format_unified(self.old_lines, new_lines, out, self.path)
+        return out, unified
+
+    def new_text(self):
+        with self._lock:
+            lines = list(self.new_lines)
+        return self.newline.join(lines) + (self.newline if lines else "")
+
+    def apply(self, backup_dir=None):
+        """
+        Атомарно записывает новое содержимое (временный файл + os.replace). Перед записью
+        проверяет, что файл не изменился с момента чтения, и делает бэкап так же, как
+        remover_comments. Возвращает путь бэкапа (или None для нового файла).
+        """
+        if not self.finished:
+            raise ApplyError("Code block is not complete yet")
+        backup_path = None
+        if self.exists:
+            try:
+                _, digest, _ = _read_text(self.target)
+            except OSError as e:
+                raise ApplyError(f"Cannot read {self.path}: {e}")
+            if digest != self.digest:
+                raise ApplyError(f"{self.path} changed on disk since the diff was computed")
+            backup_dir = backup_dir or create_backup_dir(self.base_dir, "backup_ai_edits")
+            backup_path = backup_file(self.target, backup_dir, self.base_dir)
+        elif os.path.exists(self.target):
+            raise ApplyError(f"{self.path} was created on disk since the diff was computed")
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        tmp_path = f"{self.target}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                f.write(self.new_text())
+                f.flush()
+                os.fsync(f.fileno())
+            if self.exists:
+                shutil.copymode(self.target, tmp_path)
+            os.replace(tmp_path, self.target)
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise ApplyError(f"Failed to write {self.path}: {e}")
+        logger.info(f"Applied AI edit to {self.path}" + (f", backup: {backup_path}" if backup_path else ""))
+        return backup_path
+
+
+class DiffWorker:
+    """
+    Считает diff в фоновом потоке, чтобы не блокировать цикл Tk. Запросы по одному
+    и тому же diff, пришедшие во время расчета, схлопываются в один пересчет.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diff")
+        self._pending = set()
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def request(self, diff, callback):
+        with self._lock:
+            if id(diff) in self._pending:
+                self._dirty.add(id(diff))
+                return
+            self._pending.add(id(diff))
+        self._executor.submit(self._run, diff, callback)
+
+    def _run(self, diff, callback):
+        while True:
+            try:
+                opcodes, unified = diff.compute()
+            except Exception as e:
+                logger.error(f"Diff failed for {diff.path}: {e}")
+                opcodes, unified = None, ""
+            with self._lock:
+                if id(diff) in self._dirty:
+                    self._dirty.discard(id(diff))
+                    continue
+                self._pending.discard(id(diff))
+            callback(diff, opcodes, unified)
+            return
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class DiffWindow:
+    """
+    Окно просмотра diff с кнопкой применения; обновляется по мере прихода блока.
+    Перерисовка не чаще раза в RENDER_INTERVAL_MS, и заменяется только хвост текста,
+    начиная с первой изменившейся строки: ханки выше нее уже на экране.
+    """
+
+    def __init__(self, root, diff, on_apply, font=("Consolas", 10)):
+        self.diff = diff
+        self.on_apply = on_apply
+        self.window = tk.Toplevel(root)
+        self.window.title(f"Изменения: {diff.path}")
+        self.window.geometry("1000x700")
+        self.text = scrolledtext.ScrolledText(self.window, wrap=tk.NONE, font=font, state="disabled")
+        self.text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.text.tag_configure("add", foreground="#2e7d32")
+        self.text.tag_configure("remove", foreground="#c62828")
+        self.text.tag_configure("hunk", foreground="#1565c0")
+        buttons = ttk.Frame(self.window)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        self.status = ttk.Label(buttons, text="Получение блока...")
+        self.status.pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Закрыть", command=self.window.destroy).pack(side=tk.RIGHT)
+        self.apply_button = ttk.Button(buttons, text="Применить", state="disabled", command=self._apply)
+        self.apply_button.pack(side=tk.RIGHT, padx=5)
+        self._rendered = []
+        self._pending = None
+        self._render_id = None
+        self._last_render = 0.0
+
+    def update(self, opcodes, unified):
+        if not self.window.winfo_exists():
+            return
+        self._pending = (opcodes, unified)
+        if self._render_id is None:
+            elapsed_ms = (time.monotonic() - self._last_render) * 1000
+            self._render_id = self.window.after(max(0, int(RENDER_INTERVAL_MS - elapsed_ms)), self._render)
+
+    def _render(self):
+        self._render_id = None
+        if not self.window.winfo_exists() or self._pending is None:
+            return
+        (opcodes, unified), self._pending = self._pending, None
+        self._last_render = time.monotonic()
+        lines = unified.splitlines()
+        keep = 0
+        for old, new in zip(self._rendered, lines):
+            if old != new:
+                break
+            keep += 1
+        with tracer.span("tk.diff_render", "ui", lines=len(lines) - keep):
+            self.text.config(state="normal")
+            self.text.delete(f"{keep + 1}.0", tk.END)
+            for line in lines[keep:]:
+                tag = ("hunk" if line.startswith("@@") else "add" if line.startswith("+")
+                       else "remove" if line.startswith("-") else "")
+                self.text.insert(tk.END, line + "\n", tag)
+            self.text.config(state="disabled")
+        self._rendered = lines
+        changes = sum(1 for op in opcodes or () if op[0] != "equal")
+        if self.diff.finished:
+            self.status.config(text=f"Изменений: {changes}" if unified else "Файл не изменится")
+            self.apply_button.config(state="normal" if unified else "disabled")
+        else:
+            self.status.config(text=f"Получение блока... строк: {len(self.diff.new_lines)}")
+
+    def _apply(self):
+        self.apply_button.config(state="disabled")
+        self.on_apply(self.diff, self)
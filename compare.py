@@ -0,0 +1,192 @@
+import time
+import queue
+import threading
+import tkinter as tk
+from tkinter import scrolledtext, ttk
+
+from scheduler import INTERACTIVE, QueueFull
+from tracing import tracer
+
+
+class ModelComparison:
+    """
+    Отправляет один и тот же запрос нескольким моделям через общий AssistantService
+    (один пул соединений, один контекст) и собирает по каждой модели время до первого
+    токена, общее время и скорость генерации. Если хост держит в памяти только одну
+    модель (max_loaded_models == 1 в конфиге), модели запускаются строго по очереди,
+    чтобы Ollama не перегружала веса между запросами.
+    """
+
+    def __init__(self, service, prompt, models, context=()):
+        self.service = service
+        self.prompt = prompt
+        self.models = list(models)
+        self.context = list(context)
+        self.events = {model: queue.Queue() for model in self.models}
+        self.results = {model: {"model": model, "status": "queued"} for model in self.models}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.serialize = service.config.get("max_loaded_models", 0) == 1
+
+    def start(self):
+        if self.serialize:
+            self._start_model(0)
+        else:
+            for index in range(len(self.models)):
+                self._start_model(index, chain=False)
+        return self
+
+    def _start_model(self, index, chain=True):
+        while index < len(self.models):
+            model = self.models[index]
+            try:
+                # У каждой модели свой client_id: лимит очереди на клиента и круговая
+                # очередность планировщика считаются по моделям, а не по всему сравнению
+                source, job = self.service.stream(f"compare:{model}", self.prompt, model, self.context,
+                                                  use_cache=False, priority=INTERACTIVE)
+            except QueueFull as e:
+                self.results[model].update(status="error", error=str(e))
+                self.events[model].put(("error", {"error": str(e)}))
+                if not chain:
+                    return
+                index += 1
+                continue
+            with self._lock:
+                self._jobs[model] = job
+            threading.Thread(target=self._relay, args=(model, source, index if chain else None),
+                             daemon=True, name=f"compare-{model}").start()
+            return
+
+    def _relay(self, model, source, chain_index):
+        """
+        Переносит события модели в ее очередь и считает метрики по факту прихода токенов.
+        Время до первого токена и общее время отсчитываются от запуска задания, ожидание
+        в очереди хранится отдельно (queue_wait).
+        """
+        result = self.results[model]
+        target = self.events[model]
+        tokens = 0
+        started = time.perf_counter()
+        while True:
+            event, data = source.get()
+            if event == "start":
+                started = time.perf_counter()
+                result["status"] = "running"
+                result["queue_wait"] = data.get("queue_wait")
+            elif event == "restart":
+                tokens = 0
+                result.pop("first_token", None)
+            elif event == "token":
+                if tokens == 0:
+                    result["first_token"] = time.perf_counter() - started
+                tokens += 1
+            if event in ("done", "error"):
+                # Итоги записываются до того, как окно получит завершающее событие
+                result["elapsed"] = time.perf_counter() - started
+                if event == "error":
+                    result["status"] = "error"
+                    result["error"] = data.get("error")
+                else:
+                    result["status"] = "cancelled" if data.get("cancelled") else "done"
+                    result["eval_count"] = data.get("eval_count", tokens)
+                    result["tokens_per_second"] = data.get("tokens_per_second")
+                target.put((event, data))
+                break
+            target.put((event, data))
+        if chain_index is not None:
+            self._start_model(chain_index + 1)
+
+    def cancel(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job:
+                job.cancel()
+
+    def summary(self):
+        return [self.results[model] for model in self.models]
+
+
+def format_result(result):
+    parts = [result["status"]]
+    if result.get("queue_wait"):
+        parts.append(f"queue {result['queue_wait']:.2f} s")
+    if result.get("first_token") is not None:
+        parts.append(f"TTFT {result['first_token']:.2f} s")
+    if result.get("elapsed") is not None:
+        parts.append(f"{result['elapsed']:.1f} s")
+    if result.get("tokens_per_second"):
+        parts.append(f"{result['tokens_per_second']:.1f} tok/s")
+    if result.get("error"):
+        parts.append(result["error"])
+    return " | ".join(parts)
+
+
+class CompareWindow:
+    """Окно сравнения: по панели на модель, токены дописываются пакетами по таймеру Tk."""
+
+    poll_interval = 50
+
+    def __init__(self, root, comparison, font=("Consolas", 10)):
+        self.root = root
+        self.comparison = comparison
+        self.window = tk.Toplevel(root)
+        self.window.title("Сравнение моделей")
+        self.window.geometry("1200x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.panes = {}
+        self._finished = set()
+        frame = ttk.Frame(self.window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        for column, model in enumerate(comparison.models):
+            frame.columnconfigure(column, weight=1)
+            ttk.Label(frame, text=model, font=("Segoe UI", 10, "bold")).grid(row=0, column=column, sticky="w", padx=3)
+            text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, font=font, state="disabled")
+            text.grid(row=1, column=column, sticky="nsew", padx=3)
+            stats = ttk.Label(frame, text="queued")
+            stats.grid(row=2, column=column, sticky="w", padx=3)
+            self.panes[model] = (text, stats)
+        frame.rowconfigure(1, weight=1)
+        self._poll_id = self.window.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        active = False
+        for model, (text, stats) in self.panes.items():
+            events = self.comparison.events[model]
+            chunks = []
+            finished = False
+            while True:
+                try:
+                    event, data = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event == "token":
+                    chunks.append(data)
+                elif event == "restart":
+                    chunks = []
+                    text.config(state="normal")
+                    text.delete("1.0", tk.END)
+                    text.config(state="disabled")
+                elif event in ("done", "error"):
+                    finished = True
+                    self._finished.add(model)
+            if chunks:
+                with tracer.span("tk.render", "ui", model=model, tokens=len(chunks)):
+                    text.config(state="normal")
+                    text.insert(tk.END, "".join(chunks))
+                    text.config(state="disabled")
+                    text.see(tk.END)
+            result = self.comparison.results[model]
+            if chunks or finished or result["status"] == "running":
+                stats.config(text=format_result(result))
+            # Окно опрашивается, пока из очереди модели не извлечено завершающее событие:
+            # статус в results меняется из другого потока и может опередить хвост токенов
+            if model not in self._finished:
+                active = True
+        self._poll_id = self.window.after(self.poll_interval, self._poll) if active else None
+
+    def close(self):
+        self.comparison.cancel()
+        if self._poll_id:
+            self.window.after_cancel(self._poll_id)
+        self.window.destroy()
@@ -0,0 +1,313 @@
+import os
+import json
+import copy
+import hashlib
+import logging
+import threading
+
+from ollama_client import DEFAULT_CONFIG, DEFAULT_CONFIG_FILE, DEFAULT_MODEL_CONFIG, model_options
+
+logger = logging.getLogger("AICoderUltimate")
+
+_NUMBER = (int, float)
+
+MODEL_SCHEMA = {
+    "pre_prompt": (str, None),
+    "context_window": (int, lambda v: v > 0),
+    "temperature": (_NUMBER, lambda v: 0 <= v <= 2),
+    "max_tokens": (int, lambda v: v > 0),
+    "description": (str, None),
+}
+UI_SCHEMA = {
+    "font_size": (int, lambda v: 6 <= v <= 48),
+    "theme": (str, lambda v: v in ("dark", "light")),
+    "animation_speed": (_NUMBER, lambda v: v > 0),
+    "enable_animations": (bool, None),
+}
+PREFETCH_SCHEMA = {
+    "enabled": (bool, None),
+    "prompts": (list, lambda v: all(isinstance(p, str) and p.strip() for p in v)),
+    "delay": (_NUMBER, lambda v: v >= 0),
+    "max_prompts": (int, lambda v: v >= 0),
+}
+TOP_LEVEL_SCHEMA = {
+    "current_model": (str, None),
+    "ollama_host": (str, lambda v: v.startswith(("http://", "https://"))),
+    "max_concurrent_requests": (int, lambda v: v > 0),
+    "max_loaded_models": (int, lambda v: v >= 0),
+    "keep_alive": ((str, int), None),
+    "prompt_compression": (bool, None),
+}
+
+_MISSING = object()
+
+
+def _check_fields(section, schema, defaults, where, errors):
+    for key, (expected, check) in schema.items():
+        if key not in section:
+            continue
+        value = section[key]
+        valid = isinstance(value, expected) and not (expected is int and isinstance(value, bool))
+        if valid and check is not None:
+            valid = check(value)
+        if not valid:
+            errors.append(f"{where}.{key}: invalid value {value!r}")
+            if key in defaults:
+                section[key] = copy.deepcopy(defaults[key])
+            else:
+                del section[key]
+
+
+def validate_config(config):
+    """
+    Проверяет конфиг по схеме и исправляет его на месте: неверные значения заменяются
+    значениями по умолчанию, некорректные модели удаляются. Возвращает список ошибок.
+    """
+    errors = []
+    _check_fields(config, TOP_LEVEL_SCHEMA, DEFAULT_CONFIG, "config", errors)
+
+    models = config.get("models")
+    if not isinstance(models, dict):
+        errors.append("config.models: expected an object")
+        models = config["models"] = copy.deepcopy(DEFAULT_CONFIG["models"])
+    for name in list(models):
+        if not isinstance(models[name], dict):
+            errors.append(f"models.{name}: expected an object")
+            del models[name]
+            continue
+        _check_fields(models[name], MODEL_SCHEMA, DEFAULT_MODEL_CONFIG, f"models.{name}", errors)
+    if not models:
+        models.update(copy.deepcopy(DEFAULT_CONFIG["models"]))
+    if config.get("current_model") not in models:
+        if "current_model" in config:
+            errors.append(f"config.current_model: unknown model {config['current_model']!r}")
+        config["current_model"] = next(iter(models))
+
+    for name, schema in (("ui", UI_SCHEMA), ("prefetch", PREFETCH_SCHEMA)):
+        section = config.setdefault(name, {})
+        if not isinstance(section, dict):
+            errors.append(f"config.{name}: expected an object")
+            section = config[name] = {}
+        _check_fields(section, schema, DEFAULT_CONFIG[name], name, errors)
+        for key, value in DEFAULT_CONFIG[name].items():
+            section.setdefault(key, copy.deepcopy(value))
+    config.setdefault("ollama_host", DEFAULT_CONFIG["ollama_host"])
+    return errors
+
+
+class ConfigService:
+    """
+    Единая точка работы с ai_coder_config.json:
+    * проверка по схеме один раз на каждое новое содержимое файла (по хэшу);
+    * кэш производных настроек моделей (options Ollama), сбрасываемый при изменении;
+    * атомарная отложенная запись: серия изменений за debounce секунд дает одну запись;
+    * отслеживание внешних правок файла и перезагрузка на лету. Словарь config
+      обновляется на месте, поэтому все, кто держит на него ссылку, видят новые значения;
+    * переопределения из командной строки (set_override): действуют поверх файла после
+      каждой перезагрузки и никогда не записываются в файл.
+    """
+
+    def __init__(self, path=DEFAULT_CONFIG_FILE, debounce=0.5, watch_interval=1.0):
+        self.path = path
+        self.debounce = debounce
+        self.watch_interval = watch_interval
+        self.config = {}
+        self._lock = threading.RLock()
+        self._model_cache = {}
+        self._validated_hash = None
+        self._overrides = {}
+        # Значения из файла для переопределенных ключей (_MISSING, если ключа в файле нет)
+        self._shadowed = {}
+        self._save_timer = None
+        self._last_stat = None
+        self._listeners = []
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+        self.reload(force=True)
+
+    # --- Загрузка и проверка ---
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        return raw, hashlib.sha256(raw).hexdigest()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self, force=False):
+        """Перечитывает файл. Возвращает True, если конфигурация изменилась."""
+        try:
+            raw, digest = self._read()
+        except OSError as e:
+            if not force:
+                return False
+            logger.warning(f"Using default config: {e}")
+            with self._lock:
+                self._replace(self._apply_overrides(copy.deepcopy(DEFAULT_CONFIG)))
+            self.save()
+            return True
+        with self._lock:
+            self._last_stat = self._stat()
+            if digest == self._validated_hash and not force:
+                return False
+            try:
+                new_config = json.loads(raw.decode("utf-8"))
+                if not isinstance(new_config, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                logger.error(f"Config file is invalid, keeping previous settings: {e}")
+                if force:
+                    self._replace(self._apply_overrides(copy.deepcopy(DEFAULT_CONFIG)))
+                return force
+            for error in validate_config(new_config):
+                logger.warning(f"Config validation: {error}")
+            self._validated_hash = digest
+            self._apply_overrides(new_config)
+            if new_config == self.config:
+                return False
+            self._replace(new_config)
+        logger.info("Configuration loaded successfully")
+        return True
+
+    def _apply_overrides(self, new_config):
+        self._shadowed = {key: new_config.get(key, _MISSING) for key in self._overrides}
+        new_config.update(self._overrides)
+        return new_config
+
+    def set_override(self, key, value):
+        """Переопределяет значение верхнего уровня до конца работы процесса, не меняя файл."""
+        with self._lock:
+            if key not in self._overrides:
+                self._shadowed[key] = self.config.get(key, _MISSING)
+            self._overrides[key] = value
+            self.config[key] = value
+            self._model_cache.clear()
+
+    def _replace(self, new_config):
+        # Без clear(): потоки, читающие config без блокировки, не должны увидеть пустой словарь
+        self.config.update(new_config)
+        for key in [key for key in self.config if key not in new_config]:
+            self.config.pop(key, None)
+        self._model_cache.clear()
+
+    # --- Производные настройки ---
+
+    def model_settings(self, model_name=None):
+        """Кэшированные настройки модели: конфиг модели и готовые options для Ollama."""
+        model_name = model_name or self.config.get("current_model")
+        with self._lock:
+            settings = self._model_cache.get(model_name)
+            if settings is None:
+                model_config = self.config.get("models", {}).get(model_name, DEFAULT_MODEL_CONFIG)
+                settings = {"name": model_name, "config": model_config, "options": model_options(model_config)}
+                self._model_cache[model_name] = settings
+            return settings
+
+    # --- Запись ---
+
+    def update(self, **changes):
+        """
+        Меняет значения верхнего уровня и планирует отложенную запись. Для переопределенных
+        ключей меняется только сохраняемое значение: переопределение остается в силе.
+        """
+        with self._lock:
+            for key, value in changes.items():
+                if key in self._overrides:
+                    self._shadowed[key] = value
+                else:
+                    self.config[key] = value
+            self._model_cache.clear()
+        self.save()
+
+    def save(self, immediate=False):
+        """Планирует запись через debounce секунд; несколько вызовов подряд дают одну запись."""
+        with self._lock:
+            self._model_cache.clear()
+            if self._save_timer:
+                self._save_timer.cancel()
+            if immediate or not self.debounce:
+                self._save_timer = None
+                self._write()
+                return
+            self._save_timer = threading.Timer(self.debounce, self._on_save_timer)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Немедленно записывает отложенные изменения (например, при закрытии приложения)."""
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+                self._save_timer = None
+                self._write()
+
+    def _on_save_timer(self):
+        with self._lock:
+            # Таймер мог сработать, пока save() под блокировкой заводил новый: тогда запись
+            # сделает новый таймер (или flush()), а ссылку на него терять нельзя
+            if self._save_timer is not threading.current_thread():
+                return
+            self._save_timer = None
+            self._write()
+
+    def _write(self):
+        with self._lock:
+            data = dict(self.config)
+            for key, value in self._shadowed.items():
+                if value is _MISSING:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            data = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"Failed to save configuration: {e}")
+                return
+            self._validated_hash = hashlib.sha256(data).hexdigest()
+            self._last_stat = self._stat()
+        logger.info("Configuration saved")
+
+    # --- Отслеживание внешних изменений ---
+
+    def add_listener(self, callback):
+        """callback(config) вызывается из фонового потока после перезагрузки конфига."""
+        self._listeners.append(callback)
+
+    def start_watching(self):
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, daemon=True, name="config-watch")
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._watch_stop.set()
+
+    def _watch(self):
+        while not self._watch_stop.wait(self.watch_interval):
+            stat = self._stat()
+            if stat is None or stat == self._last_stat:
+                continue
+            try:
+                changed = self.reload()
+            except Exception as e:
+                logger.error(f"Config reload failed: {e}")
+                continue
+            if changed:
+                logger.info("Configuration reloaded from disk")
+                for callback in list(self._listeners):
+                    try:
+                        callback(self.config)
+                    except Exception as e:
+                        logger.error(f"Config listener failed: {e}")
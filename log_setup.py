@@ -0,0 +1,127 @@
+import sys
+import json
+import uuid
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+DEFAULT_LOG_FILE = "ai_coder.log"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+FILE_FORMAT = '%(asctime)s - %(levelname)s - %(request_tag)s%(message)s'
+CONSOLE_FORMAT = '%(levelname)s - %(request_tag)s%(message)s'
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_listener = None
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:8]
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id=None):
+    """Помечает все записи лога внутри блока идентификатором запроса."""
+    request_id = request_id or new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        request_id = _request_id.get()
+        record.request_id = request_id
+        record.request_tag = f"[{request_id}] " if request_id else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-запись на строку: удобно для grep/jq и загрузки в системы сбора логов."""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """
+    QueueHandler, который в вызывающем потоке только подставляет аргументы в сообщение;
+    форматирование и запись на диск выполняются в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(log_file=DEFAULT_LOG_FILE, level=logging.INFO, json_lines=False,
+                  max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT, console=True):
+    """
+    Настраивает корневой логгер: вызывающие потоки (в том числе поток Tk) только кладут
+    запись в очередь, а QueueListener пишет ее в ротируемый файл и в консоль.
+    Повторный вызов ничего не меняет.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(FILE_FORMAT))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -54,20 +54,35 @@ import platform
 import queue
 import logging
 import re
+import atexit
+from functools import partial
 
-logging.basicConfig(
+from log_setup import setup_logging
+from session_journal import SessionJournal, list_sessions
+from message_store import MessageStore
+from search_index import SearchIndex
+from project_index import ProjectIndex, estimate_tokens
+from web_fetch import WebFetcher, summarize_text
+from ollama_client import client_from_config
+from response_cache import ResponseCache
+from api_server import AssistantService, AssistantApiServer, DEFAULT_PORT
+from scheduler import INTERACTIVE
+from compare import ModelComparison, CompareWindow
+from tracing import tracer
+from config_service import ConfigService
+from animation import get_frame_clock
+from prefetch import SpeculativePrefetcher
+from code_apply import ApplyError, CodeBlockStream, DiffWindow, DiffWorker, StreamingDiff
+
+setup_logging(
+    log_file='ai_coder.log',
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='ai_coder.log',
-    filemode='a'
+    json_lines=os.environ.get("AI_CODER_JSON_LOGS") == "1"
 )
 logger = logging.getLogger("AICoderUltimate")
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-if not logger.handlers:
-    logger.addHandler(console_handler)
+
+GUI_CLIENT_ID = "gui"
+
 
 class Tooltip:
     def __init__(self, widget, text):
@@ -119,27 +134,22 @@ class Tooltip:
         self._fade_out()
 
     def _fade_in(self):
-        if self.tooltip_window and self.opacity < 1.0:
-            self.opacity += 0.1
-            if self.opacity > 1.0:
-                self.opacity = 1.0
-            try:
-                self.tooltip_window.attributes("-alpha", self.opacity)
-                self.widget.after(25, self._fade_in)
-            except tk.TclError:
-                pass
+        start = self.opacity
+        get_frame_clock(self.widget).animate((self, "fade"), lambda p: self._set_opacity(start + (1.0 - start) * p),
+                                             duration=0.25 * (1.0 - start))
 
     def _fade_out(self):
-        if self.tooltip_window and self.opacity > 0.0:
-            self.opacity -= 0.1
-            if self.opacity < 0.0:
-                self.opacity = 0.0
-            try:
-                self.tooltip_window.attributes("-alpha", self.opacity)
-                self.widget.after(25, self._fade_out)
-            except tk.TclError:
-                pass
-        elif self.tooltip_window and self.opacity == 0.0:
+        start = self.opacity
+        get_frame_clock(self.widget).animate((self, "fade"), lambda p: self._set_opacity(start * (1.0 - p)),
+                                             duration=0.25 * start, on_done=self._destroy_window)
+
+    def _set_opacity(self, opacity):
+        if self.tooltip_window:
+            self.opacity = opacity
+            self.tooltip_window.attributes("-alpha", opacity)
+
+    def _destroy_window(self):
+        if self.tooltip_window:
             try:
                 self.tooltip_window.destroy()
             except tk.TclError:
@@ -155,8 +165,7 @@ class AICoderUltimate:
         self.root.geometry("1400x900")
         self.config_file = "ai_coder_config.json"
         self.load_config()
-        self.context = []
-        self.current_response_buffer = ""
+        self.context = MessageStore()
         self.is_generating = False
         self.is_listening = False
         self._stop_requested = False
@@ -166,7 +175,24 @@ class AICoderUltimate:
         self.typing_animation_active = False
         self.typing_animation_index = 0
         self.typing_animation_id = None
+        self.frame_clock = get_frame_clock(self.root)
+        self.apply_animation_settings()
         self.fullscreen_state = False
+        self.sessions_dir = "sessions"
+        self.session_journal = None
+        self.session_tail_size = 200
+        self.search_index = None
+        self.project_index = None
+        self.project_context_k = 8
+        self.web_fetcher = None
+        self.code_blocks = None
+        self.code_diffs = {}
+        self.diff_worker = DiffWorker()
+        self.ollama_client = None
+        self.response_cache = ResponseCache()
+        self.api_server = None
+        self.assistant_service = None
+        self.prefetcher = None
         self._check_service_availability()
         self.setup_theme()
         self.setup_styles()
@@ -182,3 +208,294 @@ class AICoderUltimate:
                 model_config = {"context_window": 8192, "pre_prompt": "You are a helpful AI."}
             else:
                 self.config["current_model"] = initial_model
+
+    def start_session(self, session_id=None):
+        if self.session_journal:
+            self.session_journal.close()
+        self.session_journal = SessionJournal(self.sessions_dir, session_id)
+        self.logger.info(f"Session journal opened: {self.session_journal.session_id}")
+        return self.session_journal
+
+    @property
+    def current_response_buffer(self):
+        return self.context.pending_text()
+
+    def record_message(self, role, content):
+        model = self.config.get("current_model")
+        self.context.append(role, content, model)
+        if not self.session_journal:
+            self.start_session()
+        ts = datetime.now().isoformat(timespec="seconds")
+        try:
+            position = self.session_journal.append(role, content, model=model, ts=ts)
+        except OSError as e:
+            self.logger.error(f"Failed to journal message: {e}")
+            return
+        try:
+            self._get_search_index().add_message(
+                self.session_journal.session_id, position, role, content, model=model, ts=ts)
+        except Exception as e:
+            self.logger.error(f"Failed to index message: {e}")
+
+    def load_session(self, session_id, last_n=None):
+        journal = self.start_session(session_id)
+        messages = journal.tail(last_n or self.session_tail_size)
+        self.context = MessageStore.from_records(messages)
+        self.logger.info(f"Loaded {len(self.context)} of {len(journal)} messages from session {session_id}")
+        return messages
+
+    def list_saved_sessions(self):
+        return list_sessions(self.sessions_dir)
+
+    def _get_search_index(self):
+        if self.search_index is None:
+            self.search_index = SearchIndex(os.path.join(self.sessions_dir, "search_index.db"))
+            if self.search_index.needs_rebuild:
+                # Индекс создан заново (впервые или после смены схемы): заполняем из журналов в фоне
+                threading.Thread(target=self.rebuild_search_index, daemon=True).start()
+        return self.search_index
+
+    def search_history(self, query, limit=20, model=None):
+        return self._get_search_index().search(query, limit=limit, model=model)
+
+    def rebuild_search_index(self, extra_files=()):
+        total = self._get_search_index().rebuild(self.sessions_dir, extra_files)
+        self.logger.info(f"Search index rebuilt: {total} messages")
+        return total
+
+    def set_project_directory(self, directory):
+        self.project_index = ProjectIndex(directory)
+        threading.Thread(target=self.refresh_project_index, daemon=True).start()
+        self.logger.info(f"Project directory set: {directory}")
+
+    def refresh_project_index(self):
+        if not self.project_index:
+            return 0
+        changed = self.project_index.refresh()
+        if changed:
+            self.logger.info(f"Project index updated: {changed} files reindexed")
+        return changed
+
+    def load_config(self):
+        self.config_service = ConfigService(self.config_file)
+        self.config = self.config_service.config
+        self.config_service.add_listener(self._on_config_reloaded)
+        self.config_service.start_watching()
+        atexit.register(self.config_service.flush)
+
+    def save_config(self):
+        self.config_service.save()
+
+    def _on_config_reloaded(self, config):
+        self.root.after(0, self._apply_reloaded_config)
+
+    def _apply_reloaded_config(self):
+        # Словарь self.config уже обновлен на месте; клиент Ollama пересоздается только при смене хоста.
+        # Сервис общий с API-сервером и предвыборкой, поэтому он переподключается сам, а не заменяется
+        if self.assistant_service:
+            if self.assistant_service.apply_config() and self.prefetcher:
+                self.prefetcher.cancel()
+            self.ollama_client = self.assistant_service.client
+        elif self.ollama_client and self.ollama_client.host != self.config.get("ollama_host", "").rstrip("/"):
+            self.logger.info(f"Ollama host changed to {self.config['ollama_host']}, reconnecting")
+            self.ollama_client.close()
+            self.ollama_client = None
+        self.apply_animation_settings()
+        self.logger.info(f"Models reloaded: {', '.join(self.config.get('models', {}))}")
+
+    def apply_animation_settings(self):
+        ui = self.config.get("ui", {})
+        # Пока в очереди есть непоказанные токены, кадры анимаций пропускаются
+        self.frame_clock.configure(speed=ui.get("animation_speed", 1.0),
+                                   enabled=ui.get("enable_animations", True),
+                                   busy=lambda: not self.response_queue.empty())
+
+    def start_typing_animation(self, label, text="Генерация"):
+        def _frame(progress):
+            self.typing_animation_index = int(progress * 4) % 4
+            label.config(text=text + "." * self.typing_animation_index)
+        self.typing_animation_active = True
+        self.typing_animation_id = self.frame_clock.animate((self, "typing"), _frame, period=1.2)
+
+    def stop_typing_animation(self):
+        if self.typing_animation_id:
+            self.frame_clock.cancel(self.typing_animation_id)
+        self.typing_animation_active = False
+        self.typing_animation_id = None
+        self.typing_animation_index = 0
+
+    def get_model_config(self, model_name=None):
+        return self.config_service.model_settings(model_name)["config"]
+
+    def build_prompt_with_project_context(self, prompt):
+        if not self.project_index:
+            return prompt
+        model_config = self.get_model_config()
+        history_tokens = sum(estimate_tokens(m["content"]) for m in self.context)
+        budget = (model_config.get("context_window", 8192)
+                  - model_config.get("max_tokens", 2048)
+                  - estimate_tokens(model_config.get("pre_prompt", ""))
+                  - estimate_tokens(prompt)
+                  - history_tokens)
+        budget = min(budget, model_config.get("context_window", 8192) // 2)
+        if budget <= 0:
+            return prompt
+        chunks = self.project_index.select_context(prompt, budget, k=self.project_context_k)
+        if not chunks:
+            return prompt
+        self.logger.info(f"Attached {len(chunks)} project chunks to prompt")
+        return "Relevant project code:\n```\n" + "\n\n".join(chunks) + "\n```\n\n" + prompt
+
+    def reset_code_tracking(self):
+        self.code_blocks = CodeBlockStream()
+        self.code_diffs = {}
+
+    def track_response_text(self, chunk, final=False):
+        """
+        Вызывается из отрисовки ответа для каждого пакета токенов: блоки кода с указанным
+        файлом сравниваются с файлом на диске по мере прихода, diff считается в фоне.
+        """
+        if self.code_blocks is None:
+            self.reset_code_tracking()
+        events = self.code_blocks.feed(chunk)
+        if final:
+            events += self.code_blocks.close()
+        base_dir = self.project_index.root_dir if self.project_index else os.getcwd()
+        for event in events:
+            block = event[1]
+            if event[0] == "start":
+                try:
+                    diff = StreamingDiff(block.path, base_dir)
+                except (ApplyError, OSError, UnicodeDecodeError) as e:
+                    self.logger.warning(f"Skipping code block for {block.path}: {e}")
+                    continue
+                self.code_diffs[id(block)] = (diff, DiffWindow(self.root, diff, self.apply_code_edit))
+                continue
+            entry = self.code_diffs.get(id(block))
+            if not entry:
+                continue
+            if event[0] == "line":
+                entry[0].add_line(event[2])
+            else:
+                entry[0].finish()
+            self.diff_worker.request(entry[0], partial(self._on_diff_computed, entry[1]))
+
+    def _on_diff_computed(self, window, diff, opcodes, unified):
+        # Рабочий поток diff: окно передано заранее, self.code_diffs здесь не читается
+        self.root.after(0, window.update, opcodes, unified)
+
+    def apply_code_edit(self, diff, window=None):
+        if not messagebox.askyesno("Применить изменения", f"Записать изменения в {diff.path}?\nБудет создан бэкап."):
+            if window:
+                window.apply_button.config(state="normal")
+            return None
+        try:
+            backup_path = diff.apply()
+        except ApplyError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return None
+        if window:
+            window.status.config(text=f"Применено. Бэкап: {backup_path}" if backup_path else "Файл создан")
+        if self.project_index:
+            self.project_index.update_file(diff.target)
+        return backup_path
+
+    def fetch_web_page(self, url, callback=None):
+        if not _requests_available:
+            self.logger.warning("Web fetch unavailable: requests is not installed")
+            return None
+        if self.web_fetcher is None:
+            self.web_fetcher = WebFetcher(cache_dir=os.path.join(self.sessions_dir, "web_cache"))
+        return self.web_fetcher.fetch_async(url, callback)
+
+    def summarize_web_text(self, text, generate):
+        model_config = self.get_model_config()
+        return summarize_text(text, generate,
+                              context_window=model_config.get("context_window", 8192),
+                              max_tokens=model_config.get("max_tokens", 1024))
+
+    def get_ollama_client(self):
+        if self.ollama_client is None:
+            self.ollama_client = client_from_config(self.config)
+        return self.ollama_client
+
+    def get_assistant_service(self):
+        if self.assistant_service is None:
+            self.assistant_service = AssistantService(self.config, client=self.get_ollama_client(),
+                                                      cache=self.response_cache,
+                                                      config_service=self.config_service,
+                                                      max_concurrent=self.config.get("max_concurrent_requests", 1))
+        return self.assistant_service
+
+    def submit_generation(self, prompt, priority=INTERACTIVE, model=None, use_cache=True):
+        return self.get_assistant_service().stream(GUI_CLIENT_ID, prompt, model, self.context.as_dicts(), use_cache,
+                                                   priority)
+
+    def cancel_background_generation(self):
+        # Только свои задания: планировщик хоста общий с API-сервером и его клиентами
+        if self.prefetcher:
+            self.prefetcher.cancel()
+        if self.assistant_service:
+            self.assistant_service.scheduler.cancel_below(INTERACTIVE, client_id=GUI_CLIENT_ID)
+
+    def get_prefetcher(self):
+        if self.prefetcher is None:
+            self.prefetcher = SpeculativePrefetcher(self.get_assistant_service())
+        return self.prefetcher
+
+    def on_response_finished(self):
+        # Пока пользователь читает ответ, заранее считаем типичные продолжения (если включено в конфиге)
+        self.get_prefetcher().schedule(self.context.as_dicts(), self.config.get("current_model"))
+
+    def on_user_typing(self, event=None):
+        # Вызывается на каждое нажатие клавиши: только отмена предвыборки, без создания сервиса
+        if self.prefetcher:
+            self.prefetcher.cancel()
+
+    def start_api_server(self, port=DEFAULT_PORT):
+        if self.api_server:
+            return self.api_server
+        self.api_server = AssistantApiServer(self.get_assistant_service(), port=port).start()
+        return self.api_server
+
+    def stop_api_server(self):
+        if self.api_server:
+            self.api_server.stop()
+            self.api_server = None
+            self.logger.info("API server stopped")
+
+    def compare_models(self, prompt, models=None):
+        models = models or list(self.config.get("models", {}))
+        if len(models) < 2:
+            messagebox.showinfo("Сравнение моделей", "Для сравнения нужно выбрать хотя бы две модели.")
+            return None
+        comparison = ModelComparison(self.get_assistant_service(), prompt, models, self.context.as_dicts()).start()
+        self.logger.info(f"Comparing models: {', '.join(models)}")
+        return CompareWindow(self.root, comparison)
+
+    def toggle_tracing(self, enabled=None):
+        enabled = not tracer.enabled if enabled is None else enabled
+        if enabled:
+            tracer.clear()
+            tracer.enable()
+        else:
+            tracer.disable()
+        self.logger.info(f"Latency tracing {'enabled' if enabled else 'disabled'}")
+        return enabled
+
+    def export_trace(self, path=None):
+        path = path or filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if not path:
+            return 0
+        count = tracer.export_chrome_trace(path)
+        self.logger.info(f"Exported {count} trace events to {path}")
+        return count
+
+    def toggle_profiling(self, memory=True):
+        if tracer.profiling:
+            paths = tracer.stop_profiling()
+            self.logger.info(f"Profile saved: {', '.join(paths)}")
+            return paths
+        tracer.start_profiling(memory=memory)
+        self.logger.info("Profiling started")
+        return []
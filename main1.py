@@ -36,6 +36,14 @@ import re
 
 import random
 
+from voice_input import VoicePipeline, create_backend
+
+from system_monitor import SystemMonitor, Sparkline
+
+from tracing import tracer
+
+from chat_render import render_message
+
 class Windows11AICoder:
 
     def __init__(self, root):
@@ -154,6 +162,8 @@ class Windows11AICoder:
 
         self.create_status_bar()
 
+        self.create_menu()
+
         self.apply_theme()
 
     def create_header(self):
@@ -392,11 +402,97 @@ class Windows11AICoder:
 
         self.sys_info_label.pack(side=tk.RIGHT)
 
+        self.sparkline = Sparkline(
+
+            self.status_bar,
+
+            colors=(self.colors[self.config["ui"]["theme"]]["accent"], "#e81123"),
+
+            bg=self.colors[self.config["ui"]["theme"]]["bg"]
+
+        )
+
+        self.sparkline.canvas.pack(side=tk.RIGHT, padx=10)
+
+    def create_menu(self):
+
+        menubar = tk.Menu(self.root)
+
+        diagnostics_menu = tk.Menu(menubar, tearoff=0)
+
+        self.tracing_var = tk.BooleanVar(value=tracer.enabled)
+
+        self.profiling_var = tk.BooleanVar(value=False)
+
+        diagnostics_menu.add_checkbutton(label="Трассировка задержек", variable=self.tracing_var, command=self.toggle_tracing)
+
+        diagnostics_menu.add_command(label="Экспорт трассировки (Chrome)...", command=self.export_trace)
+
+        diagnostics_menu.add_separator()
+
+        diagnostics_menu.add_checkbutton(label="Профилирование CPU и памяти", variable=self.profiling_var, command=self.toggle_profiling)
+
+        menubar.add_cascade(label="Диагностика", menu=diagnostics_menu)
+
+        self.root.config(menu=menubar)
+
+    def toggle_tracing(self):
+
+        if self.tracing_var.get():
+
+            tracer.clear()
+
+            tracer.enable()
+
+            self.status_label.config(text="Трассировка включена")
+
+        else:
+
+            tracer.disable()
+
+            self.status_label.config(text="Трассировка выключена")
+
+    def export_trace(self):
+
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+
+        if not path:
+
+            return
+
+        count = tracer.export_chrome_trace(path)
+
+        self.status_label.config(text=f"Трассировка сохранена: {count} событий")
+
+    def toggle_profiling(self):
+
+        if self.profiling_var.get():
+
+            tracer.start_profiling(memory=True)
+
+            self.status_label.config(text="Профилирование запущено")
+
+        else:
+
+            paths = tracer.stop_profiling()
+
+            self.status_label.config(text=f"Профиль сохранен: {', '.join(paths)}")
+
     def setup_services(self):
 
         self.recognizer = sr.Recognizer()
 
-        self.microphone = sr.Microphone()
+        self.voice_pipeline = VoicePipeline(
+
+            create_backend(recognizer=self.recognizer),
+
+            on_partial=lambda text: self.root.after(0, self.show_voice_text, text, False),
+
+            on_final=lambda text: self.root.after(0, self.show_voice_text, text, True),
+
+            on_error=lambda error: self.root.after(0, self.on_voice_error, error)
+
+        )
 
         self.is_listening = False
 
@@ -404,6 +500,12 @@ class Windows11AICoder:
 
     def start_background_tasks(self):
 
+        self.system_monitor = SystemMonitor(ollama_host=self.config["ollama_host"])
+
+        self.system_monitor.start()
+
+        self._drawn_monitor_version = 0
+
         self.root.after(100, self.process_responses)
 
         self.root.after(1000, self.update_system_info)
@@ -476,7 +578,9 @@ class Windows11AICoder:
 
     def on_enter_pressed(self, event):
 
-        self.send_message()
+        with tracer.span("input.enter", "ui"):
+
+            self.send_message()
 
         return "break"
 
@@ -494,13 +598,15 @@ class Windows11AICoder:
 
             return
 
-        self.add_to_chat("user", message)
+        with tracer.span("input.send_message", "ui", length=len(message)):
 
-        self.user_input.delete("1.0", tk.END)
+            self.add_to_chat("user", message)
 
-        self.status_label.config(text="Генерация ответа...")
+            self.user_input.delete("1.0", tk.END)
 
-        threading.Thread(target=self.generate_response, daemon=True).start()
+            self.status_label.config(text="Генерация ответа...")
+
+            threading.Thread(target=self.generate_response, daemon=True).start()
 
     def generate_response(self):
 
@@ -524,43 +630,7 @@ class Windows11AICoder:
 
     def add_to_chat(self, sender, message):
 
-        self.chat_display.config(state='normal')
-
-        if sender == "user":
-
-            self.chat_display.insert(tk.END, "Вы: ", "user")
-
-        elif sender == "assistant":
-
-            self.chat_display.insert(tk.END, "AI: ", "assistant")
-
-        else:
-
-            self.chat_display.insert(tk.END, "Система: ", "system")
-
-        if "```" in message:
-
-            parts = message.split("```")
-
-            for i, part in enumerate(parts):
-
-                if i % 2 == 1:
-
-                    self.chat_display.insert(tk.END, part + "\n", "code")
-
-                else:
-
-                    self.chat_display.insert(tk.END, part)
-
-        else:
-
-            self.chat_display.insert(tk.END, message)
-
-        self.chat_display.insert(tk.END, "\n\n")
-
-        self.chat_display.config(state='disabled')
-
-        self.chat_display.see(tk.END)
+        render_message(self.chat_display, sender, message)
 
     def toggle_voice_input(self):
 
@@ -576,39 +646,41 @@ class Windows11AICoder:
 
         self.is_listening = True
 
+        self.user_input.mark_set("voice_start", "end-1c")
+
+        self.user_input.mark_gravity("voice_start", tk.LEFT)
+
         self.status_label.config(text="Слушаю... Говорите")
 
-        threading.Thread(target=self.process_voice_input, daemon=True).start()
+        self.voice_pipeline.start_listening()
 
     def stop_voice_input(self):
 
         self.is_listening = False
 
-        self.status_label.config(text="Готов")
+        self.voice_pipeline.stop_listening()
 
-    def process_voice_input(self):
-
-        try:
+        self.status_label.config(text="Готов")
 
-            with self.microphone as source:
+    def show_voice_text(self, text, final):
 
-                self.recognizer.adjust_for_ambient_noise(source)
+        self.user_input.delete("voice_start", "end-1c")
 
-                audio = self.recognizer.listen(source, timeout=5)
+        self.user_input.insert("end-1c", text + (" " if final else ""))
 
-            text = self.recognizer.recognize_google(audio, language="ru-RU")
+        if final:
 
-            self.user_input.insert(tk.END, text)
+            self.user_input.mark_set("voice_start", "end-1c")
 
-            self.status_label.config(text="Голосовой ввод завершен")
+            if not self.is_listening:
 
-        except Exception as e:
+                self.status_label.config(text="Голосовой ввод завершен")
 
-            self.status_label.config(text=f"Ошибка: {str(e)}")
+    def on_voice_error(self, error):
 
-        finally:
+        self.is_listening = False
 
-            self.stop_voice_input()
+        self.status_label.config(text=f"Ошибка: {str(error)}")
 
     def process_responses(self):
 
@@ -616,17 +688,27 @@ class Windows11AICoder:
 
     def update_system_info(self):
 
-        cpu = psutil.cpu_percent()
+        version = self.system_monitor.version
 
-        ram = psutil.virtual_memory().percent
+        if version != self._drawn_monitor_version:
 
-        self.sys_info_label.config(
+            self._drawn_monitor_version = version
 
-            text=f"CPU: {cpu}% | RAM: {ram}% | {platform.system()}"
+            latest = self.system_monitor.latest()
 
-        )
+            self.sys_info_label.config(
+
+                text=f"CPU: {latest['cpu']:.0f}% | RAM: {latest['ram']:.0f}% | "
 
-        self.root.after(5000, self.update_system_info)
+                     f"App: {latest['app_rss']:.0f} MB | Ollama: {latest['ollama_rss']:.0f} MB | {platform.system()}"
+
+            )
+
+            self.sparkline.draw(0, self.system_monitor.series("cpu"))
+
+            self.sparkline.draw(1, self.system_monitor.series("ram"))
+
+        self.root.after(1000, self.update_system_info)
 
     def show_settings(self):
 
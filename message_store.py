@@ -0,0 +1,216 @@
+import sys
+import time
+import zlib
+import threading
+from array import array
+from datetime import datetime
+
+COMPRESS_THRESHOLD = 512
+_PLAIN = 0
+_COMPRESSED = 1
+
+
+class MessageView:
+    """Легкое представление сообщения: текст распаковывается только при обращении."""
+
+    __slots__ = ("_store", "index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self.index = index
+
+    @property
+    def role(self):
+        return self._store.role(self.index)
+
+    @property
+    def model(self):
+        return self._store.model(self.index)
+
+    @property
+    def ts(self):
+        return self._store.timestamp(self.index)
+
+    @property
+    def content(self):
+        return self._store.text(self.index)
+
+    def __getitem__(self, key):
+        # Совместимость с кодом, работающим со словарями {"role": ..., "content": ...}
+        if key in ("role", "content", "model", "ts"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self):
+        return f"MessageView({self.index}, {self.role!r}, {self.content[:40]!r})"
+
+
+class MessageStore:
+    """
+    Компактное хранилище истории чата по колонкам: роли и модели интернированы и
+    хранятся индексами в array, время - в array('d'), текст - в UTF-8, а длинные
+    сообщения сжаты zlib. Отвечающее сообщение стримится во временный буфер и
+    попадает в колонки одним вызовом finish_streaming().
+
+    Запись идет из потока Tk, а чтение бывает и из рабочих потоков, поэтому все операции
+    выполняются под блокировкой. MessageView читает хранилище лениво; в другой поток
+    нужно передавать копию из as_dicts().
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._role_table = []
+        self._role_ids = {}
+        self._model_table = [None]
+        self._model_ids = {None: 0}
+        self._roles = array("B")
+        self._models = array("H")
+        self._timestamps = array("d")
+        self._flags = array("B")
+        self._texts = []
+        self._pending = None
+
+    @classmethod
+    def from_records(cls, records):
+        store = cls()
+        for record in records:
+            ts = record.get("ts")
+            if isinstance(ts, str):
+                try:
+                    ts = datetime.fromisoformat(ts).timestamp()
+                except ValueError:
+                    ts = None
+            store.append(record["role"], record.get("content", ""), record.get("model"), ts)
+        return store
+
+    # --- Интернирование ---
+
+    def _role_id(self, role):
+        role_id = self._role_ids.get(role)
+        if role_id is None:
+            role_id = self._role_ids[role] = len(self._role_table)
+            self._role_table.append(sys.intern(role))
+        return role_id
+
+    def _model_id(self, model):
+        model_id = self._model_ids.get(model)
+        if model_id is None:
+            model_id = self._model_ids[model] = len(self._model_table)
+            self._model_table.append(sys.intern(model))
+        return model_id
+
+    # --- Запись ---
+
+    def append(self, role, content, model=None, ts=None):
+        data = content.encode("utf-8")
+        flag = _PLAIN
+        if len(data) > COMPRESS_THRESHOLD:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                data, flag = compressed, _COMPRESSED
+        with self._lock:
+            self._roles.append(self._role_id(role))
+            self._models.append(self._model_id(model))
+            self._timestamps.append(ts or time.time())
+            self._flags.append(flag)
+            self._texts.append(data)
+            return len(self._texts) - 1
+
+    def begin_streaming(self, role="assistant", model=None):
+        with self._lock:
+            self._pending = (role, model, [])
+
+    def stream_append(self, chunk):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[2].append(chunk)
+
+    def pending_text(self):
+        with self._lock:
+            return "".join(self._pending[2]) if self._pending is not None else ""
+
+    def finish_streaming(self):
+        """Переносит накопленный ответ в хранилище. Возвращает его индекс (или None)."""
+        with self._lock:
+            if self._pending is None:
+                return None
+            role, model, chunks = self._pending
+            self._pending = None
+            return self.append(role, "".join(chunks), model)
+
+    def discard_streaming(self):
+        with self._lock:
+            self._pending = None
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    # --- Чтение ---
+
+    def __len__(self):
+        return len(self._texts)
+
+    def role(self, index):
+        with self._lock:
+            return self._role_table[self._roles[index]]
+
+    def model(self, index):
+        with self._lock:
+            return self._model_table[self._models[index]]
+
+    def timestamp(self, index):
+        with self._lock:
+            return self._timestamps[index]
+
+    def text(self, index):
+        with self._lock:
+            data, flag = self._texts[index], self._flags[index]
+        if flag == _COMPRESSED:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MessageView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        return MessageView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield MessageView(self, index)
+
+    def __reversed__(self):
+        for index in range(len(self) - 1, -1, -1):
+            yield MessageView(self, index)
+
+    def as_dicts(self, last_n=None):
+        """Копия истории списком словарей role/content, снятая под блокировкой."""
+        with self._lock:
+            start = max(0, len(self) - last_n) if last_n else 0
+            return [{"role": self.role(i), "content": self.text(i)} for i in range(start, len(self))]
+
+    def memory_usage(self):
+        """Примерный объем памяти в байтах (без учета таблиц ролей и моделей)."""
+        with self._lock:
+            return (sum(sys.getsizeof(t) for t in self._texts) + sys.getsizeof(self._texts)
+                + self._roles.buffer_info()[1] * self._roles.itemsize
+                + self._models.buffer_info()[1] * self._models.itemsize
+                + self._timestamps.buffer_info()[1] * self._timestamps.itemsize
+                + self._flags.buffer_info()[1] * self._flags.itemsize)
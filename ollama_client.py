@@ -0,0 +1,185 @@
+import json
+import time
+import logging
+
+_requests_available = False
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    _requests_available = True
+except ImportError:
+    pass
+
+from project_index import estimate_tokens
+from tracing import tracer
+
+logger = logging.getLogger("AICoderUltimate")
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_CONFIG_FILE = "ai_coder_config.json"
+DEFAULT_MODEL_CONFIG = {"context_window": 8192, "pre_prompt": "You are a helpful AI."}
+DEFAULT_CONFIG = {
+    "current_model": "deepseek-coder-v2:16b",
+    "ollama_host": DEFAULT_HOST,
+    "models": {
+        "deepseek-coder-v2:16b": {
+            "pre_prompt": "You are an expert coding assistant...",
+            "context_window": 16384,
+            "temperature": 0.3,
+            "max_tokens": 4096
+        }
+    },
+    "ui": {"font_size": 11, "theme": "dark", "animation_speed": 1.0, "enable_animations": True},
+    "prefetch": {
+        "enabled": False,
+        "prompts": ["Add unit tests for this code", "Explain how this code works"],
+        "delay": 2.0,
+        "max_prompts": 2
+    }
+}
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+def load_config(path=DEFAULT_CONFIG_FILE):
+    """Читает ai_coder_config.json; при ошибке возвращает настройки по умолчанию."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Using default config: {e}")
+        return json.loads(json.dumps(DEFAULT_CONFIG))
+    config.setdefault("ollama_host", DEFAULT_HOST)
+    config.setdefault("models", {})
+    return config
+
+
+def get_model_config(config, model_name=None):
+    model_name = model_name or config.get("current_model")
+    return config.get("models", {}).get(model_name, DEFAULT_MODEL_CONFIG)
+
+
+def model_options(model_config):
+    """Переводит настройки модели из конфига в options Ollama."""
+    options = {"num_ctx": model_config.get("context_window", 8192)}
+    if "temperature" in model_config:
+        options["temperature"] = model_config["temperature"]
+    if "max_tokens" in model_config:
+        options["num_predict"] = model_config["max_tokens"]
+    return options
+
+
+def build_messages(model_config, context, prompt):
+    """
+    Собирает сообщения для /api/chat: pre_prompt, история и новый запрос.
+    Старые сообщения отбрасываются, если не помещаются в context_window.
+    """
+    with tracer.span("context.build", "context", history=len(context)):
+        return _build_messages(model_config, context, prompt)
+
+
+def _build_messages(model_config, context, prompt):
+    budget = (model_config.get("context_window", 8192)
+              - model_config.get("max_tokens", 2048)
+              - estimate_tokens(model_config.get("pre_prompt", ""))
+              - estimate_tokens(prompt))
+    history = []
+    for message in reversed(context):
+        cost = estimate_tokens(message["content"])
+        if cost > budget:
+            break
+        budget -= cost
+        history.append({"role": message["role"], "content": message["content"]})
+    history.reverse()
+    messages = []
+    if model_config.get("pre_prompt"):
+        messages.append({"role": "system", "content": model_config["pre_prompt"]})
+    messages.extend(history)
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+class OllamaClient:
+    """
+    Клиент Ollama с общим пулом соединений. chat_stream() отдает токены по мере
+    поступления; статистика последнего ответа (eval_count, tokens/s и т.д.) кладется в stats.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, pool_size=8, timeout=(5, 300), keep_alive=None):
+        if not _requests_available:
+            raise RuntimeError("requests is not installed")
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def chat_stream(self, model, messages, options=None, cancel_event=None, stats=None):
+        payload = {"model": model, "messages": messages, "stream": True}
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        started = time.perf_counter()
+        first_token_at = None
+        parse_time = 0.0
+        tokens = 0
+        # http.headers: отправка запроса -> заголовки ответа; first_token: отправка -> первый токен
+        headers_span = tracer.begin("http.headers", "http", model=model)
+        first_token_span = tracer.begin("first_token", "http", model=model)
+        with self.session.post(f"{self.host}/api/chat", json=payload, stream=True, timeout=self.timeout) as response:
+            tracer.end(headers_span, status=response.status_code)
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled()
+                if not line:
+                    continue
+                parse_started = time.perf_counter()
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                token = chunk.get("message", {}).get("content", "")
+                parse_time += time.perf_counter() - parse_started
+                if token:
+                    tokens += 1
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        tracer.end(first_token_span)
+                    yield token
+                if chunk.get("done"):
+                    elapsed = time.perf_counter() - started
+                    tracer.instant("generation.done", "http", model=model, tokens=tokens,
+                                   elapsed_ms=round(elapsed * 1000, 1), parse_ms=round(parse_time * 1000, 3))
+                    if stats is not None:
+                        eval_count = chunk.get("eval_count", 0)
+                        eval_duration = chunk.get("eval_duration", 0) / 1e9
+                        stats.update({
+                            "model": model,
+                            "elapsed": elapsed,
+                            "first_token": (first_token_at - started) if first_token_at else None,
+                            "prompt_eval_count": chunk.get("prompt_eval_count", 0),
+                            "eval_count": eval_count,
+                            "tokens_per_second": eval_count / eval_duration if eval_duration else None,
+                        })
+                    break
+
+    def chat(self, model, messages, options=None, cancel_event=None, stats=None):
+        return "".join(self.chat_stream(model, messages, options, cancel_event, stats))
+
+    def list_models(self):
+        response = self.session.get(f"{self.host}/api/tags", timeout=self.timeout)
+        response.raise_for_status()
+        return [m["name"] for m in response.json().get("models", [])]
+
+    def close(self):
+        self.session.close()
+
+
+def client_from_config(config, pool_size=8):
+    return OllamaClient(config.get("ollama_host", DEFAULT_HOST), pool_size=pool_size,
+                        keep_alive=config.get("keep_alive"))
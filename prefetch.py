@@ -0,0 +1,92 @@
+import logging
+import threading
+
+from ollama_client import DEFAULT_CONFIG
+from response_cache import cache_key
+from scheduler import BATCH, QueueFull
+
+logger = logging.getLogger("AICoderUltimate")
+
+CLIENT_ID = "prefetch"
+
+
+class SpeculativePrefetcher:
+    """
+    Пока пользователь читает готовый ответ, заранее генерирует ответы на типичные
+    продолжения диалога (config["prefetch"]["prompts"]) с самым низким приоритетом
+    и кладет их в общий ResponseCache. Если пользователь отправит такой же запрос
+    при той же истории, ответ придет из кэша мгновенно. Запуск откладывается на
+    delay секунд и происходит только при простаивающем хосте; любое действие
+    пользователя отменяет предвыборку через cancel().
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.started = 0
+        self._generation = 0
+        self._timer = None
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self):
+        return dict(DEFAULT_CONFIG["prefetch"], **self.service.config.get("prefetch", {}))
+
+    def schedule(self, context, model=None):
+        """Вызывается после завершения ответа. context копируется сразу: история может измениться."""
+        settings = self.settings
+        if not settings["enabled"] or not settings["prompts"]:
+            return
+        snapshot = [{"role": m["role"], "content": m["content"]} for m in context]
+        self.cancel()
+        timer = threading.Timer(settings["delay"], self._start, args=(snapshot, model, settings))
+        timer.daemon = True
+        with self._lock:
+            self._timer = timer
+        timer.start()
+
+    def _host_idle(self):
+        scheduler = self.service.scheduler
+        return scheduler.running == 0 and scheduler.queued == 0
+
+    def _start(self, context, model, settings):
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer = None
+            generation = self._generation
+        if not self._host_idle():
+            logger.debug("Prefetch skipped: host is busy")
+            return
+        for prompt in settings["prompts"][:settings["max_prompts"]]:
+            if self.is_prefetched(prompt, context, model):
+                continue
+            try:
+                _, job = self.service.stream(CLIENT_ID, prompt, model, context, use_cache=False,
+                                             priority=BATCH, requeue=False)
+            except QueueFull:
+                break
+            with self._lock:
+                cancelled = generation != self._generation
+                if not cancelled:
+                    self._jobs.append(job)
+            if cancelled:
+                # Пользователь начал печатать, пока задание ставилось в очередь
+                job.cancel()
+                return
+            self.started += 1
+            logger.info(f"Prefetching follow-up: {prompt[:60]!r}")
+
+    def is_prefetched(self, prompt, context, model=None):
+        model, messages, options, _ = self.service.prepare(prompt, model, context)
+        return cache_key(model, messages, options) in self.service.cache
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            timer, self._timer = self._timer, None
+            jobs, self._jobs = self._jobs, []
+        if timer:
+            timer.cancel()
+        for job in jobs:
+            job.cancel()
@@ -0,0 +1,273 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+
+from remover_comments import SUPPORTED_EXTENSIONS, IGNORED_DIRS, clean_code, iter_source_files
+
+INDEX_FILENAME = ".ai_coder_index.json"
+INDEX_VERSION = 2
+CHUNK_LINES = 40
+CHARS_PER_TOKEN = 4
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|[^\W\d_]+", re.UNICODE)
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_BOUNDARY_RE = re.compile(r"^(async\s+def|def|class|function|export)\b|^[.#]?[\w-]+\s*\{")
+
+
+def estimate_tokens(text):
+    """Грубая оценка числа токенов без токенизатора модели."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize_text(text):
+    """Разбивает текст на термы: идентификаторы целиком и их части (snake_case, camelCase)."""
+    terms = []
+    for word in _IDENTIFIER_RE.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        if "_" in word or not word.islower():
+            parts = [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+            if len(parts) > 1:
+                terms.extend(parts)
+    return terms
+
+
+def map_cleaned_lines(source, cleaned):
+    """
+    Сопоставляет строки очищенного текста строкам исходника (номера с 1): очистка
+    удаляет комментарии и пустые строки, но не переставляет код, поэтому достаточно
+    одного прохода вперед по исходнику.
+    """
+    source_lines = [line.strip() for line in source.splitlines()]
+    mapping = []
+    position = 0
+    for line in cleaned.splitlines():
+        text = line.strip()
+        found = position
+        if text:
+            for i in range(position, len(source_lines)):
+                if source_lines[i].startswith(text):
+                    found = i
+                    break
+        mapping.append(found + 1)
+        position = min(found + 1, len(source_lines)) if text else position
+    return mapping
+
+
+def split_into_chunks(text, max_lines=CHUNK_LINES):
+    """
+    Делит очищенный код на фрагменты по max_lines строк, стараясь резать
+    на границах верхнеуровневых определений. Возвращает [(start_line, text), ...].
+    """
+    lines = text.splitlines()
+    chunks = []
+    start = 0
+    for i in range(1, len(lines) + 1):
+        at_end = i == len(lines)
+        at_boundary = not at_end and _BOUNDARY_RE.match(lines[i]) and i - start >= max_lines // 4
+        if at_end or at_boundary or i - start >= max_lines:
+            block = lines[start:i]
+            first = next((k for k, line in enumerate(block) if line.strip()), None)
+            if first is not None:
+                chunks.append((start + first + 1, "\n".join(block).strip()))
+            start = i
+    return chunks
+
+
+class ProjectIndex:
+    """
+    Локальный BM25-индекс по исходникам проекта (только CPU, без сети).
+    Файлы очищаются от комментариев через remover_comments, индекс обновляется
+    инкрементально по mtime/размеру и хранится в INDEX_FILENAME в корне проекта.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, root_dir, index_path=None, extensions=SUPPORTED_EXTENSIONS, ignored_dirs=IGNORED_DIRS):
+        self.root_dir = os.path.abspath(root_dir)
+        self.index_path = index_path or os.path.join(self.root_dir, INDEX_FILENAME)
+        self.extensions = [e.lower() for e in extensions]
+        self.ignored_dirs = list(ignored_dirs) + [".git", "__pycache__", "node_modules"]
+        self._lock = threading.RLock()
+        self.files = {}
+        self._chunks = []
+        self._free_ids = []
+        self._file_chunks = {}
+        self._postings = defaultdict(dict)
+        self._chunk_count = 0
+        self._total_length = 0
+        self._load()
+
+    # --- Хранение ---
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.files = data.get("files", {})
+            self._rebuild_postings()
+
+    def save(self):
+        # Снимок под блокировкой: записи файлов заменяются целиком и после создания не меняются,
+        # поэтому поверхностной копии достаточно, а сериализация идет уже без блокировки
+        with self._lock:
+            data = {"version": INDEX_VERSION, "files": dict(self.files)}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    # --- Обновление ---
+
+    def refresh(self):
+        """
+        Переиндексирует только новые и измененные файлы, удаляет исчезнувшие.
+        Возвращает число переиндексированных файлов.
+        """
+        seen = set()
+        changed = 0
+        for filepath in iter_source_files(self.root_dir, self.ignored_dirs, skip_paths=[self.index_path]):
+            extension = os.path.splitext(filepath)[1].lower()
+            if extension not in self.extensions:
+                continue
+            relpath = os.path.relpath(filepath, self.root_dir)
+            seen.add(relpath)
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            record = self.files.get(relpath)
+            if record and record["mtime"] == stat.st_mtime and record["size"] == stat.st_size:
+                continue
+            if self._index_file(filepath, relpath, extension, stat):
+                changed += 1
+        with self._lock:
+            removed = [path for path in self.files if path not in seen]
+            for path in removed:
+                del self.files[path]
+                self._remove_postings(path)
+        if changed or removed:
+            self.save()
+        return changed
+
+    def update_file(self, filepath):
+        """Переиндексирует один файл (например, по событию изменения)."""
+        filepath = os.path.abspath(filepath)
+        relpath = os.path.relpath(filepath, self.root_dir)
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension not in self.extensions:
+            return False
+        if not os.path.exists(filepath):
+            with self._lock:
+                changed = self.files.pop(relpath, None) is not None
+                self._remove_postings(relpath)
+        else:
+            changed = self._index_file(filepath, relpath, extension, os.stat(filepath))
+        if changed:
+            self.save()
+        return changed
+
+    def _index_file(self, filepath, relpath, extension, stat):
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                content = f.read()
+            cleaned = clean_code(content, extension, compact_mode=False)
+        except Exception as e:
+            print(f"Ошибка при индексации '{filepath}': {e}")
+            return False
+        # Фрагменты режутся по очищенному тексту, а номера строк в метках - исходные
+        line_map = map_cleaned_lines(content, cleaned)
+        chunks = [[line_map[line - 1] if line <= len(line_map) else line, text]
+                  for line, text in split_into_chunks(cleaned)]
+        with self._lock:
+            self.files[relpath] = {"mtime": stat.st_mtime, "size": stat.st_size, "chunks": chunks}
+            self._remove_postings(relpath)
+            self._add_postings(relpath)
+        return True
+
+    # --- Постинги: обновляются только для измененного файла ---
+
+    def _rebuild_postings(self):
+        with self._lock:
+            self._chunks = []
+            self._free_ids = []
+            self._file_chunks = {}
+            self._postings = defaultdict(dict)
+            self._chunk_count = 0
+            self._total_length = 0
+            for relpath in sorted(self.files):
+                self._add_postings(relpath)
+
+    def _add_postings(self, relpath):
+        chunk_ids = []
+        for line, text in self.files[relpath]["chunks"]:
+            terms = tokenize_text(text)
+            entry = (relpath, line, text, len(terms))
+            if self._free_ids:
+                chunk_id = self._free_ids.pop()
+                self._chunks[chunk_id] = entry
+            else:
+                chunk_id = len(self._chunks)
+                self._chunks.append(entry)
+            chunk_ids.append(chunk_id)
+            self._chunk_count += 1
+            self._total_length += len(terms)
+            for term, tf in Counter(terms).items():
+                self._postings[term][chunk_id] = tf
+        self._file_chunks[relpath] = chunk_ids
+
+    def _remove_postings(self, relpath):
+        for chunk_id in self._file_chunks.pop(relpath, ()):
+            _, _, text, length = self._chunks[chunk_id]
+            for term in set(tokenize_text(text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._chunks[chunk_id] = None
+            self._free_ids.append(chunk_id)
+            self._chunk_count -= 1
+            self._total_length -= length
+
+    # --- Поиск ---
+
+    def search(self, query, k=5):
+        """Возвращает top-k фрагментов [(score, relpath, start_line, text), ...] по BM25."""
+        with self._lock:
+            n = self._chunk_count
+            if not n:
+                return []
+            avg_length = self._total_length / n
+            scores = defaultdict(float)
+            for term in set(tokenize_text(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    length = self._chunks[chunk_id][3]
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                    scores[chunk_id] += idf * norm
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(score, self._chunks[cid][0], self._chunks[cid][1], self._chunks[cid][2]) for cid, score in best]
+
+    def select_context(self, query, token_budget, k=8):
+        """Выбирает самые релевантные фрагменты, укладывающиеся в token_budget."""
+        selected = []
+        used = 0
+        for score, relpath, line, text in self.search(query, k):
+            block = f"# {relpath}:{line}\n{text}"
+            cost = estimate_tokens(block)
+            if used + cost > token_budget:
+                continue
+            selected.append(block)
+            used += cost
+        return selected
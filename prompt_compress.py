@@ -0,0 +1,101 @@
+import re
+import hashlib
+import logging
+from collections import OrderedDict
+
+from project_index import estimate_tokens
+from python_transform import DOCSTRINGS, MINIFY, TransformError, transform_source
+from remover_comments import clean_code
+from tracing import tracer
+
+logger = logging.getLogger("AICoderUltimate")
+
+CODE_BLOCK_RE = re.compile(r"```([\w+#.-]*)([^\n]*)\n(.*?)```", re.DOTALL)
+LANGUAGE_EXTENSIONS = {
+    "py": ".py", "python": ".py", "python3": ".py",
+    "js": ".js", "javascript": ".js",
+    "html": ".html", "htm": ".html",
+    "css": ".css",
+}
+# Имена и аннотации несут смысл для модели, поэтому в запросах только убираем комментарии,
+# docstrings и лишние пробелы
+PROMPT_TRANSFORMS = frozenset({DOCSTRINGS, MINIFY})
+MIN_DEDUPE_CHARS = 200
+CACHE_SIZE = 512
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class PromptCompressor:
+    """
+    Этап перед отправкой запроса: код в блоках ``` сжимается плотным режимом
+    remover_comments, а блок, уже встречавшийся в отправляемом контексте, заменяется
+    ссылкой на сообщение с ним. Результаты очистки кэшируются по хэшу блока, так что
+    история, повторяемая в каждом запросе, обрабатывается один раз.
+    """
+
+    def __init__(self, clean=True, dedupe=True, min_dedupe_chars=MIN_DEDUPE_CHARS, cache_size=CACHE_SIZE):
+        self.clean = clean
+        self.dedupe = dedupe
+        self.min_dedupe_chars = min_dedupe_chars
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def clean_block(self, language, code):
+        extension = LANGUAGE_EXTENSIONS.get(language.lower())
+        if not self.clean or not extension:
+            return code
+        key = (extension, _digest(code))
+        cleaned = self._cache.get(key)
+        if cleaned is not None:
+            self._cache.move_to_end(key)
+            return cleaned
+        if extension == ".py":
+            try:
+                cleaned = transform_source(code, PROMPT_TRANSFORMS)
+            except (SyntaxError, ValueError, TransformError):
+                # Фрагмент, который не разбирается целиком: только комментарии, без сжатия пробелов
+                cleaned = clean_code(code, extension, compact_mode=False)
+        else:
+            cleaned = clean_code(code, extension, compact_mode=True)
+        if len(cleaned) >= len(code.rstrip()):
+            cleaned = code
+        self._cache[key] = cleaned
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return cleaned
+
+    def compress_messages(self, messages):
+        """Возвращает (новый список сообщений, статистика). Системные сообщения не меняются."""
+        with tracer.span("context.compress", "context", messages=len(messages)):
+            stats = {"tokens_before": 0, "tokens_after": 0, "blocks_cleaned": 0, "blocks_deduped": 0}
+            seen = {}
+            result = []
+            number = 0
+            for message in messages:
+                content = message["content"]
+                stats["tokens_before"] += estimate_tokens(content)
+                if message["role"] != "system":
+                    number += 1
+                    if "```" in content:
+                        content = CODE_BLOCK_RE.sub(lambda m: self._replace_block(m, number, seen, stats), content)
+                stats["tokens_after"] += estimate_tokens(content)
+                result.append(dict(message, content=content) if content != message["content"] else message)
+            stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+        return result, stats
+
+    def _replace_block(self, match, number, seen, stats):
+        language, info, code = match.group(1), match.group(2), match.group(3)
+        cleaned = self.clean_block(language, code)
+        if cleaned != code:
+            stats["blocks_cleaned"] += 1
+        digest = _digest(cleaned.strip())
+        if self.dedupe and len(cleaned) >= self.min_dedupe_chars:
+            first = seen.get(digest)
+            if first is not None and first != number:
+                stats["blocks_deduped"] += 1
+                return f"(same {language or 'code'} block as in message #{first} above)"
+            seen.setdefault(digest, number)
+        return f"```{language}{info}\n{cleaned.rstrip()}\n```"
@@ -0,0 +1,416 @@
+import io
+import os
+import ast
+import json
+import pickle
+import hashlib
+import keyword
+import builtins
+import tokenize
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+DOCSTRINGS = "docstrings"
+ANNOTATIONS = "annotations"
+ASSERTS = "asserts"
+DEBUG_BLOCKS = "debug"
+RENAME_LOCALS = "locals"
+MINIFY = "minify"
+
+ALL_TRANSFORMS = frozenset({DOCSTRINGS, ANNOTATIONS, ASSERTS, DEBUG_BLOCKS, RENAME_LOCALS, MINIFY})
+# Для сжатого режима. Меняется только то, что код может узнать о себе сам: docstrings
+# пропадают из __doc__, имена локальных переменных - из трассировок. Аннотации сюда не
+# входят: их читают во время выполнения (functools.singledispatch, pydantic), поэтому они,
+# как assert и блоки __debug__, убираются только по явному запросу
+COMPACT_TRANSFORMS = frozenset({DOCSTRINGS, RENAME_LOCALS, MINIFY})
+READABLE_TRANSFORMS = frozenset({DOCSTRINGS})
+
+TREE_CACHE_SIZE = 256
+DEFAULT_CACHE_FILE = ".remover_cache.json"
+
+_RESERVED = set(keyword.kwlist) | set(keyword.softkwlist) | set(dir(builtins))
+_DYNAMIC_SCOPE_CALLS = {"locals", "vars", "eval", "exec", "dir"}
+
+
+class TransformError(Exception):
+    pass
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# --- Кэш разобранных деревьев ---
+
+_tree_cache = OrderedDict()
+_tree_lock = threading.Lock()
+
+
+def parse_cached(content, digest=None):
+    """
+    Возвращает свежую копию AST для содержимого. Деревья кэшируются по хэшу в виде
+    pickle: распаковка заметно быстрее повторного разбора и дает независимую копию,
+    которую трансформации могут менять на месте.
+    """
+    digest = digest or content_hash(content)
+    with _tree_lock:
+        data = _tree_cache.get(digest)
+        if data is not None:
+            _tree_cache.move_to_end(digest)
+    if data is not None:
+        return pickle.loads(data)
+    tree = ast.parse(content)
+    with _tree_lock:
+        _tree_cache[digest] = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        while len(_tree_cache) > TREE_CACHE_SIZE:
+            _tree_cache.popitem(last=False)
+    return tree
+
+
+# --- Трансформации AST ---
+
+def _is_docstring(node):
+    return (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str))
+
+
+def _is_debug_test(test):
+    """True для `if __debug__`, False для `if not __debug__`, None для остальных условий."""
+    if isinstance(test, ast.Name) and test.id == "__debug__":
+        return True
+    if (isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not)
+            and isinstance(test.operand, ast.Name) and test.operand.id == "__debug__"):
+        return False
+    return None
+
+
+class _StatementStripper(ast.NodeTransformer):
+    """Удаляет docstrings, аннотации, assert и ветки `if __debug__` согласно набору трансформаций."""
+
+    def __init__(self, transforms):
+        self.transforms = transforms
+        self._scopes = ["module"]
+
+    def generic_visit(self, node):
+        filled = {field for field in ("body", "finalbody") if getattr(node, field, None)}
+        super().generic_visit(node)
+        for field in filled:
+            if not getattr(node, field):
+                setattr(node, field, [ast.Pass()])
+        return node
+
+    def _visit_scope(self, node, kind):
+        if DOCSTRINGS in self.transforms and node.body and _is_docstring(node.body[0]):
+            node.body = node.body[1:] or [ast.Pass()]
+        self._scopes.append(kind)
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._scopes.pop()
+
+    def visit_Module(self, node):
+        return self._visit_scope(node, "module")
+
+    def visit_ClassDef(self, node):
+        return self._visit_scope(node, "class")
+
+    def _visit_function(self, node):
+        if ANNOTATIONS in self.transforms:
+            node.returns = None
+            args = node.args
+            for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+                if arg is not None:
+                    arg.annotation = None
+        return self._visit_scope(node, "function")
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_AnnAssign(self, node):
+        # В теле класса аннотации - это поля (dataclass, NamedTuple, TypedDict), их не трогаем
+        if ANNOTATIONS not in self.transforms or self._scopes[-1] == "class" or not isinstance(node.target, ast.Name):
+            return self.generic_visit(node)
+        if node.value is None:
+            # В функции `x: int` делает x локальной переменной: удаление изменило бы область видимости
+            return node if self._scopes[-1] == "function" else None
+        return ast.copy_location(ast.Assign(targets=[node.target], value=self.visit(node.value)), node)
+
+    def visit_Assert(self, node):
+        return None if ASSERTS in self.transforms else node
+
+    def visit_If(self, node):
+        debug = _is_debug_test(node.test) if DEBUG_BLOCKS in self.transforms else None
+        if debug is None:
+            return self.generic_visit(node)
+        # Как при python -O: __debug__ равен False
+        result = []
+        for stmt in (node.orelse if debug else node.body):
+            visited = self.visit(stmt)
+            if visited is not None:
+                result.extend(visited if isinstance(visited, list) else [visited])
+        return result or None
+
+
+def _short_names(taken):
+    length = 1
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    while True:
+        indices = [0] * length
+        while True:
+            name = "".join(letters[i] for i in indices)
+            if name not in taken and name not in _RESERVED:
+                yield name
+            position = length - 1
+            while position >= 0 and indices[position] == len(letters) - 1:
+                indices[position] = 0
+                position -= 1
+            if position < 0:
+                break
+            indices[position] += 1
+        length += 1
+
+
+def _body_nodes(func):
+    """
+    Узлы тела функции. Декораторы, значения по умолчанию и аннотации вычисляются
+    в охватывающей области видимости, поэтому в обход не входят.
+    """
+    for stmt in func.body:
+        yield from ast.walk(stmt)
+
+
+def _renamable_locals(func):
+    """
+    Локальные имена функции, которые безопасно переименовать, или None, если функцию лучше не трогать.
+    Генераторы списков/множеств/словарей, генераторные выражения и lambda - отдельные области
+    видимости: имена, связанные в них (переменные цикла, параметры lambda), не переименовываются,
+    иначе одноименное внешнее имя, используемое в теле функции, стало бы неопределенным.
+    """
+    stored, used, excluded = set(), set(), set()
+    for node in _body_nodes(func):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal)):
+            return None, None
+        if isinstance(node, ast.comprehension):
+            for target in ast.walk(node.target):
+                if isinstance(target, ast.Name):
+                    excluded.add(target.id)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _DYNAMIC_SCOPE_CALLS:
+            return None, None
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+            if isinstance(node.ctx, (ast.Store, ast.Del)):
+                stored.add(node.id)
+        elif isinstance(node, ast.arg):
+            used.add(node.arg)
+            excluded.add(node.arg)
+        elif isinstance(node, ast.alias):
+            bound = (node.asname or node.name).split(".")[0]
+            used.add(bound)
+            excluded.add(bound)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            used.add(node.name)
+            excluded.add(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            used.add(node.name)
+            excluded.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            used.add(node.rest)
+            excluded.add(node.rest)
+    # Параметры не переименовываем: их имена могут передаваться по ключу
+    for arg in func.args.posonlyargs + func.args.args + func.args.kwonlyargs + [func.args.vararg, func.args.kwarg]:
+        if arg is not None:
+            used.add(arg.arg)
+            excluded.add(arg.arg)
+    return stored - excluded - {"__class__"}, used
+
+
+class _LocalRenamer(ast.NodeTransformer):
+    """Переименовывает локальные переменные функций без вложенных областей видимости в короткие имена."""
+
+    def _visit_function(self, node):
+        candidates, used = _renamable_locals(node)
+        if candidates is None:
+            self.generic_visit(node)
+            return node
+        names = _short_names(used)
+        mapping = {}
+        for name in sorted(candidates, key=len, reverse=True):
+            short = next(names)
+            if len(short) < len(name):
+                mapping[name] = short
+        if mapping:
+            for child in _body_nodes(node):
+                if isinstance(child, ast.Name) and child.id in mapping:
+                    child.id = mapping[child.id]
+        return node
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+
+# --- Сжатая запись кода ---
+
+def _needs_space(previous, current):
+    if not previous:
+        return False
+    last, first = previous[-1], current[0]
+    if (last.isalnum() or last == "_") and (first.isalnum() or first in "_'\""):
+        return True
+    return previous[0].isdigit() and first == "."
+
+
+def minify_source(source):
+    """
+    Минимальные пробелы между токенами и отступ в один пробел на уровень.
+    Текст должен быть получен из ast.unparse (без комментариев и продолжений строк).
+    """
+    out = []
+    line = []
+    depth = 0
+    previous = ""
+    for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+        toktype, string = tok.type, tok.string
+        if toktype == getattr(tokenize, "FSTRING_START", None):
+            raise TransformError("f-string tokens are not supported by the minifier")
+        if toktype == tokenize.INDENT:
+            depth += 1
+        elif toktype == tokenize.DEDENT:
+            depth -= 1
+        elif toktype in (tokenize.NEWLINE, tokenize.NL):
+            if line:
+                out.append(" " * depth + "".join(line))
+            line = []
+            previous = ""
+        elif toktype == tokenize.ENDMARKER:
+            break
+        else:
+            if _needs_space(previous, string):
+                line.append(" ")
+            line.append(string)
+            previous = string
+    if line:
+        out.append(" " * depth + "".join(line))
+    return "\n".join(out)
+
+
+def transform_source(source, transforms=COMPACT_TRANSFORMS, filename="<string>", digest=None):
+    """
+    Применяет трансформации к исходному коду Python и проверяет результат: он должен
+    компилироваться, а его AST - совпадать с преобразованным деревом. Комментарии
+    пропадают при ast.unparse. Бросает SyntaxError для неразбираемого исходника и
+    TransformError, если проверка не прошла.
+    """
+    transforms = frozenset(transforms)
+    tree = parse_cached(source, digest)
+    tree = _StatementStripper(transforms).visit(tree)
+    if RENAME_LOCALS in transforms:
+        tree = _LocalRenamer().visit(tree)
+    ast.fix_missing_locations(tree)
+    output = ast.unparse(tree)
+    expected = ast.dump(tree)
+    checked = None
+    if MINIFY in transforms:
+        try:
+            minified = minify_source(output)
+            checked = ast.parse(minified)
+            if ast.dump(checked) == expected:
+                output = minified
+            else:
+                checked = None
+        except (TransformError, SyntaxError, tokenize.TokenError):
+            checked = None
+    try:
+        if checked is None:
+            checked = ast.parse(output)
+            if ast.dump(checked) != expected:
+                raise TransformError(f"{filename}: transformed code does not round-trip")
+        compile(checked, filename, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        raise TransformError(f"{filename}: transformed code does not compile: {e}")
+    return output
+
+
+# --- Пакетная обработка ---
+
+class TransformCache:
+    """Кэш результатов на диске: sha256 исходника + набор трансформаций -> результат."""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(digest, transforms):
+        return f"{digest}:{','.join(sorted(transforms))}"
+
+    def get(self, digest, transforms):
+        return self.entries.get(self.key(digest, transforms))
+
+    def put(self, digest, transforms, output):
+        self.entries[self.key(digest, transforms)] = output
+        self.dirty = True
+
+    def prune(self, live_keys):
+        for key in set(self.entries) - set(live_keys):
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def _transform_job(args):
+    source, transforms, filename, digest = args
+    try:
+        return transform_source(source, transforms, filename, digest), None
+    except (SyntaxError, TransformError, ValueError, RecursionError) as e:
+        return None, str(e)
+
+
+def transform_sources(items, transforms=COMPACT_TRANSFORMS, cache=None, workers=None):
+    """
+    items - список (filename, source). Возвращает {filename: (output | None, error | None)}.
+    Файлы, уже обработанные с тем же содержимым, берутся из кэша; остальные
+    обрабатываются параллельно в пуле процессов.
+    """
+    transforms = frozenset(transforms)
+    results = {}
+    pending = []
+    live_keys = []
+    for filename, source in items:
+        digest = content_hash(source)
+        live_keys.append(TransformCache.key(digest, transforms))
+        cached = cache.get(digest, transforms) if cache else None
+        if cached is not None:
+            results[filename] = (cached, None)
+        else:
+            pending.append((source, transforms, filename, digest))
+
+    if len(pending) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_transform_job, pending, chunksize=max(1, len(pending) // 32)))
+    else:
+        outputs = [_transform_job(job) for job in pending]
+
+    for (source, _, filename, digest), (output, error) in zip(pending, outputs):
+        results[filename] = (output, error)
+        if cache is not None and output is not None:
+            cache.put(digest, transforms, output)
+    if cache is not None:
+        # В кэше остаются только результаты для текущего содержимого файлов
+        cache.prune(live_keys)
+        cache.save()
+    return results
@@ -3,9 +3,15 @@ import os
 import sys
 import shutil
 from datetime import datetime
+import logging
 import tokenize
 from io import StringIO
 
+from python_transform import (COMPACT_TRANSFORMS, ASSERTS, DEBUG_BLOCKS, DEFAULT_CACHE_FILE,
+                              TransformCache, TransformError, transform_source, transform_sources)
+
+logger = logging.getLogger("AICoderUltimate")
+
 # --- Вспомогательные функции для очистки ---
 
 def _clean_python_code(content, compact_mode=False):
@@ -81,10 +87,10 @@ def _clean_python_code(content, compact_mode=False):
         cleaned_content_str = "".join(reconstructed_content)
 
     except tokenize.TokenError as e:
-        print(f"Предупреждение: Ошибка токенизации Python файла. Возможно, синтаксическая ошибка. Переход к fallback-методу: {e}")
+        logger.warning(f"Ошибка токенизации Python файла. Возможно, синтаксическая ошибка. Переход к fallback-методу: {e}")
         return _clean_python_code_fallback_regex(content, compact_mode)
     except Exception as e:
-        print(f"Предупреждение: Непредвиденная ошибка при токенизации Python файла. Переход к fallback-методу: {e}")
+        logger.warning(f"Непредвиденная ошибка при токенизации Python файла. Переход к fallback-методу: {e}")
         return _clean_python_code_fallback_regex(content, compact_mode)
 
     # Final cleanup regardless of mode
@@ -115,7 +121,7 @@ def _clean_python_code_fallback_regex(content, compact_mode=False):
                     in_multiline_string = not in_multiline_string
                 break
         
-        if in_multeline_string:
+        if in_multiline_string:
             continue
 
         if original_line_stripped.startswith('#'):
@@ -206,55 +212,141 @@ def _clean_html_js_css_code(content, compact_mode=False):
 
 # --- Основная логика обработки файлов ---
 
-def process_file(filepath, backup_dir, compact_mode):
+SUPPORTED_EXTENSIONS = ['.py', '.html', '.js', '.css']
+IGNORED_DIRS = ['venv', '.venv']
+
+
+def python_transforms(compact_mode, strip_debug=False):
+    """
+    Набор AST-трансформаций для Python: None в читаемом режиме (работает токенизатор),
+    в плотном - удаление docstrings, короткие локальные имена и минимальные пробелы.
+    strip_debug дополнительно убирает assert и блоки if __debug__ (как python -O).
+    """
+    if not compact_mode:
+        return None
+    return COMPACT_TRANSFORMS | {ASSERTS, DEBUG_BLOCKS} if strip_debug else COMPACT_TRANSFORMS
+
+
+def clean_code(content, file_extension, compact_mode=False, transforms=None):
+    """
+    Очищает содержимое файла по его расширению. Для неподдерживаемых расширений возвращает как есть.
+    """
+    file_extension = file_extension.lower()
+    if file_extension == '.py':
+        transforms = transforms if transforms is not None else python_transforms(compact_mode)
+        if transforms:
+            try:
+                return transform_source(content, transforms)
+            except (SyntaxError, ValueError, TransformError) as e:
+                logger.warning(f"AST-обработка не удалась, используется токенизатор: {e}")
+        return _clean_python_code(content, compact_mode)
+    elif file_extension in ['.html', '.js', '.css']:
+        return _clean_html_js_css_code(content, compact_mode)
+    return content
+
+
+def iter_source_files(directory, ignored_dirs=IGNORED_DIRS, skip_paths=(), skip_prefixes=()):
+    """
+    Обходит каталог и все подпапки, пропуская игнорируемые папки, указанные файлы и префиксы путей.
+    """
+    skip_paths = {os.path.abspath(p) for p in skip_paths}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in ignored_dirs]
+
+        for file in files:
+            filepath = os.path.join(root, file)
+            if os.path.abspath(filepath) in skip_paths or any(filepath.startswith(p) for p in skip_prefixes):
+                continue
+            yield filepath
+
+
+def create_backup_dir(base_dir, prefix="backup_cleaned_files"):
+    """
+    Создает папку бэкапов вида <prefix>_<время> внутри base_dir.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_dir = os.path.join(base_dir, f"{prefix}_{timestamp}")
+    os.makedirs(backup_dir, exist_ok=True)
+    return backup_dir
+
+
+def backup_file(filepath, backup_dir, base_dir=None):
+    """
+    Копирует файл в backup_dir, сохраняя его путь относительно base_dir (по умолчанию - папки скрипта).
+    """
+    base_dir = base_dir or os.path.dirname(os.path.abspath(sys.argv[0]))
+    relative_path = os.path.relpath(filepath, start=base_dir)
+    backup_filepath = os.path.join(backup_dir, relative_path)
+    os.makedirs(os.path.dirname(backup_filepath), exist_ok=True)
+    shutil.copy2(filepath, backup_filepath)
+    return backup_filepath
+
+
+def write_cleaned_file(filepath, original_content, cleaned_content, backup_dir, compact_mode):
+    """
+    Записывает очищенное содержимое, предварительно сделав бэкап. Ничего не делает, если содержимое не изменилось.
+    """
+    if cleaned_content == original_content:
+        return False
+    backup_filepath = backup_file(filepath, backup_dir)
+    print(f"Бэкап создан: {backup_filepath}")
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(cleaned_content)
+    print(f"Очищено: {filepath} (Режим: {'Плотный' if compact_mode else 'Читаемый'})")
+    return True
+
+
+def process_file(filepath, backup_dir, compact_mode, transforms=None):
     """
     Обрабатывает один файл: удаляет комментарии и делает бэкап.
     """
     filename, file_extension = os.path.splitext(filepath)
     file_extension = file_extension.lower()
 
-    supported_extensions = ['.py', '.html', '.js', '.css']
-    if file_extension not in supported_extensions:
+    if file_extension not in SUPPORTED_EXTENSIONS:
         return 
 
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             original_content = f.read()
 
-        cleaned_content = original_content
-
-        if file_extension == '.py':
-            cleaned_content = _clean_python_code(original_content, compact_mode)
-        elif file_extension in ['.html', '.js', '.css']:
-            cleaned_content = _clean_html_js_css_code(original_content, compact_mode)
-        
-        if cleaned_content != original_content:
-            # Create backup
-            script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
-            relative_path = os.path.relpath(filepath, start=script_dir)
-            backup_filepath = os.path.join(backup_dir, relative_path)
-            os.makedirs(os.path.dirname(backup_filepath), exist_ok=True)
-            shutil.copy2(filepath, backup_filepath)
-            print(f"Бэкап создан: {backup_filepath}")
-
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(cleaned_content)
-            print(f"Очищено: {filepath} (Режим: {'Плотный' if compact_mode else 'Читаемый'})")
-        # else:
-        #     print(f"В файле '{filepath}' не найдено комментариев или изменений.")
+        cleaned_content = clean_code(original_content, file_extension, compact_mode, transforms)
+        write_cleaned_file(filepath, original_content, cleaned_content, backup_dir, compact_mode)
 
     except Exception as e:
         print(f"Ошибка при обработке '{filepath}': {e}")
 
 
+def process_python_files(filepaths, backup_dir, compact_mode, transforms, cache_path=None, workers=None):
+    """
+    AST-обработка Python файлов в пуле процессов. Результаты кэшируются по хэшу содержимого,
+    поэтому повторный запуск не разбирает неизмененные файлы. Файлы, которые не удалось
+    обработать через AST, очищаются токенизатором.
+    """
+    sources = {}
+    for filepath in filepaths:
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                sources[filepath] = f.read()
+        except Exception as e:
+            print(f"Ошибка при обработке '{filepath}': {e}")
+
+    cache = TransformCache(cache_path) if cache_path else None
+    results = transform_sources(list(sources.items()), transforms, cache, workers)
+    for filepath, (cleaned_content, error) in results.items():
+        try:
+            if cleaned_content is None:
+                print(f"Предупреждение: AST-обработка '{filepath}' не удалась, используется токенизатор: {error}")
+                cleaned_content = _clean_python_code(sources[filepath], compact_mode)
+            write_cleaned_file(filepath, sources[filepath], cleaned_content, backup_dir, compact_mode)
+        except Exception as e:
+            print(f"Ошибка при обработке '{filepath}': {e}")
+
+
 def main():
     current_directory = os.path.dirname(os.path.abspath(sys.argv[0]))
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_folder_name = f"backup_cleaned_files_{timestamp}"
-    backup_dir = os.path.join(current_directory, backup_folder_name)
-    
-    os.makedirs(backup_dir, exist_ok=True)
+    backup_dir = create_backup_dir(current_directory)
     print(f"Файлы будут бэкапированы в: {backup_dir}")
 
     print("\nВыберите режим очистки:")
@@ -272,24 +364,32 @@ def main():
     else:
         print("Неверный выбор. По умолчанию будет использоваться читаемый режим.")
 
-    print(f"\nНачинаем очистку от комментариев в: {current_directory} и всех подпапках...")
-
-    ignored_dirs = ['venv', '.venv']
+    strip_debug = False
+    if compact_mode:
+        strip_debug = input("Удалять assert и блоки if __debug__ в Python (как python -O)? [y/N]: ").strip().lower() == 'y'
+    transforms = python_transforms(compact_mode, strip_debug)
 
-    for root, dirs, files in os.walk(current_directory):
-        dirs[:] = [d for d in dirs if d not in ignored_dirs]
+    print(f"\nНачинаем очистку от комментариев в: {current_directory} и всех подпапках...")
 
-        for file in files:
-            filepath = os.path.join(root, file)
-            if os.path.abspath(filepath) == os.path.abspath(sys.argv[0]) or filepath.startswith(backup_dir):
-                continue
-            
+    python_files = []
+    for filepath in iter_source_files(current_directory, skip_paths=[sys.argv[0]], skip_prefixes=[backup_dir]):
+        if transforms and filepath.lower().endswith('.py'):
+            python_files.append(filepath)
+        else:
             process_file(filepath, backup_dir, compact_mode)
+    if python_files:
+        process_python_files(python_files, backup_dir, compact_mode, transforms,
+                             cache_path=os.path.join(current_directory, DEFAULT_CACHE_FILE))
     
     print("\nОчистка завершена!")
     print(f"Резервные копии всех измененных файлов находятся в папке: {backup_dir}")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Неинтерактивный режим: очищенная копия дерева с отслеживанием изменений (см. clean_mirror.py)
+        from clean_mirror import main as mirror_main
+        sys.exit(mirror_main())
+
     print("--- ВАЖНОЕ ПРЕДУПРЕЖДЕНИЕ ---")
     print("Этот скрипт изменяет файлы напрямую.")
     print("Автоматически будут созданы резервные копии измененных файлов в новой папке.")
@@ -0,0 +1,45 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(model, messages, options=None):
+    """Ключ кэша: модель, сообщения и параметры генерации."""
+    payload = json.dumps([model, messages, options or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Потокобезопасный LRU-кэш готовых ответов модели, общий для GUI, CLI и API-сервера."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, response, stats=None):
+        with self._lock:
+            self._entries[key] = (response, stats or {})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,242 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from ollama_client import GenerationCancelled
+from tracing import tracer
+
+logger = logging.getLogger("AICoderUltimate")
+
+INTERACTIVE = 0
+SUMMARIZATION = 1
+BATCH = 2
+PRIORITY_NAMES = {"interactive": INTERACTIVE, "summarization": SUMMARIZATION, "batch": BATCH}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    Задание планировщика. func(job) должна проверять job.cancel_event во время генерации
+    и пробрасывать GenerationCancelled, чтобы вытесненное задание было поставлено в очередь повторно.
+    on_cancel() - единственное уведомление о том, что задание завершилось без результата:
+    планировщик вызывает его ровно один раз, если задание отменено в очереди или прервано
+    и не будет перезапущено. Сама func в этом случае ничего не сообщает.
+    """
+
+    def __init__(self, func, priority, client_id, preemptible, requeue, on_cancel=None):
+        self.func = func
+        self.on_cancel = on_cancel
+        self.priority = priority
+        self.client_id = client_id
+        self.preemptible = preemptible
+        self.requeue = requeue
+        self.cancel_event = threading.Event()
+        self.preempted = False
+        self.cancelled = False
+        self.attempts = 0
+        self.wait_span = tracer.begin("queue.wait", "scheduler", priority=priority, client=client_id)
+
+    def cancel(self):
+        self.cancelled = True
+        self.cancel_event.set()
+
+
+class PriorityScheduler:
+    """
+    Планировщик запросов к одному хосту Ollama. Классы приоритета: интерактивные >
+    суммаризация > пакетные; внутри класса клиенты обслуживаются по кругу. Не больше
+    max_concurrent генераций одновременно. Когда приходит интерактивный запрос, а все
+    слоты заняты, самая низкоприоритетная прерываемая генерация отменяется и
+    возвращается в начало своей очереди (requeue) - ее перезапустят, когда хост освободится.
+    """
+
+    def __init__(self, max_concurrent=1, max_queued=64, max_per_client=8):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES.values()}
+        self._queued = 0
+        self._running = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._workers = []
+        with self._cond:
+            self._spawn_workers()
+
+    def _spawn_workers(self):
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(target=self._work, daemon=True, name=f"scheduler-{len(self._workers)}")
+            self._workers.append(worker)
+            worker.start()
+
+    def resize(self, max_concurrent):
+        """Меняет число одновременных генераций; лишние рабочие потоки завершаются после текущего задания."""
+        with self._cond:
+            self.max_concurrent = max(1, max_concurrent)
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    @property
+    def queued(self):
+        return self._queued
+
+    @property
+    def running(self):
+        with self._cond:
+            return len(self._running)
+
+    def submit(self, func, priority=INTERACTIVE, client_id="local", preemptible=None, requeue=True, on_cancel=None):
+        """Ставит func(job) в очередь. on_cancel() вызывается, если задание завершилось без результата."""
+        if preemptible is None:
+            preemptible = priority > INTERACTIVE
+        job = Job(func, priority, client_id, preemptible, requeue, on_cancel)
+        with self._cond:
+            client_queue = self._queues[priority].get(client_id)
+            if self._queued >= self.max_queued:
+                raise QueueFull("server queue is full")
+            if client_queue is not None and len(client_queue) >= self.max_per_client:
+                raise QueueFull(f"too many pending requests for client {client_id}")
+            if client_queue is None:
+                client_queue = self._queues[priority][client_id] = deque()
+            client_queue.append(job)
+            self._queued += 1
+            if len(self._running) >= self.max_concurrent:
+                self._preempt_for(job)
+            self._cond.notify()
+        return job
+
+    def _preempt_for(self, job):
+        candidates = [r for r in self._running if r.preemptible and r.priority > job.priority and not r.preempted]
+        if not candidates:
+            return
+        victim = max(candidates, key=lambda r: r.priority)
+        victim.preempted = True
+        victim.cancel_event.set()
+        logger.info(f"Preempting priority {victim.priority} job of {victim.client_id} for priority {job.priority}")
+
+    def cancel_below(self, priority, client_id=None):
+        """
+        Отменяет queued и running задания с приоритетом ниже указанного. Планировщик общий
+        для всех клиентов хоста, поэтому обычно передается client_id: чужие задания не трогаются.
+        """
+        with self._cond:
+            for level, queues in self._queues.items():
+                if level <= priority:
+                    continue
+                for owner in [owner for owner in queues if client_id is None or owner == client_id]:
+                    client_queue = queues.pop(owner)
+                    for job in client_queue:
+                        job.cancel()
+                        self._notify_dropped(job)
+                    self._queued -= len(client_queue)
+            for job in self._running:
+                if job.priority > priority and (client_id is None or job.client_id == client_id):
+                    job.cancel()
+
+    def _notify_dropped(self, job):
+        if job.on_cancel:
+            try:
+                job.on_cancel()
+            except Exception as e:
+                logger.error(f"Job cancel callback failed: {e}")
+
+    def _next_job(self):
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            if not queues:
+                continue
+            client_id, client_queue = next(iter(queues.items()))
+            job = client_queue.popleft()
+            if client_queue:
+                queues.move_to_end(client_id)
+            else:
+                del queues[client_id]
+            self._queued -= 1
+            return job
+        return None
+
+    def _requeue(self, job):
+        job.preempted = False
+        job.cancel_event.clear()
+        queues = self._queues[job.priority]
+        client_queue = queues.get(job.client_id)
+        if client_queue is None:
+            client_queue = queues[job.client_id] = deque()
+        client_queue.appendleft(job)
+        self._queued += 1
+        job.wait_span = tracer.begin("queue.wait", "scheduler", priority=job.priority, client=job.client_id)
+        self._cond.notify()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    if len(self._workers) > self.max_concurrent:
+                        self._workers.remove(threading.current_thread())
+                        return
+                    job = self._next_job()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job.cancelled:
+                    self._notify_dropped(job)
+                    continue
+                self._running.append(job)
+            tracer.end(job.wait_span, attempt=job.attempts + 1)
+            job.wait_span = None
+            job.attempts += 1
+            interrupted = False
+            try:
+                with tracer.profile_thread():
+                    job.func(job)
+            except GenerationCancelled:
+                interrupted = True
+            except Exception as e:
+                logger.error(f"Scheduled job failed: {e}")
+            with self._cond:
+                self._running.remove(job)
+                if not interrupted:
+                    continue
+                if job.preempted and job.requeue and not job.cancelled and not self._stopped:
+                    self._requeue(job)
+                    continue
+            # Прервано окончательно (отменено, в том числе после вытеснения, или requeue=False)
+            self._notify_dropped(job)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for job in self._running:
+                job.cancel()
+            for queues in self._queues.values():
+                for client_queue in queues.values():
+                    for job in client_queue:
+                        job.cancel()
+                        self._notify_dropped(job)
+                queues.clear()
+            self._queued = 0
+            self._cond.notify_all()
+
+
+_host_schedulers = {}
+_host_schedulers_lock = threading.Lock()
+
+
+def get_host_scheduler(host, max_concurrent=1):
+    """
+    Один планировщик на хост Ollama: лимит одновременных генераций общий для всех компонентов.
+    Если планировщик уже есть, к нему применяется новый max_concurrent.
+    """
+    with _host_schedulers_lock:
+        scheduler = _host_schedulers.get(host)
+        if scheduler is None or scheduler._stopped:
+            scheduler = _host_schedulers[host] = PriorityScheduler(max_concurrent)
+        elif scheduler.max_concurrent != max(1, max_concurrent):
+            logger.info(f"Scheduler for {host}: max_concurrent {scheduler.max_concurrent} -> {max_concurrent}")
+            scheduler.resize(max_concurrent)
+        return scheduler
@@ -0,0 +1,188 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import threading
+
+from session_journal import iter_session, list_sessions
+
+DEFAULT_INDEX_PATH = os.path.join("sessions", "search_index.db")
+# Версия схемы (PRAGMA user_version): при смене токенизатора таблица пересоздается
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content,
+    session UNINDEXED,
+    position UNINDEXED,
+    role UNINDEXED,
+    model UNINDEXED,
+    ts UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _to_fts_query(query):
+    """
+    Превращает пользовательский запрос в безопасный запрос FTS5: все слова обязательны
+    и ищутся по префиксу ("cancel" находит "cancellation"; porter дополнительно
+    сводит английские словоформы к основе).
+    """
+    terms = re.findall(r"\w+", query, flags=re.UNICODE)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class SearchIndex:
+    """
+    Полнотекстовый индекс по всем сохраненным сессиям (SQLite FTS5).
+    Обновляется инкрементально по одному сообщению; поиск ранжируется по bm25.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        # Индекс старой схемы пересоздается пустым; владелец должен вызвать rebuild()
+        self.needs_rebuild = version != SCHEMA_VERSION
+        if self.needs_rebuild:
+            self._conn.execute("DROP TABLE IF EXISTS messages")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def add_message(self, session, position, role, content, model=None, ts=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages(content, session, position, role, model, ts) VALUES (?, ?, ?, ?, ?, ?)",
+                (content, session, position, role, model, ts))
+            self._conn.commit()
+
+    def _add_many(self, rows):
+        self._conn.executemany(
+            "INSERT INTO messages(content, session, position, role, model, ts) VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+
+    @staticmethod
+    def _session_rows(session, messages):
+        return [(m.get("content", ""), session, position, m.get("role"), m.get("model"), m.get("ts"))
+                for position, m in enumerate(messages)]
+
+    def index_session(self, session, messages):
+        """Переиндексирует одну сессию целиком."""
+        rows = self._session_rows(session, messages)
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session = ?", (session,))
+            self._add_many(rows)
+            self._conn.commit()
+        return len(rows)
+
+    def search(self, query, limit=20, model=None, session=None):
+        """
+        Возвращает список словарей session/position/role/model/ts/snippet,
+        отсортированных по релевантности.
+        """
+        fts_query = _to_fts_query(query)
+        if not fts_query:
+            return []
+        sql = ("SELECT session, position, role, model, ts, "
+               "snippet(messages, 0, '[', ']', '…', 16) "
+               "FROM messages WHERE messages MATCH ?")
+        params = [fts_query]
+        if model:
+            sql += " AND model = ?"
+            params.append(model)
+        if session:
+            sql += " AND session = ?"
+            params.append(session)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"session": r[0], "position": r[1], "role": r[2], "model": r[3], "ts": r[4], "snippet": r[5]}
+                for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    def rebuild(self, sessions_dir, extra_files=()):
+        """
+        Полностью перестраивает индекс по журналам сессий и (опционально)
+        по старым JSON-файлам чатов со списком сообщений. Все выполняется в одной
+        транзакции: при сбое посередине остается прежний индекс, а не пустой или частичный.
+        """
+        total = 0
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM messages")
+                for session_id in list_sessions(sessions_dir):
+                    # Только чтение: текущая сессия может дописываться, восстанавливать ее здесь нельзя
+                    try:
+                        rows = self._session_rows(session_id, iter_session(sessions_dir, session_id))
+                    except OSError as e:
+                        print(f"Ошибка при чтении сессии '{session_id}': {e}")
+                        continue
+                    self._add_many(rows)
+                    total += len(rows)
+                for filepath in extra_files:
+                    try:
+                        with open(filepath, "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                    except (OSError, ValueError) as e:
+                        print(f"Ошибка при чтении '{filepath}': {e}")
+                        continue
+                    messages = data.get("context", data.get("messages", [])) if isinstance(data, dict) else data
+                    session_id = os.path.splitext(os.path.basename(filepath))[0]
+                    rows = self._session_rows(session_id, [m for m in messages if isinstance(m, dict)])
+                    self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                    self._add_many(rows)
+                    total += len(rows)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.execute("INSERT INTO messages(messages) VALUES ('optimize')")
+            self._conn.commit()
+            self.needs_rebuild = False
+        return total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Поисковый индекс по сохраненным чатам")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="путь к файлу индекса")
+    parser.add_argument("--sessions", default="sessions", help="каталог журналов сессий")
+    parser.add_argument("--rebuild", action="store_true", help="перестроить индекс")
+    parser.add_argument("--model", help="искать только в ответах указанной модели")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("files", nargs="*", help="JSON-файлы старых чатов (для --rebuild)")
+    parser.add_argument("-q", "--query", help="поисковый запрос")
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    try:
+        if args.rebuild:
+            total = index.rebuild(args.sessions, args.files)
+            print(f"Проиндексировано сообщений: {total}")
+        if args.query:
+            for hit in index.search(args.query, limit=args.limit, model=args.model):
+                print(f"{hit['session']}#{hit['position']} [{hit['role']}, {hit['model']}]: {hit['snippet']}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
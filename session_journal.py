@@ -0,0 +1,209 @@
+import os
+import json
+import uuid
+import struct
+from datetime import datetime
+
+# --- Формат журнала ---
+# <session>.jsonl - одна JSON-запись на сообщение, только дозапись в конец.
+# <session>.idx   - компактный индекс: по 8 байт (uint64, little-endian) на
+#                   смещение начала каждой записи в .jsonl.
+
+JOURNAL_EXT = ".jsonl"
+INDEX_EXT = ".idx"
+_OFFSET = struct.Struct("<Q")
+
+
+def new_session_id():
+    """Возвращает идентификатор новой сессии (сортируется по времени создания)."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def list_sessions(sessions_dir):
+    """Список сохраненных сессий в каталоге, от новых к старым."""
+    if not os.path.isdir(sessions_dir):
+        return []
+    sessions = [name[:-len(JOURNAL_EXT)] for name in os.listdir(sessions_dir)
+                if name.endswith(JOURNAL_EXT)]
+    return sorted(sessions, reverse=True)
+
+
+def iter_session(sessions_dir, session_id):
+    """
+    Читает сообщения журнала только для чтения, без _recover(): журнал может в это
+    время дописываться другим объектом SessionJournal, поэтому недописанная последняя
+    строка просто пропускается, а файлы не обрезаются.
+    """
+    path = os.path.join(sessions_dir, session_id + JOURNAL_EXT)
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class SessionJournal:
+    """
+    Журнал сессии чата: каждое сообщение дописывается одной строкой и сразу
+    сбрасывается на диск, поэтому стоимость автосохранения O(новое сообщение),
+    а при аварийном завершении теряется не больше одного недописанного сообщения.
+    """
+
+    def __init__(self, sessions_dir, session_id=None, fsync=False):
+        self.sessions_dir = sessions_dir
+        self.session_id = session_id or new_session_id()
+        self.fsync = fsync
+        os.makedirs(sessions_dir, exist_ok=True)
+        base = os.path.join(sessions_dir, self.session_id)
+        self.journal_path = base + JOURNAL_EXT
+        self.index_path = base + INDEX_EXT
+        self._journal = open(self.journal_path, "a+b")
+        self._index = open(self.index_path, "a+b")
+        self._count = 0
+        self._recover()
+
+    # --- Восстановление после сбоя ---
+
+    def _recover(self):
+        """Отрезает недописанную запись и приводит индекс в соответствие с журналом."""
+        self._journal.seek(0, os.SEEK_END)
+        journal_size = self._journal.tell()
+        self._index.seek(0, os.SEEK_END)
+        index_size = self._index.tell()
+        if index_size % _OFFSET.size:
+            index_size -= index_size % _OFFSET.size
+            self._index.truncate(index_size)
+
+        # Индекс не может ссылаться за пределы журнала
+        count = index_size // _OFFSET.size
+        while count and self._offset_at(count - 1) >= journal_size:
+            count -= 1
+        valid_end = 0
+        if count:
+            last_offset = self._offset_at(count - 1)
+            self._journal.seek(last_offset)
+            line = self._journal.readline()
+            if line.endswith(b"\n"):
+                valid_end = last_offset + len(line)
+            else:
+                count -= 1
+                valid_end = last_offset
+
+        # Дочитываем записи, которые попали в журнал, но не в индекс
+        self._index.truncate(count * _OFFSET.size)
+        self._journal.seek(valid_end)
+        offset = valid_end
+        new_offsets = []
+        for line in self._journal:
+            if not line.endswith(b"\n"):
+                break
+            new_offsets.append(offset)
+            offset += len(line)
+        if offset < journal_size:
+            self._journal.truncate(offset)
+        if new_offsets:
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(b"".join(_OFFSET.pack(o) for o in new_offsets))
+        self._count = count + len(new_offsets)
+        self._flush()
+
+    def _offset_at(self, position):
+        self._index.seek(position * _OFFSET.size)
+        return _OFFSET.unpack(self._index.read(_OFFSET.size))[0]
+
+    def _flush(self):
+        self._journal.flush()
+        self._index.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+            os.fsync(self._index.fileno())
+
+    # --- Запись ---
+
+    def append(self, role, content, **meta):
+        """Дописывает сообщение в журнал и возвращает его порядковый номер."""
+        record = {"role": role, "content": content,
+                  "ts": datetime.now().isoformat(timespec="seconds")}
+        record.update(meta)
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._journal.seek(0, os.SEEK_END)
+        offset = self._journal.tell()
+        self._journal.write(data)
+        # Индекс пишется после журнала: при сбое между ними запись
+        # будет найдена при следующем открытии в _recover()
+        self._journal.flush()
+        self._index.seek(0, os.SEEK_END)
+        self._index.write(_OFFSET.pack(offset))
+        self._flush()
+        self._count += 1
+        return self._count - 1
+
+    # --- Чтение ---
+
+    def __len__(self):
+        return self._count
+
+    def _read_range(self, start, stop):
+        if start >= stop:
+            return []
+        first_offset = self._offset_at(start)
+        self._journal.seek(first_offset)
+        if stop < self._count:
+            chunk = self._journal.read(self._offset_at(stop) - first_offset)
+        else:
+            chunk = self._journal.read()
+        # Делим по b"\n", а не str.splitlines(): U+2028, U+2029 и \x85 внутри сообщений
+        # записываются без экранирования и не являются концом записи
+        return [json.loads(line) for line in chunk.split(b"\n") if line]
+
+    def read(self, position):
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("message index out of range")
+        return self._read_range(position, position + 1)[0]
+
+    def tail(self, n):
+        """Последние n сообщений: читается только хвост журнала."""
+        return self._read_range(max(0, self._count - n), self._count)
+
+    def iter_messages(self, start=0, batch_size=256):
+        for batch_start in range(start, self._count, batch_size):
+            for message in self._read_range(batch_start, min(batch_start + batch_size, self._count)):
+                yield message
+
+    def search(self, query, limit=20):
+        """
+        Полнотекстовый поиск по сессии (без учета регистра), от новых сообщений к старым.
+        Чтение останавливается, как только найдено limit совпадений.
+        """
+        needle = query.lower()
+        results = []
+        batch_size = 256
+        stop = self._count
+        while stop > 0 and len(results) < limit:
+            start = max(0, stop - batch_size)
+            batch = self._read_range(start, stop)
+            for position in range(len(batch) - 1, -1, -1):
+                if needle in batch[position].get("content", "").lower():
+                    results.append((start + position, batch[position]))
+                    if len(results) >= limit:
+                        break
+            stop = start
+        return results
+
+    def close(self):
+        for handle in (self._journal, self._index):
+            try:
+                handle.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+import tkinter as tk
+from array import array
+
+_psutil_available = False
+try:
+    import psutil
+    _psutil_available = True
+except ImportError:
+    pass
+
+_requests_available = False
+try:
+    import requests
+    _requests_available = True
+except ImportError:
+    pass
+
+SERIES = ("cpu", "ram", "app_rss", "ollama_rss", "model_ram")
+MB = 1024 * 1024
+
+
+class RingBuffer:
+    """Кольцевой буфер фиксированного размера поверх array (без списков словарей)."""
+
+    def __init__(self, capacity, typecode="f"):
+        self.capacity = capacity
+        self._data = array(typecode, [0]) * capacity
+        self._start = 0
+        self._len = 0
+
+    def append(self, value):
+        end = (self._start + self._len) % self.capacity
+        self._data[end] = value
+        if self._len < self.capacity:
+            self._len += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def last(self):
+        if not self._len:
+            return None
+        return self._data[(self._start + self._len - 1) % self.capacity]
+
+    def values(self):
+        end = self._start + self._len
+        if end <= self.capacity:
+            return self._data[self._start:end].tolist()
+        return self._data[self._start:].tolist() + self._data[:end - self.capacity].tolist()
+
+    def __len__(self):
+        return self._len
+
+
+class SystemMonitor:
+    """
+    Фоновый сэмплер нагрузки: CPU и RAM хоста, RSS приложения и процесса Ollama,
+    память моделей, выгруженных не в VRAM (по /api/ps). Значения копятся в RingBuffer;
+    счетчик version растет с каждым замером, чтобы UI перерисовывался только при изменениях.
+    """
+
+    def __init__(self, interval=2.0, capacity=300, ollama_host="http://localhost:11434", ps_every=5):
+        self.interval = interval
+        self.ollama_host = ollama_host
+        self.ps_every = ps_every
+        self.timestamps = RingBuffer(capacity, "d")
+        self.history = {name: RingBuffer(capacity) for name in SERIES}
+        self.version = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process(os.getpid()) if _psutil_available else None
+        self._ollama_process = None
+        self._ollama_scan_at = 0
+        self._model_ram = 0.0
+        self._samples = 0
+
+    def start(self):
+        if not _psutil_available or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        psutil.cpu_percent(interval=None)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="system-monitor")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                pass
+
+    def _find_ollama(self, now):
+        if self._ollama_process and self._ollama_process.is_running():
+            return self._ollama_process
+        if now - self._ollama_scan_at < 30:
+            return None
+        self._ollama_scan_at = now
+        self._ollama_process = None
+        for proc in psutil.process_iter(["name"]):
+            if (proc.info.get("name") or "").lower().startswith("ollama"):
+                self._ollama_process = proc
+                break
+        return self._ollama_process
+
+    def _query_model_ram(self):
+        if not _requests_available or not self.ollama_host:
+            return self._model_ram
+        try:
+            models = requests.get(f"{self.ollama_host}/api/ps", timeout=1).json().get("models", [])
+        except Exception:
+            return self._model_ram
+        return sum(m.get("size", 0) - m.get("size_vram", 0) for m in models) / MB
+
+    def sample(self):
+        now = time.time()
+        cpu = psutil.cpu_percent(interval=None)
+        ram = psutil.virtual_memory().percent
+        app_rss = self._process.memory_info().rss / MB
+        ollama_rss = 0.0
+        ollama = self._find_ollama(now)
+        if ollama:
+            try:
+                ollama_rss = ollama.memory_info().rss / MB
+            except psutil.Error:
+                self._ollama_process = None
+        if self._samples % self.ps_every == 0:
+            self._model_ram = self._query_model_ram()
+        self._samples += 1
+
+        with self._lock:
+            self.timestamps.append(now)
+            for name, value in zip(SERIES, (cpu, ram, app_rss, ollama_rss, self._model_ram)):
+                self.history[name].append(value)
+            self.version += 1
+
+    def latest(self):
+        with self._lock:
+            return {name: self.history[name].last() for name in SERIES}
+
+    def series(self, name):
+        with self._lock:
+            return self.history[name].values()
+
+
+class Sparkline:
+    """Маленький график на Canvas: линии создаются один раз и затем только меняют координаты."""
+
+    def __init__(self, parent, width=120, height=20, colors=("#0078d7", "#e81123"), bg=None):
+        self.canvas = tk.Canvas(parent, width=width, height=height, highlightthickness=0, bd=0)
+        if bg:
+            self.canvas.config(bg=bg)
+        self.width = width
+        self.height = height
+        self._lines = [self.canvas.create_line(0, height, 0, height, fill=color, width=1) for color in colors]
+        self._drawn = [None] * len(colors)
+
+    def draw(self, index, values, max_value=100.0):
+        values = values[-self.width:]
+        if values == self._drawn[index] or len(values) < 2:
+            return
+        self._drawn[index] = values
+        step = self.width / (len(values) - 1)
+        scale = (self.height - 2) / (max_value or 1)
+        coords = []
+        for i, value in enumerate(values):
+            coords.extend((i * step, self.height - 1 - min(value, max_value) * scale))
+        self.canvas.coords(self._lines[index], *coords)
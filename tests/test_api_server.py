@@ -0,0 +1,156 @@
+import json
+import time
+import socket
+import struct
+import threading
+import http.client
+
+import pytest
+
+from api_server import AssistantApiServer, AssistantService
+from ollama_client import GenerationCancelled
+from scheduler import PriorityScheduler
+
+
+class FakeClient:
+    """Вместо Ollama: записывает порядок запросов и отдает токены, пока не отменят."""
+
+    host = "http://fake"
+
+    def __init__(self, tokens=3, delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.gate = threading.Event()
+        self.gate.set()
+        self.prompts = []
+        self.cancelled = threading.Event()
+
+    def chat_stream(self, model, messages, options, cancel_event, stats):
+        self.prompts.append(messages[-1]["content"])
+        self.gate.wait(5)
+        for i in range(self.tokens):
+            if cancel_event.is_set():
+                self.cancelled.set()
+                raise GenerationCancelled()
+            time.sleep(self.delay)
+            yield f"t{i} "
+        stats["eval_count"] = self.tokens
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def make(client, max_queued=64, max_per_client=8):
+        scheduler = PriorityScheduler(max_concurrent=1, max_queued=max_queued, max_per_client=max_per_client)
+        service = AssistantService({"prompt_compression": False}, client=client, scheduler=scheduler)
+        server = AssistantApiServer(service, port=0).start()
+        servers.append((server, scheduler))
+        return server
+
+    yield make
+    for server, scheduler in servers:
+        server.stop()
+        scheduler.stop()
+
+
+def _post(server, body):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    conn.request("POST", "/v1/chat", body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, response.read().decode("utf-8")
+
+
+def _wait_for(predicate, timeout=3):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize("body", [
+    {"prompt": "hi", "context": "not a list"},
+    {"prompt": "hi", "context": [{"role": "user"}]},
+    {"prompt": "hi", "context": [["user", "text"]]},
+    {"prompt": "hi", "context": [{"role": "robot", "content": "x"}]},
+    {"prompt": "hi", "priority": "urgent"},
+    {"prompt": 42},
+    {"context": []},
+])
+def test_malformed_request_is_rejected_with_400(server_factory, body):
+    client = FakeClient()
+    server = server_factory(client)
+    status, text = _post(server, body)
+    assert status == 400
+    assert "invalid request" in json.loads(text)["error"]
+    assert client.prompts == []
+
+
+def test_clients_are_served_round_robin(server_factory):
+    client = FakeClient()
+    client.gate.clear()
+    server = server_factory(client)
+    scheduler = server.service.scheduler
+    threads = []
+
+    def send(prompt, client_id):
+        thread = threading.Thread(target=_post, args=(server, {"prompt": prompt, "client_id": client_id,
+                                                               "cache": False}))
+        thread.start()
+        threads.append(thread)
+
+    send("a1", "a")
+    assert _wait_for(lambda: client.prompts == ["a1"])
+    send("a2", "a")
+    assert _wait_for(lambda: scheduler.queued == 1)
+    send("a3", "a")
+    assert _wait_for(lambda: scheduler.queued == 2)
+    send("b1", "b")
+    assert _wait_for(lambda: scheduler.queued == 3)
+    client.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert client.prompts == ["a1", "a2", "b1", "a3"]
+
+
+def test_full_queue_returns_429(server_factory):
+    client = FakeClient()
+    client.gate.clear()
+    server = server_factory(client, max_per_client=1)
+    running = threading.Thread(target=_post, args=(server, {"prompt": "first", "client_id": "a", "cache": False}))
+    running.start()
+    queued = threading.Thread(target=_post, args=(server, {"prompt": "second", "client_id": "a", "cache": False}))
+    try:
+        assert _wait_for(lambda: client.prompts == ["first"])
+        queued.start()
+        assert _wait_for(lambda: server.service.scheduler.queued == 1)
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        conn.request("POST", "/v1/chat", body=json.dumps({"prompt": "third", "client_id": "a", "cache": False}))
+        response = conn.getresponse()
+        assert response.status == 429
+        assert response.getheader("Retry-After") == "2"
+    finally:
+        client.gate.set()
+        running.join(5)
+        queued.join(5)
+
+
+def test_client_disconnect_cancels_generation(server_factory):
+    client = FakeClient(tokens=1000, delay=0.01)
+    server = server_factory(client)
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    body = json.dumps({"prompt": "long", "cache": False}).encode("utf-8")
+    sock.sendall(b"POST /v1/chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    assert sock.recv(4096).startswith(b"HTTP/1.0 200")
+    assert _wait_for(lambda: client.prompts == ["long"])
+    # Закрытие с RST: следующая запись сервера в сокет сразу завершится ошибкой
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    sock.close()
+    assert client.cancelled.wait(5)
+    assert _wait_for(lambda: server.service.scheduler.running == 0)
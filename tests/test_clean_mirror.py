@@ -0,0 +1,103 @@
+import os
+import time
+
+import clean_mirror
+from clean_mirror import MANIFEST_FILE, CleanMirror, _PendingChanges
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _mirror(tmp_path):
+    return CleanMirror(str(tmp_path / "src"), str(tmp_path / "out"), compact_mode=False, workers=1)
+
+
+def test_scan_skips_ignored_dirs_and_unsupported_files(tmp_path):
+    _write(tmp_path / "src" / "a.py", "x = 1\n")
+    _write(tmp_path / "src" / "pkg" / "b.js", "var y = 2;\n")
+    _write(tmp_path / "src" / "__pycache__" / "c.py", "z = 3\n")
+    _write(tmp_path / "src" / "notes.txt", "text\n")
+    assert sorted(_mirror(tmp_path).scan()) == ["a.py", os.path.join("pkg", "b.js")]
+
+
+def test_sync_skips_unchanged_and_propagates_deletions(tmp_path):
+    _write(tmp_path / "src" / "a.py", "x = 1  # comment\n")
+    _write(tmp_path / "src" / "sub" / "b.py", "y = 2\n")
+    mirror = _mirror(tmp_path)
+    try:
+        assert mirror.sync() == (2, 0)
+        assert "comment" not in (tmp_path / "out" / "a.py").read_text(encoding="utf-8")
+        assert mirror.sync() == (0, 0)
+        assert _mirror(tmp_path).sync() == (0, 0)  # манифест сохранен на диск
+
+        (tmp_path / "src" / "sub" / "b.py").unlink()
+        assert mirror.sync(["sub/b.py"]) == (0, 1)
+        assert not (tmp_path / "out" / "sub").exists()
+        assert (tmp_path / "out" / MANIFEST_FILE).exists()
+    finally:
+        mirror.close()
+
+
+def test_failed_file_keeps_previous_copy_and_is_retried(tmp_path, monkeypatch):
+    source = tmp_path / "src" / "a.py"
+    _write(source, "x = 1\n")
+    _write(tmp_path / "src" / "b.py", "y = 2\n")
+    mirror = _mirror(tmp_path)
+    try:
+        mirror.sync()
+        real_job = clean_mirror._clean_job
+
+        def broken_job(path, *args):
+            if path.endswith("a.py"):
+                raise NameError("in_multeline_string")
+            return real_job(path, *args)
+
+        monkeypatch.setattr(clean_mirror, "_clean_job", broken_job)
+        _write(source, "x = 2\n")
+        os.utime(source, ns=(time.time_ns(), time.time_ns() + 10**9))
+        assert mirror.sync(["a.py"]) == (0, 0)
+        assert (tmp_path / "out" / "a.py").read_text(encoding="utf-8").strip() == "x = 1"
+
+        monkeypatch.setattr(clean_mirror, "_clean_job", real_job)
+        assert mirror.sync() == (1, 0)
+        assert (tmp_path / "out" / "a.py").read_text(encoding="utf-8").strip() == "x = 2"
+    finally:
+        mirror.close()
+
+
+def test_syntax_error_does_not_abort_sync(tmp_path):
+    _write(tmp_path / "src" / "broken.py", "def f(:\n    pass\n")
+    _write(tmp_path / "src" / "ok.py", "z = 3\n")
+    mirror = _mirror(tmp_path)
+    try:
+        updated, _ = mirror.sync()
+        assert updated >= 1
+        assert (tmp_path / "out" / "ok.py").exists()
+    finally:
+        mirror.close()
+
+
+def test_pending_changes_wait_for_quiet_period():
+    pending = _PendingChanges()
+    assert pending.take_if_quiet(0.05, 1.0) == (False, None)
+    pending.add("a.py")
+    pending.add("b.py")
+    assert pending.take_if_quiet(0.05, 1.0) == (False, None)
+    time.sleep(0.06)
+    assert pending.take_if_quiet(0.05, 1.0) == (True, {"a.py", "b.py"})
+    assert pending.take_if_quiet(0.05, 1.0) == (False, None)
+
+    pending.add("c.py")
+    pending.add_full_scan()
+    time.sleep(0.06)
+    assert pending.take_if_quiet(0.05, 1.0) == (True, None)
+
+
+def test_pending_changes_flush_after_max_delay():
+    pending = _PendingChanges()
+    pending.add("a.py")
+    time.sleep(0.03)
+    pending.add("a.py")
+    assert pending.take_if_quiet(1.0, 0.02) == (True, {"a.py"})
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+import cli
+
+
+class FailingClient:
+    def chat_stream(self, *args, **kwargs):
+        raise ConnectionError("Connection refused")
+        yield
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"current_model": "m", "models": {"m": {}}}), encoding="utf-8")
+    return str(path)
+
+
+def test_bad_batch_json_exits_non_zero(tmp_path, config_path, monkeypatch):
+    monkeypatch.setattr(cli, "client_from_config", lambda *a, **k: FailingClient())
+    batch = tmp_path / "jobs.jsonl"
+    batch.write_text('{"prompt": "a"}\nnot json\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="jobs.jsonl:2"):
+        cli.load_batch(str(batch))
+    assert cli.main(["-c", config_path, "--batch", str(batch)]) == 1
+
+
+def test_connection_error_exits_non_zero(config_path, monkeypatch):
+    monkeypatch.setattr(cli, "client_from_config", lambda *a, **k: FailingClient())
+    assert cli.main(["-c", config_path, "hello"]) == 1
@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+
+from compare import ModelComparison
+from scheduler import PriorityScheduler, QueueFull
+
+
+class FakeService:
+    def __init__(self, scheduler, fail_models=()):
+        self.config = {"max_loaded_models": 0}
+        self.scheduler = scheduler
+        self.fail_models = set(fail_models)
+        self.client_ids = []
+
+    def stream(self, client_id, prompt, model=None, context=(), use_cache=True, priority=0, requeue=True):
+        if model in self.fail_models:
+            raise QueueFull("server queue is full")
+        self.client_ids.append(client_id)
+        events = queue.Queue()
+
+        def func(job):
+            events.put(("start", {"queue_wait": 0.0}))
+            time.sleep(0.2)
+            events.put(("token", "x"))
+            events.put(("done", {}))
+
+        return events, self.scheduler.submit(func, priority, client_id)
+
+
+def _wait(comparison):
+    deadline = time.time() + 5
+    while any(r["status"] in ("queued", "running") for r in comparison.summary()):
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_models_run_in_parallel_and_ttft_excludes_queue():
+    scheduler = PriorityScheduler(max_concurrent=2)
+    try:
+        service = FakeService(scheduler)
+        started = time.perf_counter()
+        comparison = ModelComparison(service, "hi", ["a", "b"]).start()
+        _wait(comparison)
+        assert time.perf_counter() - started < 0.35
+        assert len(set(service.client_ids)) == 2
+        assert all(r["first_token"] < 0.35 for r in comparison.summary())
+    finally:
+        scheduler.stop()
+
+
+def test_queue_full_is_reported_in_pane():
+    scheduler = PriorityScheduler(max_concurrent=1)
+    try:
+        comparison = ModelComparison(FakeService(scheduler, fail_models={"a"}), "hi", ["a", "b"])
+        comparison.serialize = True
+        comparison.start()
+        _wait(comparison)
+        results = comparison.summary()
+        assert results[0]["status"] == "error" and "full" in results[0]["error"]
+        assert results[1]["status"] == "done"
+        assert comparison.events["a"].get_nowait()[0] == "error"
+    finally:
+        scheduler.stop()
+
+
+def test_result_is_final_when_terminal_event_is_delivered():
+    scheduler = PriorityScheduler(max_concurrent=1)
+    try:
+        comparison = ModelComparison(FakeService(scheduler), "prompt", ["a"]).start()
+        events = comparison.events["a"]
+        received = []
+        while not received or received[-1] not in ("done", "error"):
+            received.append(events.get(timeout=5)[0])
+        assert received[-2:] == ["token", "done"]
+        result = comparison.results["a"]
+        assert result["status"] == "done"
+        assert result["elapsed"] is not None
+    finally:
+        scheduler.stop()
@@ -0,0 +1,102 @@
+import json
+import time
+import threading
+
+import api_server
+from config_service import ConfigService
+
+
+class FakeClient:
+    def __init__(self, host):
+        self.host = host.rstrip("/")
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_reload_never_exposes_empty_config(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"current_model": "m", "models": {"m": {}}}), encoding="utf-8")
+    service = ConfigService(str(path), debounce=0)
+    config = service.config
+    seen_empty = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            if "models" not in config:
+                seen_empty.append(True)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for i in range(200):
+            path.write_text(json.dumps({"current_model": "m", "models": {"m": {"temperature": i % 2}}}),
+                            encoding="utf-8")
+            service.reload()
+    finally:
+        stop.set()
+        thread.join()
+    assert not seen_empty
+    assert service.config is config
+
+
+def test_apply_config_rebinds_client_and_scheduler(monkeypatch):
+    monkeypatch.setattr(api_server, "client_from_config",
+                        lambda config, pool_size=8: FakeClient(config["ollama_host"]))
+    config = {"ollama_host": "http://old-host:1", "max_concurrent_requests": 1, "models": {}}
+    service = api_server.AssistantService(config, client=FakeClient("http://old-host:1"))
+    old_client, old_scheduler = service.client, service.scheduler
+    try:
+        config["max_concurrent_requests"] = 2
+        assert not service.apply_config()
+        assert old_scheduler.max_concurrent == 2
+
+        config["ollama_host"] = "http://new-host:1"
+        assert service.apply_config()
+        assert old_client.closed
+        assert service.client.host == "http://new-host:1"
+        assert service.scheduler is not old_scheduler
+    finally:
+        old_scheduler.stop()
+        service.scheduler.stop()
+
+
+def test_override_survives_reload_and_is_not_saved(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"current_model": "m", "models": {"m": {}}, "max_concurrent_requests": 1}),
+                    encoding="utf-8")
+    service = ConfigService(str(path), debounce=0)
+    service.set_override("max_concurrent_requests", 3)
+    assert service.config["max_concurrent_requests"] == 3
+
+    path.write_text(json.dumps({"current_model": "m", "models": {"m": {}}, "max_concurrent_requests": 2,
+                                "keep_alive": "5m"}), encoding="utf-8")
+    assert service.reload()
+    assert service.config["max_concurrent_requests"] == 3
+    assert service.config["keep_alive"] == "5m"
+
+    service.update(keep_alive="10m")
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["max_concurrent_requests"] == 2
+    assert saved["keep_alive"] == "10m"
+
+
+def test_stale_save_timer_does_not_drop_newer_one(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"current_model": "m", "models": {"m": {}}}), encoding="utf-8")
+    service = ConfigService(str(path), debounce=0.05)
+    with service._lock:
+        service.save()
+        fired = service._save_timer
+        # Таймер срабатывает и ждет блокировку, а save() тем временем заводит новый
+        time.sleep(0.2)
+        service.debounce = 60
+        service.save()
+        pending = service._save_timer
+    fired.join(2)
+    assert service._save_timer is pending
+    service.config["keep_alive"] = "1h"
+    service.flush()
+    assert json.loads(path.read_text(encoding="utf-8"))["keep_alive"] == "1h"
@@ -0,0 +1,82 @@
+import sys
+import threading
+
+from message_store import COMPRESS_THRESHOLD, MessageStore
+
+
+def _long_text(i):
+    return f"def handler_{i}(request):\n    return process(request)  # шаг {i}\n" * 40
+
+
+def test_round_trip_plain_compressed_and_unicode():
+    store = MessageStore()
+    short = "Привет, 世界 🙂"
+    long = _long_text(1)
+    assert len(long.encode("utf-8")) > COMPRESS_THRESHOLD
+    store.append("user", short, ts=100.0)
+    store.append("assistant", long, model="llama3")
+    store.append("user", "")
+    assert [m["content"] for m in store] == [short, long, ""]
+    assert store[1].role == "assistant" and store[1].model == "llama3"
+    assert store[0].ts == 100.0
+    assert store[-1].get("model") is None
+    assert store.as_dicts(last_n=2) == [{"role": "assistant", "content": long}, {"role": "user", "content": ""}]
+
+
+def test_from_records_and_streaming():
+    store = MessageStore.from_records([
+        {"role": "user", "content": "вопрос", "model": "m", "ts": "2024-01-02T03:04:05"},
+        {"role": "assistant", "content": "ответ", "ts": "not a date"},
+    ])
+    assert store.as_dicts() == [{"role": "user", "content": "вопрос"}, {"role": "assistant", "content": "ответ"}]
+    assert store[0].model == "m" and store[0].ts > 0
+    store.begin_streaming(model="m")
+    store.stream_append("час")
+    store.stream_append("ть")
+    assert store.pending_text() == "часть"
+    assert len(store) == 2
+    assert store.finish_streaming() == 2
+    assert store[2].content == "часть"
+    assert store.finish_streaming() is None
+
+
+def test_compact_storage_uses_less_memory_than_dicts():
+    store = MessageStore()
+    records = []
+    for i in range(200):
+        content = _long_text(i)
+        store.append("user" if i % 2 else "assistant", content, model="llama3")
+        records.append({"role": "user" if i % 2 else "assistant", "content": content, "model": "llama3"})
+    naive = sys.getsizeof(records) + sum(sys.getsizeof(r) + sys.getsizeof(r["content"]) for r in records)
+    assert store.memory_usage() < naive / 4
+    assert store[150].content == records[150]["content"]
+
+
+def test_snapshot_while_appending_from_another_thread():
+    store = MessageStore()
+    done = threading.Event()
+    errors = []
+
+    def writer():
+        for i in range(2000):
+            store.append("user", _long_text(i) if i % 10 == 0 else f"msg {i}")
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            try:
+                snapshot = store.as_dicts()
+                for i, message in enumerate(snapshot):
+                    expected = _long_text(i) if i % 10 == 0 else f"msg {i}"
+                    assert message["content"] == expected
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not errors
+    assert len(store) == 2000
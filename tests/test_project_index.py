@@ -0,0 +1,73 @@
+from project_index import ProjectIndex
+
+SOURCE = '''/* header
+   comment */
+
+
+// helper
+function alphaHelper() {
+    return 1;
+}
+'''
+
+
+def test_labels_point_to_source_lines(tmp_path):
+    (tmp_path / "a.js").write_text(SOURCE, encoding="utf-8")
+    index = ProjectIndex(str(tmp_path))
+    index.refresh()
+    _, relpath, line, text = index.search("alphaHelper")[0]
+    assert relpath == "a.js"
+    assert SOURCE.splitlines()[line - 1].startswith(text.splitlines()[0])
+
+
+def test_update_file_is_incremental(tmp_path):
+    (tmp_path / "a.py").write_text("def alphaword():\n    return 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("def betaword():\n    return 2\n", encoding="utf-8")
+    index = ProjectIndex(str(tmp_path))
+    index.refresh()
+    (tmp_path / "a.py").write_text("def gammaword():\n    return 1\n", encoding="utf-8")
+    index.update_file(str(tmp_path / "a.py"))
+    assert not index.search("alphaword")
+    assert index.search("gammaword")[0][1] == "a.py"
+    assert index.search("betaword")[0][1] == "b.py"
+
+    (tmp_path / "a.py").unlink()
+    index.update_file(str(tmp_path / "a.py"))
+    assert not index.search("gammaword")
+    incremental = (index._chunk_count, index._total_length, {t: sorted(p.values()) for t, p in index._postings.items()})
+    index._rebuild_postings()
+    assert incremental == (index._chunk_count, index._total_length,
+                           {t: sorted(p.values()) for t, p in index._postings.items()})
+
+    reloaded = ProjectIndex(str(tmp_path))
+    assert reloaded.search("betaword")[0][1:3] == ("b.py", 1)
+
+
+def test_save_uses_snapshot_while_files_change(tmp_path):
+    import threading
+
+    for i in range(50):
+        (tmp_path / f"m{i}.py").write_text(f"def func_{i}():\n    return {i}\n", encoding="utf-8")
+    index = ProjectIndex(str(tmp_path))
+    index.refresh()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            index._index_file(str(tmp_path / "m0.py"), f"extra{i}.py", ".py", (tmp_path / "m0.py").stat())
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(50):
+            try:
+                index.save()
+            except RuntimeError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors
@@ -0,0 +1,58 @@
+import logging
+
+from prompt_compress import PromptCompressor
+
+
+def _block(code, language="python"):
+    return f"```{language}\n{code}```"
+
+
+LONG_CODE = "".join(f"def handler_{i}(request):\n    return process(request, {i})  # шаг {i}\n" for i in range(8))
+
+
+def test_compress_messages_cleans_code_and_keeps_system_messages():
+    code = 'def f(x):\n    """Docstring."""\n    # комментарий\n    return x + 1  # хвост\n'
+    messages = [
+        {"role": "system", "content": _block(code)},
+        {"role": "user", "content": "Посмотри:\n" + _block(code)},
+    ]
+    result, stats = PromptCompressor().compress_messages(messages)
+    assert result[0] is messages[0]
+    assert "комментарий" not in result[1]["content"]
+    assert "Docstring" not in result[1]["content"]
+    assert result[1]["content"].startswith("Посмотри:\n```python\n")
+    assert stats["blocks_cleaned"] == 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+
+
+def test_repeated_block_is_replaced_with_reference():
+    messages = [
+        {"role": "user", "content": _block(LONG_CODE)},
+        {"role": "assistant", "content": "Ок"},
+        {"role": "user", "content": "Еще раз:\n" + _block(LONG_CODE)},
+    ]
+    result, stats = PromptCompressor().compress_messages(messages)
+    assert "handler_0" in result[0]["content"]
+    assert result[2]["content"] == "Еще раз:\n(same python block as in message #1 above)"
+    assert stats["blocks_deduped"] == 1
+
+
+def test_short_blocks_and_disabled_dedupe_are_kept():
+    short = "x = 1\n"
+    messages = [{"role": "user", "content": _block(short)}, {"role": "user", "content": _block(short)}]
+    result, stats = PromptCompressor().compress_messages(messages)
+    assert stats["blocks_deduped"] == 0
+    messages = [{"role": "user", "content": _block(LONG_CODE)}, {"role": "user", "content": _block(LONG_CODE)}]
+    result, stats = PromptCompressor(dedupe=False).compress_messages(messages)
+    assert stats["blocks_deduped"] == 0
+    assert "handler_7" in result[1]["content"]
+
+
+def test_unparsable_fragment_falls_back_without_printing(capsys, caplog):
+    fragment = "def f(:\n    value = compute(1,  # комментарий\n"
+    with caplog.at_level(logging.WARNING, logger="AICoderUltimate"):
+        cleaned = PromptCompressor().clean_block("py", fragment)
+    assert "комментарий" not in cleaned
+    assert "value = compute(1," in cleaned
+    assert capsys.readouterr().out == ""
+    assert caplog.records
@@ -0,0 +1,104 @@
+from python_transform import (ANNOTATIONS, COMPACT_TRANSFORMS, RENAME_LOCALS, TransformCache,
+                              content_hash, transform_source, transform_sources)
+
+
+def _run(source, transforms=COMPACT_TRANSFORMS):
+    namespace = {}
+    exec(compile(transform_source(source, transforms), "<test>", "exec"), namespace)
+    return namespace
+
+
+def test_comprehension_target_does_not_shadow_outer_name():
+    source = (
+        "item = 'global'\n"
+        "def f():\n"
+        "    ys = [item for item in range(3)]\n"
+        "    zs = {key: value for key, value in zip('ab', ys)}\n"
+        "    return item, ys, zs\n"
+    )
+    assert _run(source)["f"]() == ("global", [0, 1, 2], {"a": 0, "b": 1})
+
+
+def test_lambda_parameter_does_not_shadow_outer_name():
+    source = (
+        "value = 10\n"
+        "def f(items):\n"
+        "    shifted = list(map(lambda value: value + 1, items))\n"
+        "    return shifted, value\n"
+    )
+    assert _run(source)["f"]([1, 2]) == ([2, 3], 10)
+
+
+def test_walrus_in_comprehension_is_renamed_consistently():
+    source = (
+        "def f(items):\n"
+        "    accumulated = 0\n"
+        "    totals = [accumulated := accumulated + item for item in items]\n"
+        "    return totals, accumulated\n"
+    )
+    assert _run(source, {RENAME_LOCALS})["f"]([1, 2, 3]) == ([1, 3, 6], 6)
+
+
+def test_bare_annotation_keeps_function_scoping():
+    source = (
+        "x = 'global'\n"
+        "def f():\n"
+        "    x: int\n"
+        "    try:\n"
+        "        return x\n"
+        "    except UnboundLocalError:\n"
+        "        return 'local'\n"
+    )
+    assert _run(source, {ANNOTATIONS})["f"]() == "local"
+    assert "x:int" not in transform_source("x: int\ny = 1\n", {ANNOTATIONS}).replace(" ", "")
+
+
+def test_cache_is_pruned_to_current_sources(tmp_path):
+    cache = TransformCache(str(tmp_path / "cache.json"))
+    transform_sources([("a.py", "a = 1\n"), ("b.py", "b = 2\n")], cache=cache, workers=1)
+    transform_sources([("a.py", "a = 3\n")], cache=TransformCache(cache.path), workers=1)
+    entries = TransformCache(cache.path).entries
+    assert list(entries) == [TransformCache.key(content_hash("a = 3\n"), COMPACT_TRANSFORMS)]
+
+
+def test_defaults_are_evaluated_in_enclosing_scope():
+    source = (
+        "limit = 10\n"
+        "def f(x=limit):\n"
+        "    limit = 2\n"
+        "    return x + limit\n"
+    )
+    assert _run(source)["f"]() == 12
+
+
+def test_decorator_name_is_not_renamed():
+    source = (
+        "def deco(func):\n"
+        "    func.decorated = True\n"
+        "    return func\n"
+        "def f():\n"
+        "    deco = 'local'\n"
+        "    return deco\n"
+        "@deco\n"
+        "def g(value: 'hint' = None):\n"
+        "    deco = 'local'\n"
+        "    hint = deco\n"
+        "    return hint\n"
+    )
+    namespace = _run(source)
+    assert namespace["g"]() == "local"
+    assert namespace["g"].decorated
+    assert namespace["g"].__annotations__ == {"value": "hint"}
+
+
+def test_compact_mode_keeps_singledispatch_annotations():
+    source = (
+        "from functools import singledispatch\n"
+        "@singledispatch\n"
+        "def describe(value):\n"
+        "    return 'other'\n"
+        "@describe.register\n"
+        "def _(value: int):\n"
+        "    return 'int'\n"
+    )
+    assert _run(source)["describe"](1) == "int"
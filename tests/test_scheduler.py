@@ -0,0 +1,96 @@
+import threading
+
+from ollama_client import GenerationCancelled
+from scheduler import BATCH, INTERACTIVE, PriorityScheduler, get_host_scheduler
+
+
+def _blocking_job(started):
+    def func(job):
+        started.set()
+        job.cancel_event.wait(5)
+        if job.cancel_event.is_set():
+            raise GenerationCancelled()
+    return func
+
+
+def test_preempted_then_cancelled_job_gets_terminal_event():
+    scheduler = PriorityScheduler(max_concurrent=1)
+    try:
+        started = threading.Event()
+        release = threading.Event()
+        dropped = threading.Event()
+
+        def batch_func(job):
+            started.set()
+            job.cancel_event.wait(5)
+            release.wait(5)
+            raise GenerationCancelled()
+
+        batch = scheduler.submit(batch_func, BATCH, "batch", on_cancel=dropped.set)
+        assert started.wait(2)
+        interactive_ran = threading.Event()
+        scheduler.submit(lambda job: interactive_ran.set(), INTERACTIVE, "ui")
+        assert batch.preempted
+        scheduler.cancel_below(INTERACTIVE)
+        release.set()
+        assert dropped.wait(2)
+        assert interactive_ran.wait(2)
+    finally:
+        scheduler.stop()
+
+
+def test_preempted_job_is_requeued_without_terminal_event():
+    scheduler = PriorityScheduler(max_concurrent=1)
+    try:
+        started = threading.Event()
+        calls = []
+        finished = threading.Event()
+
+        def batch_func(job):
+            calls.append(job.attempts)
+            if job.attempts == 1:
+                _blocking_job(started)(job)
+            else:
+                finished.set()
+
+        dropped = []
+        scheduler.submit(batch_func, BATCH, "batch", on_cancel=lambda: dropped.append(1))
+        assert started.wait(2)
+        scheduler.submit(lambda job: None, INTERACTIVE, "ui")
+        assert finished.wait(2)
+        assert calls == [1, 2] and not dropped
+    finally:
+        scheduler.stop()
+
+
+def test_get_host_scheduler_applies_max_concurrent():
+    scheduler = get_host_scheduler("http://test-host:1", 1)
+    try:
+        assert get_host_scheduler("http://test-host:1", 3) is scheduler
+        assert scheduler.max_concurrent == 3 and len(scheduler._workers) == 3
+        barrier = threading.Barrier(3, timeout=2)
+        done = threading.Semaphore(0)
+        for i in range(3):
+            scheduler.submit(lambda job: (barrier.wait(), done.release()), BATCH, f"c{i}")
+        for _ in range(3):
+            assert done.acquire(timeout=2)
+    finally:
+        scheduler.stop()
+
+
+def test_cancel_below_for_one_client_keeps_other_clients_jobs():
+    scheduler = PriorityScheduler(max_concurrent=1)
+    try:
+        started = threading.Event()
+        release = threading.Event()
+        scheduler.submit(lambda job: (started.set(), release.wait(5)), INTERACTIVE, "ui")
+        assert started.wait(2)
+        own = scheduler.submit(lambda job: None, BATCH, "gui")
+        other_ran = threading.Event()
+        other = scheduler.submit(lambda job: other_ran.set(), BATCH, "api")
+        scheduler.cancel_below(INTERACTIVE, client_id="gui")
+        release.set()
+        assert other_ran.wait(2)
+        assert own.cancelled and not other.cancelled
+    finally:
+        scheduler.stop()
@@ -0,0 +1,74 @@
+import os
+
+from search_index import SearchIndex
+from session_journal import SessionJournal
+
+
+def test_rebuild_does_not_truncate_live_session(tmp_path):
+    sessions = str(tmp_path)
+    journal = SessionJournal(sessions, "live")
+    journal.append("user", "first message about sqlite")
+    # Запись, которую журнал еще дописывает
+    journal._journal.write(b'{"role": "assistant", "content": "partial')
+    journal._journal.flush()
+    size = os.path.getsize(journal.journal_path)
+
+    index = SearchIndex(os.path.join(sessions, "index.db"))
+    try:
+        assert index.rebuild(sessions) == 1
+        assert os.path.getsize(journal.journal_path) == size
+        assert index.search("sqlite")[0]["ts"] is not None
+    finally:
+        index.close()
+        journal.close()
+
+
+def test_search_matches_word_forms(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.db"))
+    try:
+        index.add_message("s", 0, "assistant", "Handling task cancellation in asyncio", ts="2026-01-01T00:00:00")
+        assert index.search("asyncio cancel")
+        assert index.search("cancelled tasks")
+    finally:
+        index.close()
+
+
+def test_failed_rebuild_keeps_previous_index(tmp_path, monkeypatch):
+    import search_index
+
+    sessions = str(tmp_path)
+    with SessionJournal(sessions, "a") as journal:
+        journal.append("user", "original content")
+    index = SearchIndex(os.path.join(sessions, "index.db"))
+    try:
+        index.rebuild(sessions)
+
+        def broken(*args):
+            raise RuntimeError("crash during rebuild")
+
+        monkeypatch.setattr(search_index, "iter_session", broken)
+        try:
+            index.rebuild(sessions)
+        except RuntimeError:
+            pass
+        assert index.search("original")
+    finally:
+        index.close()
+
+
+def test_old_schema_is_recreated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "index.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE VIRTUAL TABLE messages USING fts5(content, tokenize = 'unicode61')")
+    conn.commit()
+    conn.close()
+    index = SearchIndex(path)
+    try:
+        assert index.needs_rebuild
+    finally:
+        index.close()
+    reopened = SearchIndex(path)
+    assert not reopened.needs_rebuild
+    reopened.close()
@@ -0,0 +1,11 @@
+from session_journal import SessionJournal
+
+
+def test_line_separators_inside_content(tmp_path):
+    text = "a b\x85c d"
+    with SessionJournal(str(tmp_path)) as journal:
+        journal.append("user", text)
+        journal.append("assistant", "ok")
+        assert [m["content"] for m in journal.tail(2)] == [text, "ok"]
+        assert journal.read(0)["content"] == text
+        assert journal.search("c d")[0][0] == 0
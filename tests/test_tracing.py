@@ -0,0 +1,31 @@
+import time
+import threading
+
+from scheduler import PriorityScheduler
+from tracing import Tracer, tracer
+
+
+def _worker_only_function():
+    return sum(range(1000))
+
+
+def test_profiling_includes_scheduler_worker_threads(tmp_path):
+    scheduler = PriorityScheduler(max_concurrent=1)
+    done = threading.Event()
+    try:
+        tracer.start_profiling()
+        scheduler.submit(lambda job: (_worker_only_function(), done.set()))
+        assert done.wait(2)
+        while scheduler.running:
+            time.sleep(0.01)
+        paths = tracer.stop_profiling(str(tmp_path / "profile"))
+    finally:
+        scheduler.stop()
+    report = (tmp_path / "profile_cpu.txt").read_text(encoding="utf-8")
+    assert str(tmp_path / "profile.prof") in paths
+    assert "_worker_only_function" in report
+
+
+def test_profile_thread_is_noop_when_not_profiling():
+    with Tracer().profile_thread():
+        pass
@@ -0,0 +1,16 @@
+from web_fetch import CHARS_PER_TOKEN, TRUNCATED_MARK, summarize_text
+
+
+def test_summarize_keeps_every_chunk_when_rounds_run_out():
+    parts = [f"part{i} " + "x" * 2000 for i in range(6)]
+    prompts = []
+
+    def generate(prompt):
+        prompts.append(prompt)
+        return prompt.split("\n\n", 1)[1]  # "сводка" не короче исходника
+
+    summarize_text("\n\n".join(parts), generate, context_window=1000, max_tokens=100, max_rounds=1)
+    final = prompts[-1]
+    assert all(f"part{i}" in final for i in range(6))
+    assert TRUNCATED_MARK in final
+    assert len(final) <= 1000 * CHARS_PER_TOKEN
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+MAX_EVENTS = 100000
+
+
+class Tracer:
+    """
+    Легковесный сборщик интервалов (spans) для разбора задержек от нажатия Enter
+    до последнего отрисованного токена. Пока трассировка выключена, span() почти
+    ничего не стоит. Экспорт - в формате Chrome Trace Event (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.max_events = max_events
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._profiler = None
+        self._thread_profiles = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self._events = []
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _add(self, event):
+        with self._lock:
+            if len(self._events) < self.max_events:
+                self._events.append(event)
+
+    @contextmanager
+    def span(self, name, category="app", **args):
+        if not self.enabled:
+            yield
+            return
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            self._add({"name": name, "cat": category, "ph": "X", "ts": start, "dur": self._now_us() - start,
+                       "pid": self._pid, "tid": threading.get_ident(), "args": args})
+
+    def begin(self, name, category="app", **args):
+        """Начало интервала, который закончится в другом месте (возвращает токен для end())."""
+        if not self.enabled:
+            return None
+        return (name, category, self._now_us(), args)
+
+    def end(self, token, **args):
+        if token is None or not self.enabled:
+            return
+        name, category, start, begin_args = token
+        begin_args.update(args)
+        self._add({"name": name, "cat": category, "ph": "X", "ts": start, "dur": self._now_us() - start,
+                   "pid": self._pid, "tid": threading.get_ident(), "args": begin_args})
+
+    def instant(self, name, category="app", **args):
+        if self.enabled:
+            self._add({"name": name, "cat": category, "ph": "i", "s": "t", "ts": self._now_us(),
+                       "pid": self._pid, "tid": threading.get_ident(), "args": args})
+
+    def export_chrome_trace(self, path):
+        with self._lock:
+            events = list(self._events)
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in thread_names.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+    # --- cProfile / tracemalloc ---
+
+    def start_profiling(self, memory=False):
+        """
+        cProfile в потоке, который включил профилирование (обычно поток Tk). Рабочие потоки
+        генерации профилируются через profile_thread(), их статистика объединяется при остановке.
+        """
+        if self._profiler is None:
+            with self._lock:
+                self._thread_profiles = []
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+    @contextmanager
+    def profile_thread(self):
+        """Профилирует блок в текущем потоке, если включен cProfile (используется планировщиком)."""
+        if self._profiler is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: cProfile работает через sys.monitoring и уже охватывает все потоки
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._thread_profiles.append(profiler)
+
+    def stop_profiling(self, path_prefix="ai_coder_profile", top=30):
+        """Сохраняет .prof (для snakeviz/pstats) и текстовые отчеты. Возвращает список путей."""
+        paths = []
+        if self._profiler is not None:
+            self._profiler.disable()
+            with self._lock:
+                thread_profiles, self._thread_profiles = self._thread_profiles, []
+            stats = pstats.Stats(self._profiler)
+            for profiler in thread_profiles:
+                stats.add(profiler)
+            prof_path = f"{path_prefix}.prof"
+            stats.dump_stats(prof_path)
+            with open(f"{path_prefix}_cpu.txt", "w", encoding="utf-8") as f:
+                stats.stream = f
+                stats.sort_stats("cumulative").print_stats(top)
+            paths += [prof_path, f"{path_prefix}_cpu.txt"]
+            self._profiler = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(f"{path_prefix}_memory.txt", "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+            paths.append(f"{path_prefix}_memory.txt")
+        return paths
+
+    @property
+    def profiling(self):
+        return self._profiler is not None
+
+
+tracer = Tracer()
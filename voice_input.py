@@ -0,0 +1,260 @@
+import os
+import json
+import math
+import wave
+import threading
+from array import array
+
+_speech_recognition_available = False
+try:
+    import speech_recognition as sr
+    _speech_recognition_available = True
+except ImportError:
+    pass
+
+_vosk_available = False
+try:
+    import vosk
+    vosk.SetLogLevel(-1)
+    _vosk_available = True
+except ImportError:
+    pass
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+CHUNK_SIZE = 1024
+DEFAULT_ENERGY_THRESHOLD = 300
+DEFAULT_MODEL_PATH = "vosk-model"
+THRESHOLD_CACHE_FILE = "voice_threshold.json"
+
+
+def rms(data):
+    """Среднеквадратичная энергия 16-битного PCM фрагмента."""
+    samples = array("h")
+    samples.frombytes(data[:len(data) - len(data) % 2])
+    if not samples:
+        return 0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+# --- Движки распознавания ---
+
+class VoskBackend:
+    """Офлайн-распознавание (vosk) с промежуточными результатами по мере поступления звука."""
+
+    streaming = True
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, sample_rate=SAMPLE_RATE):
+        if not _vosk_available:
+            raise RuntimeError("vosk is not installed")
+        self.model = vosk.Model(model_path)
+        self.sample_rate = sample_rate
+        self.reset()
+
+    def reset(self):
+        self._recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+
+    def accept(self, data):
+        """Возвращает (текст, признак_окончания_фразы)."""
+        if self._recognizer.AcceptWaveform(data):
+            return json.loads(self._recognizer.Result()).get("text", ""), True
+        return json.loads(self._recognizer.PartialResult()).get("partial", ""), False
+
+    def finish(self):
+        text = json.loads(self._recognizer.FinalResult()).get("text", "")
+        self.reset()
+        return text
+
+
+class GoogleBackend:
+    """Сетевое распознавание через speech_recognition: результат только по окончании фразы."""
+
+    streaming = False
+
+    def __init__(self, recognizer=None, language="ru-RU", sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+        if not _speech_recognition_available:
+            raise RuntimeError("speech_recognition is not installed")
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._frames = []
+
+    def reset(self):
+        self._frames = []
+
+    def accept(self, data):
+        self._frames.append(data)
+        return "", False
+
+    def finish(self):
+        audio = sr.AudioData(b"".join(self._frames), self.sample_rate, self.sample_width)
+        self._frames = []
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+
+
+def create_backend(model_path=DEFAULT_MODEL_PATH, language="ru-RU", recognizer=None):
+    """Офлайн-движок, если установлен vosk и есть модель, иначе сетевой."""
+    if _vosk_available and os.path.isdir(model_path):
+        return VoskBackend(model_path)
+    return GoogleBackend(recognizer, language)
+
+
+# --- Сегментация потока ---
+
+class StreamTranscriber:
+    """
+    Принимает PCM-фрагменты, по энергии определяет конец фразы и передает
+    промежуточный (on_partial) и итоговый (on_final) текст. Не зависит от источника звука,
+    поэтому одинаково работает с микрофоном и WAV-файлами.
+    """
+
+    def __init__(self, backend, on_partial=None, on_final=None, energy_threshold=DEFAULT_ENERGY_THRESHOLD,
+                 pause_threshold=0.8, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE):
+        self.backend = backend
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.energy_threshold = energy_threshold
+        self.pause_chunks = max(1, int(pause_threshold * sample_rate / chunk_size))
+        self._in_phrase = False
+        self._silent_chunks = 0
+        self._last_partial = ""
+
+    def feed(self, data):
+        speech = rms(data) > self.energy_threshold
+        if not self._in_phrase:
+            if not speech:
+                return
+            self._in_phrase = True
+        self._silent_chunks = 0 if speech else self._silent_chunks + 1
+
+        text, is_final = self.backend.accept(data)
+        if is_final:
+            self._emit_final(text)
+            return
+        if text and text != self._last_partial and self.on_partial:
+            self._last_partial = text
+            self.on_partial(text)
+        if self._silent_chunks >= self.pause_chunks:
+            self.flush()
+
+    def flush(self):
+        """Принудительно завершает текущую фразу."""
+        if self._in_phrase:
+            self._emit_final(self.backend.finish())
+
+    def _emit_final(self, text):
+        self._in_phrase = False
+        self._silent_chunks = 0
+        self._last_partial = ""
+        if text and self.on_final:
+            self.on_final(text)
+
+
+def transcribe_wav(path, backend, on_partial=None, energy_threshold=DEFAULT_ENERGY_THRESHOLD,
+                   chunk_size=CHUNK_SIZE):
+    """Распознает записанный WAV (16 бит, моно) так же, как поток с микрофона. Возвращает список фраз."""
+    finals = []
+    with wave.open(path, "rb") as wav:
+        transcriber = StreamTranscriber(backend, on_partial, finals.append, energy_threshold,
+                                        sample_rate=wav.getframerate(), chunk_size=chunk_size)
+        while True:
+            data = wav.readframes(chunk_size)
+            if not data:
+                break
+            transcriber.feed(data)
+    transcriber.flush()
+    return finals
+
+
+# --- Фоновый захват с микрофона ---
+
+def load_energy_threshold(cache_path=THRESHOLD_CACHE_FILE):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return float(json.load(f)["energy_threshold"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_energy_threshold(value, cache_path=THRESHOLD_CACHE_FILE):
+    try:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"energy_threshold": value}, f)
+    except OSError:
+        pass
+
+
+class VoicePipeline:
+    """
+    Держит поток микрофона открытым в фоновом потоке. Калибровка шума выполняется
+    один раз, порог энергии кэшируется на диске. Пока listening выключен,
+    звук читается и отбрасывается, поэтому включение ввода не требует переоткрытия устройства.
+    """
+
+    def __init__(self, backend, on_partial=None, on_final=None, on_error=None,
+                 threshold_cache=THRESHOLD_CACHE_FILE, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE):
+        if not _speech_recognition_available:
+            raise RuntimeError("speech_recognition is not installed")
+        self.backend = backend
+        self.on_error = on_error
+        self.threshold_cache = threshold_cache
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.energy_threshold = load_energy_threshold(threshold_cache)
+        self.transcriber = StreamTranscriber(backend, on_partial, on_final,
+                                             self.energy_threshold or DEFAULT_ENERGY_THRESHOLD,
+                                             sample_rate=sample_rate, chunk_size=chunk_size)
+        self._listening = threading.Event()
+        self._flush_pending = threading.Event()
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def is_listening(self):
+        return self._listening.is_set()
+
+    def start_listening(self):
+        self._listening.set()
+        if not self._thread or not self._thread.is_alive():
+            self._running.set()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="voice-input")
+            self._thread.start()
+
+    def stop_listening(self):
+        # Фраза завершается в фоновом потоке: сетевой движок может распознавать ее несколько секунд
+        if self._listening.is_set():
+            self._listening.clear()
+            self._flush_pending.set()
+
+    def shutdown(self):
+        self._listening.clear()
+        self._running.clear()
+
+    def calibrate(self, source, duration=0.5):
+        """Оценивает уровень шума и сохраняет порог энергии."""
+        chunks = max(1, int(duration * source.SAMPLE_RATE / source.CHUNK))
+        levels = [rms(source.stream.read(source.CHUNK)) for _ in range(chunks)]
+        self.energy_threshold = max(DEFAULT_ENERGY_THRESHOLD / 2, 1.5 * sum(levels) / len(levels))
+        self.transcriber.energy_threshold = self.energy_threshold
+        save_energy_threshold(self.energy_threshold, self.threshold_cache)
+
+    def _run(self):
+        try:
+            with sr.Microphone(sample_rate=self.sample_rate, chunk_size=self.chunk_size) as source:
+                if self.energy_threshold is None:
+                    self.calibrate(source)
+                while self._running.is_set():
+                    data = source.stream.read(source.CHUNK)
+                    if self._listening.is_set():
+                        self.transcriber.feed(data)
+                    elif self._flush_pending.is_set():
+                        self._flush_pending.clear()
+                        self.transcriber.flush()
+        except Exception as e:
+            self._listening.clear()
+            if self.on_error:
+                self.on_error(e)
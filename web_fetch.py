@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_requests_available = False
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    _requests_available = True
+except ImportError:
+    pass
+
+_web_parsing_available = False
+try:
+    from bs4 import BeautifulSoup
+    import html2text
+    _web_parsing_available = True
+except ImportError:
+    pass
+
+_lxml_available = False
+try:
+    import lxml  # noqa: F401
+    _lxml_available = True
+except ImportError:
+    pass
+
+logger = logging.getLogger("AICoderUltimate")
+
+DEFAULT_CACHE_DIR = "web_cache"
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+CHARS_PER_TOKEN = 4
+TRUNCATED_MARK = " […часть текста сокращена]"
+_STRIP_TAGS = ["script", "style", "noscript", "svg", "iframe", "nav", "footer", "form"]
+
+
+class WebCache:
+    """
+    Дисковый кэш страниц: <sha256(url)>.json с метаданными (ETag, Last-Modified,
+    время загрузки) и <sha256(url)>.txt с уже сконвертированным текстом.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".txt"
+
+    def get(self, url):
+        meta_path, text_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(text_path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, text
+
+    def put(self, url, meta, text=None):
+        meta_path, text_path = self._paths(url)
+        with self._lock:
+            if text is not None:
+                with open(text_path + ".tmp", "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(text_path + ".tmp", text_path)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(meta_path + ".tmp", meta_path)
+
+    def evict(self, now=None):
+        """Удаляет записи, не обновлявшиеся дольше max_age. Возвращает число удаленных."""
+        now = now or time.time()
+        removed = 0
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(self.cache_dir, name)
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        fetched_at = json.load(f).get("fetched_at", 0)
+                except (OSError, ValueError):
+                    fetched_at = 0
+                if now - fetched_at > self.max_age:
+                    for path in (meta_path, meta_path[:-len(".json")] + ".txt"):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                    removed += 1
+        return removed
+
+
+def html_to_text(html, base_url=None):
+    """
+    Конвертирует HTML в markdown-текст: сначала выбрасывает скрипты, стили и навигацию,
+    затем передает в html2text только основное содержимое (<main>/<article>/<body>).
+    """
+    if not _web_parsing_available:
+        text = re.sub(r"<(script|style)[\s\S]*?</\1>", " ", html, flags=re.IGNORECASE)
+        text = re.sub(r"<[^>]+>", " ", text)
+        return re.sub(r"\s+", " ", text).strip()
+    soup = BeautifulSoup(html, "lxml" if _lxml_available else "html.parser")
+    for tag in soup(_STRIP_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    converter = html2text.HTML2Text(baseurl=base_url or "")
+    converter.ignore_images = True
+    converter.body_width = 0
+    text = converter.handle(str(root))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+class WebFetcher:
+    """
+    Загрузчик страниц с общим пулом соединений, условными запросами (ETag/Last-Modified),
+    дисковым кэшем с TTL и ограничением размера ответа при потоковом чтении.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES,
+                 timeout=15, max_workers=4):
+        if not _requests_available:
+            raise RuntimeError("requests is not installed")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache = WebCache(cache_dir)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "AICoderUltimate/1.0"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-fetch")
+        self._executor.submit(self.cache.evict)
+
+    def fetch(self, url, force=False):
+        """Возвращает текст страницы, по возможности из кэша."""
+        meta, text = self.cache.get(url)
+        now = time.time()
+        if meta and text is not None and not force and now - meta.get("fetched_at", 0) < self.ttl:
+            return text
+
+        headers = {}
+        if meta and text is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and text is not None:
+                meta["fetched_at"] = now
+                self.cache.put(url, meta)
+                logger.info(f"Web cache revalidated: {url}")
+                return text
+            response.raise_for_status()
+            body = self._read_limited(response)
+            content_type = response.headers.get("Content-Type", "")
+            encoding = response.encoding if "charset" in content_type.lower() else "utf-8"
+            html = body.decode(encoding or "utf-8", errors="replace")
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        text = html_to_text(html, url) if "html" in content_type or not content_type else html
+        self.cache.put(url, {"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": now}, text)
+        return text
+
+    def _read_limited(self, response):
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            logger.warning(f"Response truncated to {self.max_bytes} bytes (declared {declared})")
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break
+        return b"".join(chunks)[:self.max_bytes]
+
+    def fetch_async(self, url, callback=None, force=False):
+        """Загружает страницу в пуле потоков; callback(url, text, error) вызывается из рабочего потока."""
+        future = self._executor.submit(self.fetch, url, force)
+        if callback:
+            def _done(f):
+                error = f.exception()
+                callback(url, None if error else f.result(), error)
+            future.add_done_callback(_done)
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def split_text(text, max_tokens):
+    """Делит текст на куски не длиннее max_tokens, стараясь резать по абзацам."""
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    current = []
+    current_len = 0
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current_len + len(paragraph) > max_chars and current:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_len = 0
+        current.append(paragraph)
+        current_len += len(paragraph) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def summarize_text(text, generate, context_window=8192, max_tokens=1024,
+                   instruction="Кратко изложи основное содержание текста, сохраняя примеры кода:", max_rounds=4):
+    """
+    Map-reduce суммаризация: текст режется на куски, укладывающиеся в context_window,
+    каждый кусок суммируется отдельно (generate(prompt) -> str), затем сводки
+    объединяются, пока не поместятся в одно окно (не больше max_rounds проходов).
+    Если и после этого сводки не помещаются, каждая из них урезается пропорционально
+    с пометкой TRUNCATED_MARK, чтобы финальный проход видел все части текста.
+    """
+    budget = max(256, context_window - max_tokens - len(instruction) // CHARS_PER_TOKEN - 64)
+    chunks = split_text(text, budget)
+    rounds = 0
+    while len(chunks) > 1 and rounds < max_rounds:
+        summaries = [generate(f"{instruction}\n\n{chunk}") for chunk in chunks]
+        chunks = split_text("\n\n".join(summaries), budget)
+        rounds += 1
+    if not chunks:
+        return ""
+    if len(chunks) > 1:
+        share = max(1, (budget * CHARS_PER_TOKEN) // len(chunks) - len(TRUNCATED_MARK) - 2)
+        logger.warning(f"Summaries still span {len(chunks)} windows after {max_rounds} rounds; "
+                       f"truncating each to {share} chars")
+        chunks = ["\n\n".join(chunk if len(chunk) <= share else chunk[:share] + TRUNCATED_MARK
+                                for chunk in chunks)]
+    return generate(f"{instruction}\n\n{chunks[0]}")